@@ -65,6 +65,7 @@ class Article(Entity):
         self._abstract = None
         self._notes = None
         self._authors = []
+        self._first_author = None
         self._labels = []
         self._collections = []
         
@@ -74,6 +75,8 @@ class Article(Entity):
         self._library_path = ""
         self._deleted = False
         
+        self._deferred = {}
+        
         super(Article, self).__init__(**attrs)
     
     
@@ -95,6 +98,9 @@ class Article(Entity):
     def from_db(data):
         """Creates instance from database data."""
         
+        # get available columns
+        keys = data.keys()
+        
         return Article(
             dbid = data['id'],
             key = data['key'],
@@ -106,8 +112,8 @@ class Article(Entity):
             issue = data['issue'],
             pages = data['pages'],
             title = data['title'],
-            abstract = data['abstract'],
-            notes = data['notes'],
+            abstract = data['abstract'] if 'abstract' in keys else None,
+            notes = data['notes'] if 'notes' in keys else None,
             pdf = data['pdf'],
             colour = data['colour'],
             rating = data['rating'],
@@ -290,6 +296,9 @@ class Article(Entity):
     def abstract(self):
         """Gets abstract text."""
         
+        if 'abstract' in self._deferred:
+            self._load('abstract')
+        
         return self._abstract
     
     
@@ -298,12 +307,16 @@ class Article(Entity):
         """Sets abstract text."""
         
         self._abstract = str(value) if value else None
+        self._deferred.pop('abstract', None)
     
     
     @property
     def notes(self):
         """Gets notes text."""
         
+        if 'notes' in self._deferred:
+            self._load('notes')
+        
         return self._notes
     
     
@@ -312,12 +325,16 @@ class Article(Entity):
         """Sets notes text."""
         
         self._notes = str(value) if value else None
+        self._deferred.pop('notes', None)
     
     
     @property
     def authors(self):
         """Gets connected authors."""
         
+        if 'authors' in self._deferred:
+            self._load('authors')
+        
         return self._authors
     
     
@@ -332,12 +349,38 @@ class Article(Entity):
                     raise TypeError(message)
         
         self._authors = value if value else []
+        self._first_author = self._authors[0] if self._authors else None
+        self._deferred.pop('authors', None)
+    
+    
+    @property
+    def first_author(self):
+        """Gets author stored with first priority, None if it was removed."""
+        
+        if 'authors' in self._deferred:
+            self._load('authors')
+        
+        return self._first_author
+    
+    
+    @first_author.setter
+    def first_author(self, value):
+        """Sets author stored with first priority."""
+        
+        if value is not None and not isinstance(value, Author):
+            message = "Author must be of type Author! --> '%s'" % type(value)
+            raise TypeError(message)
+        
+        self._first_author = value
     
     
     @property
     def labels(self):
         """Gets connected labels."""
         
+        if 'labels' in self._deferred:
+            self._load('labels')
+        
         return self._labels
     
     
@@ -352,12 +395,16 @@ class Article(Entity):
                     raise TypeError(message)
         
         self._labels = value if value else []
+        self._deferred.pop('labels', None)
     
     
     @property
     def collections(self):
         """Gets connected collections."""
         
+        if 'collections' in self._deferred:
+            self._load('collections')
+        
         return self._collections
     
     
@@ -372,6 +419,14 @@ class Article(Entity):
                     raise TypeError(message)
         
         self._collections = value if value else []
+        self._deferred.pop('collections', None)
+    
+    
+    @property
+    def deferred(self):
+        """Gets names of attributes waiting to be loaded."""
+        
+        return frozenset(self._deferred)
     
     
     @property
@@ -451,8 +506,9 @@ class Article(Entity):
         name = ""
         
         # add first author
-        if self._authors and self._authors[0].lastname:
-            name += "%s_" % self._authors[0].lastname.lower().replace(" ", "_")
+        authors = self.authors
+        if authors and authors[0].lastname:
+            name += "%s_" % authors[0].lastname.lower().replace(" ", "_")
         
         # add year
         if self._year:
@@ -506,6 +562,24 @@ class Article(Entity):
         return citation
     
     
+    def defer(self, names, loader):
+        """
+        Marks given attributes to be loaded on first access.
+        
+        Args:
+            names: (str,)
+                Names of attributes to be loaded later.
+            
+            loader: callable
+                Function called with the article as the only argument when
+                any of given attributes is accessed. It is expected to set
+                all of them.
+        """
+        
+        for name in names:
+            self._deferred[name] = loader
+    
+    
     def format(self, template):
         """Gets article summary according to given format."""
         
@@ -596,3 +670,52 @@ class Article(Entity):
             text = text.replace("$$%s$$" % tag[1:-1], value)
         
         return text
+    
+    
+    def _get_values(self):
+        """Gets current values of tracked attributes."""
+        
+        # get columns
+        values = {
+            'doi': self._doi,
+            'pmid': self._pmid,
+            'journal': self._journal.dbid if self._journal is not None else 0,
+            'year': self._year,
+            'volume': self._volume,
+            'issue': self._issue,
+            'pages': self._pages,
+            'title': self._title,
+            'abstract': self._abstract,
+            'notes': self._notes,
+            'pdf': self._has_pdf,
+            'colour': self._colour,
+            'rating': self._rating}
+        
+        # skip values not loaded yet
+        if not self._deferred:
+            values['authors'] = tuple([x.dbid for x in self._authors])
+            values['labels'] = tuple([x.dbid for x in self._labels])
+            return values
+        
+        for name in self._deferred:
+            values.pop(name, None)
+        
+        # get relations
+        if 'authors' not in self._deferred:
+            values['authors'] = tuple([x.dbid for x in self._authors])
+        
+        if 'labels' not in self._deferred:
+            values['labels'] = tuple([x.dbid for x in self._labels])
+        
+        return values
+    
+    
+    def _load(self, name):
+        """Loads deferred attribute."""
+        
+        # load attributes
+        loader = self._deferred[name]
+        loader(self)
+        
+        # avoid repeated loading
+        self._deferred.pop(name, None)
@@ -18,6 +18,7 @@ class Collection(Entity):
         self._query = None
         self._priority = 0
         self._export = False
+        self._materialized = False
         
         self._group = "custom"
         self._count = 0
@@ -40,7 +41,8 @@ class Collection(Entity):
             title = data['title'],
             query = data['query'],
             priority = data['priority'],
-            export = data['export'])
+            export = data['export'],
+            materialized = data['materialized'])
     
     
     @property
@@ -99,6 +101,20 @@ class Collection(Entity):
         self._export = bool(value)
     
     
+    @property
+    def materialized(self):
+        """Gets smart collection materialized flag."""
+        
+        return self._materialized
+    
+    
+    @materialized.setter
+    def materialized(self, value):
+        """Sets smart collection materialized flag."""
+        
+        self._materialized = bool(value)
+    
+    
     @property
     def group(self):
         """Gets collection group."""
@@ -4,23 +4,174 @@
 # import modules
 import codecs
 import os.path
+import sys
+import threading
+import time
 import sqlite3 as sqlite
+from collections import deque
+
+# set max number of logged slow statements
+SLOW_LOG_SIZE = 200
+
+# set max number of caller frames logged for slow statements
+SLOW_LOG_FRAMES = 4
+
+
+def _check_fts5():
+    """Checks whether current SQLite build supports FTS5."""
+    
+    try:
+        connection = sqlite.connect(':memory:')
+        connection.execute("CREATE VIRTUAL TABLE test USING fts5(text)")
+        connection.close()
+        return True
+    
+    except sqlite.Error:
+        return False
+
+
+# check full-text search support
+FTS5 = _check_fts5()
+
+
+class _TimedCursor(sqlite.Cursor):
+    """Cursor measuring duration of executed statements for slow log."""
+    
+    
+    def __init__(self, *args, **kwargs):
+        """Initializes a new instance of _TimedCursor."""
+        
+        super(_TimedCursor, self).__init__(*args, **kwargs)
+        
+        self.database = None
+        self._statement = None
+    
+    
+    def execute(self, sql, parameters=()):
+        """Executes statement and measures its duration."""
+        
+        return self._timed(super(_TimedCursor, self).execute, sql, parameters, False)
+    
+    
+    def executemany(self, sql, parameters):
+        """Executes statement for all parameters and measures its duration."""
+        
+        return self._timed(super(_TimedCursor, self).executemany, sql, parameters, True)
+    
+    
+    def fetchone(self):
+        """Fetches next row and adds fetching time to current statement."""
+        
+        return self._fetch(super(_TimedCursor, self).fetchone, False)
+    
+    
+    def fetchall(self):
+        """Fetches remaining rows and finishes current statement."""
+        
+        return self._fetch(super(_TimedCursor, self).fetchall, True)
+    
+    
+    def _timed(self, func, sql, parameters, many):
+        """Calls execute function and starts new statement record."""
+        
+        # finish previous statement
+        self._finish()
+        
+        # check logging
+        if self.database is None or self.database.slow_threshold is None:
+            return func(sql, parameters)
+        
+        # execute statement
+        start = time.perf_counter()
+        try:
+            return func(sql, parameters)
+        
+        # remember statement
+        finally:
+            duration = time.perf_counter() - start
+            values = None if many else parameters
+            self._statement = [sql, values, duration, None]
+            self._check_caller()
+    
+    
+    def _fetch(self, func, finish):
+        """Calls fetch function and adds its time to current statement."""
+        
+        # check statement
+        if self._statement is None:
+            return func()
+        
+        # fetch rows
+        start = time.perf_counter()
+        try:
+            return func()
+        
+        # update statement
+        finally:
+            self._statement[2] += time.perf_counter() - start
+            self._check_caller()
+            if finish:
+                self._finish()
+    
+    
+    def _check_caller(self):
+        """Gets caller of current statement once it exceeds slow threshold."""
+        
+        statement = self._statement
+        threshold = self.database.slow_threshold
+        
+        if statement[3] is None and threshold is not None and statement[2] >= threshold:
+            statement[3] = _get_caller()
+    
+    
+    def _finish(self):
+        """Reports current statement to database slow log."""
+        
+        if self._statement is not None:
+            self.database.log_statement(*self._statement)
+            self._statement = None
+
+
+def _get_caller():
+    """Gets description of code calling the database."""
+    
+    # get first frame outside this module
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    
+    # describe frames
+    callers = []
+    while frame is not None and len(callers) < SLOW_LOG_FRAMES:
+        filename = os.path.basename(frame.f_code.co_filename)
+        callers.append("%s (%s:%s)" % (frame.f_code.co_name, filename, frame.f_lineno))
+        frame = frame.f_back
+    
+    return " < ".join(callers)
 
 
 class Database(object):
     """
     Database is a wrapper around SQLite database providing convenient functions
-    to open and close connections.
+    to open and close connections. Connections are kept separately for each
+    thread.
     
     Attributes:
         path: str (read-only)
             Database file path.
         
         connection: sqlite3.Connection or None (read-only)
-            SQLite connection.
+            SQLite connection of current thread.
         
         cursor: sqlite3.Cursor or None (read-only)
-            SQLite connection cursor.
+            SQLite connection cursor of current thread.
+        
+        slow_threshold: float or None
+            Minimal duration in seconds of statements to be logged as slow.
+            If set to None, statements are not timed.
+        
+        slow_log: list of dict (read-only)
+            Logged slow statements.
     """
     
     
@@ -49,8 +200,12 @@ class Database(object):
         super(Database, self).__init__()
         
         self._path = path
-        self._connection = None
-        self._cursor = None
+        self._local = threading.local()
+        
+        # init slow log
+        self._slow_threshold = None
+        self._slow_log = deque(maxlen=SLOW_LOG_SIZE)
+        self._slow_lock = threading.Lock()
         
         # use in-memory database
         if path == ':memory:':
@@ -98,32 +253,141 @@ class Database(object):
     @property
     def connection(self):
         """
-        Gets database connection.
+        Gets database connection of current thread.
         
         Returns:
             connection: sqlite3.Connection or None
                 SQLite connection.
         """
         
-        return self._connection
+        return getattr(self._local, 'connection', None)
     
     
     @property
     def cursor(self):
         """
-        Gets connection cursor.
+        Gets connection cursor of current thread.
         
         Returns:
             cursor: sqlite3.Cursor or None
                 SQLite connection cursor.
         """
         
-        return self._cursor
+        return getattr(self._local, 'cursor', None)
+    
+    
+    @property
+    def data_version(self):
+        """
+        Gets file change counter from the database header. SQLite increments
+        the counter whenever any connection commits changes to the file.
+        
+        Returns:
+            version: int or None
+                File change counter or None for in-memory database.
+        """
+        
+        # check in-memory database
+        if self._path == ':memory:':
+            return None
+        
+        # read counter
+        try:
+            with open(self._path, "rb") as f:
+                f.seek(24)
+                return int.from_bytes(f.read(4), "big")
+        
+        except OSError:
+            return None
+    
+    
+    @property
+    def slow_threshold(self):
+        """
+        Gets minimal duration of statements to be logged as slow.
+        
+        Returns:
+            threshold: float or None
+                Duration in seconds or None if logging is disabled.
+        """
+        
+        return self._slow_threshold
+    
+    
+    @slow_threshold.setter
+    def slow_threshold(self, value):
+        """
+        Sets minimal duration of statements to be logged as slow.
+        
+        Args:
+            value: float or None
+                Duration in seconds or None to disable logging.
+        """
+        
+        self._slow_threshold = float(value) if value is not None else None
+    
+    
+    @property
+    def slow_log(self):
+        """
+        Gets logged slow statements, oldest first.
+        
+        Returns:
+            log: list of dict
+                Statements as 'time' of logging, 'sql', 'values', 'duration'
+                in seconds, including rows fetching, and 'caller'.
+        """
+        
+        with self._slow_lock:
+            return list(self._slow_log)
+    
+    
+    def log_statement(self, sql, values, duration, caller=None):
+        """
+        Adds statement to slow log if its duration exceeds current threshold.
+        
+        Args:
+            sql: str
+                Executed SQL statement.
+            
+            values: list
+                SQL statement values.
+            
+            duration: float
+                Statement duration in seconds.
+            
+            caller: str or None
+                Description of calling code.
+        """
+        
+        # check threshold
+        threshold = self._slow_threshold
+        if threshold is None or duration < threshold:
+            return
+        
+        # make record
+        record = {
+            'time': time.time(),
+            'sql': sql,
+            'values': values,
+            'duration': duration,
+            'caller': caller}
+        
+        # add record
+        with self._slow_lock:
+            self._slow_log.append(record)
+    
+    
+    def clear_slow_log(self):
+        """Removes all logged slow statements."""
+        
+        with self._slow_lock:
+            self._slow_log.clear()
     
     
     def connect(self, row_factory=sqlite.Row):
         """
-        Opens a database connection.
+        Opens a database connection for current thread.
         
         If connection is already established nothing happens and the return
         value is False to indicate that the connection will probably be closed
@@ -142,13 +406,14 @@ class Database(object):
         """
         
         # establish new connection if necessary
-        if self._connection is None:
+        if self.connection is None:
             
-            self._connection = sqlite.connect(self._path)
-            self._connection.row_factory = row_factory
+            self._local.connection = sqlite.connect(self._path)
+            self._local.connection.row_factory = row_factory
             
-            self._cursor = self._connection.cursor()
-            self._cursor.execute("PRAGMA foreign_keys = ON")
+            self._local.cursor = self._local.connection.cursor(_TimedCursor)
+            self._local.cursor.database = self
+            self._local.cursor.execute("PRAGMA foreign_keys = ON")
             
             return True
         
@@ -156,13 +421,16 @@ class Database(object):
     
     
     def close(self):
-        """Closes current database connection if any."""
+        """Closes database connection of current thread if any."""
+        
+        if self.cursor is not None:
+            self.cursor._finish()
         
-        if self._connection is not None:
-            self._connection.close()
+        if self.connection is not None:
+            self.connection.close()
         
-        self._connection = None
-        self._cursor = None
+        self._local.connection = None
+        self._local.cursor = None
     
     
     def _check_db_format(self):
@@ -15,6 +15,7 @@ class Entity(object):
         
         self._dbid = int(dbid) if dbid else None
         self._attachment = None
+        self._stored = None
         
         # set given attributes
         for name, value in attrs.items():
@@ -79,3 +80,55 @@ class Entity(object):
         """
         
         self._attachment = value
+    
+    
+    @property
+    def changes(self):
+        """
+        Gets names of attributes changed since the values were stored.
+        
+        Returns:
+            names: frozenset of str or None
+                Names of changed attributes or None if stored values are
+                not known.
+        """
+        
+        # check stored values
+        if self._stored is None:
+            return None
+        
+        # compare values
+        values = self._get_values()
+        return frozenset(k for k, v in values.items() if k not in self._stored or self._stored[k] != v)
+    
+    
+    def reset_changes(self, names=None):
+        """
+        Marks current values as stored so that following changes are tracked.
+        
+        Args:
+            names: (str,) or None
+                Names of attributes to be marked. If set to None all values
+                are marked.
+        """
+        
+        # mark all values
+        if names is None:
+            self._stored = self._get_values()
+            return
+        
+        # check stored values
+        if self._stored is None:
+            return
+        
+        # mark given values
+        values = self._get_values()
+        for name in names:
+            if name in values:
+                self._stored[name] = values[name]
+    
+    
+    def _get_values(self):
+        """Gets current values of tracked attributes."""
+        
+        return {}
@@ -47,6 +47,9 @@ class Grammar(object):
         # ensure whitespace set
         if "whitespace" not in self._rules:
             self._rules["whitespace"] = whitespace if whitespace is not None else ''
+        
+        # init compiled patterns
+        self._patterns = {}
     
     
     def __str__(self):
@@ -86,15 +89,19 @@ class Grammar(object):
             message = "Unknown rule specified! --> '%s'" % rule
             raise KeyError(message)
         
+        # init memo of parsed rules by position
+        memo = {}
+        pos = 0
+        
         # parse text
-        while text:
+        while pos < len(text):
             
-            result = self._parse(rule, text)
+            result = self._parse(rule, text, pos, memo)
             if result is None:
                 return None
             
             parsed.append(result[0])
-            text = result[1]
+            pos = result[1]
         
         # return parsed tree
         return parsed
@@ -140,38 +147,51 @@ class Grammar(object):
         return buff
     
     
-    def _parse(self, rule, text):
-        """Parses text using given rule."""
+    def _parse(self, rule, text, pos, memo):
+        """Parses text from given position using given rule."""
         
         # match rule to text
         if rule in self._rules:
             
+            # check memo
+            key = (rule, pos)
+            if key in memo:
+                return memo[key]
+            
+            memo[key] = None
+            
             # try all rule alternatives
             for alt in self._rules[rule]:
                 tree = []
-                remainder = text
+                current = pos
                 
                 # match each rule element
                 for elm in alt:
-                    result = self._parse(elm, remainder)
+                    result = self._parse(elm, text, current, memo)
                     if result is None:
                         tree = None
                         break
                     
                     tree.append(result[0])
-                    remainder = result[1]
+                    current = result[1]
                 
-                # return matched tree and remainder
+                # return matched tree and position
                 if tree is not None:
-                    return [rule]+tree, remainder 
+                    memo[key] = [rule]+tree, current
+                    return memo[key]
             
             return None
         
+        # get compiled pattern
+        pattern = self._patterns.get(rule, None)
+        if pattern is None:
+            pattern = re.compile(self._rules["whitespace"] + "(%s)" % rule)
+            self._patterns[rule] = pattern
+        
         # match pattern to text
-        tokenizer = self._rules["whitespace"] + "(%s)"
-        match = re.match(tokenizer % rule, text)
+        match = pattern.match(text, pos)
         if not match:
             return None
         
-        # return matched part and remainder
-        return match.group(1), text[match.end():]
+        # return matched part and position
+        return match.group(1), match.end()
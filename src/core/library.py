@@ -3,11 +3,14 @@
 
 # import modules
 import random
+import re
 import shutil
+import threading
 import time
 import datetime
 import os
 import os.path
+from collections import OrderedDict
 
 from .database import Database
 from .schema import Schema
@@ -17,6 +20,9 @@ from .author import Author
 from .label import Label
 from .collection import Collection
 from .query import Query
+from .queries import ARTICLES_TIMED_TAGS
+from .resolver import Resolver
+from .utils import normalize_text
 
 # set library folder
 LIBRARY_FOLDER = "Library"
@@ -24,6 +30,38 @@ LIBRARY_FOLDER = "Library"
 # set key generator constants
 KEY_CHARS = "abcdefghijklmnopqrst0123456789"
 KEY_SIZE = 4
+KEY_FILL = 0.25
+
+# init key generator
+_KEY_RANDOM = random.SystemRandom()
+
+# set max number of values used within single IN clause
+CHUNK_SIZE = 900
+
+# set lazy loaded article relations
+RELATIONS = ('authors', 'labels', 'collections')
+
+# set articles columns profiles
+PROFILES = {
+    'full': None,
+    'list': ('id', 'key', 'imported', 'doi', 'pmid', 'journal', 'year', 'volume', 'issue', 'pages', 'title', 'pdf', 'colour', 'rating', 'deleted')}
+
+# set lazy loaded article columns
+HEAVY_COLUMNS = ('abstract', 'notes')
+
+# set article columns and relations written by update
+UPDATE_COLUMNS = ('doi', 'pmid', 'year', 'volume', 'issue', 'pages', 'title', 'abstract', 'notes', 'pdf', 'colour', 'rating')
+UPDATE_RELATIONS = ('journal', 'authors', 'labels')
+
+# set article attributes used by PDF filename or location
+PDF_ATTRIBUTES = ('authors', 'year', 'pdf')
+
+# set max number of articles to be refined in memory
+REFINE_SIZE = 2000
+
+# set max number of cached results and total rows
+RESULTS_CACHE_SIZE = 64
+RESULTS_CACHE_ROWS = 200000
 
 
 class Library(object):
@@ -56,6 +94,21 @@ class Library(object):
         # init database file
         self._db = Database(path, new, delete_old)
         
+        # init results cache
+        self._writes = 0
+        self._cache = OrderedDict()
+        self._cache_rows = 0
+        self._cache_version = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_lock = threading.Lock()
+        
+        # init in-memory matching
+        self._resolver = None
+        self._resolver_version = None
+        self._resolver_dirty = False
+        self._resolver_lock = threading.RLock()
+        
         # check database schema
         schema = Schema(self)
         schema.update()
@@ -105,6 +158,64 @@ class Library(object):
         return self._library_path
     
     
+    @property
+    def cache_stats(self):
+        """
+        Gets statistics of the search and count results cache.
+        
+        Returns:
+            stats: dict
+                Number of cache 'hits' and 'misses', currently cached
+                'entries' and total number of cached 'rows'.
+        """
+        
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'entries': len(self._cache),
+            'rows': self._cache_rows}
+    
+    
+    @property
+    def slow_threshold(self):
+        """
+        Gets minimal duration of statements to be logged as slow.
+        
+        Returns:
+            threshold: float or None
+                Duration in seconds or None if logging is disabled.
+        """
+        
+        return self._db.slow_threshold
+    
+    
+    @slow_threshold.setter
+    def slow_threshold(self, value):
+        """
+        Sets minimal duration of statements to be logged as slow.
+        
+        Args:
+            value: float or None
+                Duration in seconds or None to disable logging.
+        """
+        
+        self._db.slow_threshold = value
+    
+    
+    @property
+    def slow_queries(self):
+        """
+        Gets logged slow statements, oldest first.
+        
+        Returns:
+            log: list of dict
+                Statements as 'time' of logging, 'sql', 'values', 'duration'
+                in seconds and 'caller'.
+        """
+        
+        return self._db.slow_log
+    
+    
     def query(self, sql, values=[]):
         """
         Queries library by given SQL statement.
@@ -128,6 +239,11 @@ class Library(object):
         self._db.cursor.execute(sql, values)
         results = self._db.cursor.fetchall()
         
+        # invalidate cached results and matching
+        if not sql.lstrip().upper().startswith("SELECT"):
+            self._writes += 1
+            self._resolve('clear')
+        
         # close connection
         if close_db:
             self._db.close()
@@ -135,76 +251,147 @@ class Library(object):
         return results
     
     
-    def search(self, query):
+    def search(self, query, lazy=False, profile='full', order_by=None, reverse=False, limit=None):
         """
         Queries library for specified entity type.
         
         Args:
             query: Query
                 Query object.
+            
+            lazy: bool
+                If set to True, authors, labels and collections of articles
+                are not retrieved until first accessed. They are then loaded
+                at once for all the articles found.
+            
+            profile: str
+                Articles columns profile as 'full' or 'list'. The 'list'
+                profile skips abstract and notes, which are loaded for each
+                article on first access.
+            
+            order_by: str or None
+                Name of the order to sort items by (e.g. 'imported', 'year',
+                'title', 'author' or 'journal' for articles). Articles can
+                also be sorted by 'relevance' to query free-text terms, where
+                reverse order gives the best matches first.
+            
+            reverse: bool
+                If set to True, items are sorted in descending order.
+            
+            limit: int or None
+                Maximum number of items to retrieve, e.g. top hits if sorted
+                by relevance.
         
         Returns:
             entities: list requested entities
                 List if corresponding items.
         """
         
-        # check query type
-        if not isinstance(query, Query):
-            message = "Query must be of type Query! --> '%s" % type(query)
-            raise TypeError(message)
+        items, rows = self._search(query, lazy, profile, order_by, reverse, None, limit)
         
-        # init buffers
-        results = []
-        items = []
+        return items
+    
+    
+    def iter_search(self, query, order_by='id', reverse=False, page_size=500, lazy=False, profile='full'):
+        """
+        Iterates through query results page by page. Each page is retrieved
+        by separate query continuing from the last item of previous page.
         
-        # make query and values
-        sql, values = query.select()
+        Args:
+            query: Query
+                Query object.
+            
+            order_by: str
+                Name of the order to sort items by.
+            
+            reverse: bool
+                If set to True, items are sorted in descending order.
+            
+            page_size: int
+                Maximum number of items within single page.
+            
+            lazy: bool
+                If set to True, articles relations are loaded on first
+                access.
+            
+            profile: str
+                Articles columns profile as 'full' or 'list'.
         
-        # assert connection
-        close_db = self._db.connect()
+        Yields:
+            entities: list requested entities
+                List if corresponding items.
+        """
         
-        # execute query
-        if sql is not None:
-            self._db.cursor.execute(sql, values)
-            results = self._db.cursor.fetchall()
+        after = None
         
-        # make articles
-        if query.entity == Article.NAME:
-            for data in results:
-                article = Article.from_db(data)
-                article.journal = self._get_journal(data['journal'])
-                article.authors = self._get_authors(data['id'])
-                article.labels = self._get_labels(data['id'])
-                article.collections = self._get_collections(data['id'])
-                article.library_path = self._library_path
-                items.append(article)
+        while True:
+            
+            # get page
+            items, rows = self._search(query, lazy, profile, order_by, reverse, after, page_size)
+            if items:
+                yield items
+            
+            # check last page
+            if len(rows) < page_size:
+                return
+            
+            # remember last item
+            after = (rows[-1]['_order'], rows[-1]['id'])
+    
+    
+    def refine(self, query, previous, articles):
+        """
+        Filters articles retrieved previously by another query in memory if
+        given query is provably its conjunctive strengthening (e.g. 'prote'
+        after 'prot'). Articles keep their previous order. Large sets are
+        not refined as the search is faster then.
         
-        # make journals
-        elif query.entity == Journal.NAME:
-            items = [Journal.from_db(x) for x in results]
+        Args:
+            query: Query
+                New articles query.
+            
+            previous: Query
+                Query used to retrieve given articles.
+            
+            articles: list of Article
+                Articles retrieved by previous query.
         
-        # make authors
-        elif query.entity == Author.NAME:
-            items = [Author.from_db(x) for x in results]
+        Returns:
+            articles: list of Article or None
+                Matching articles or None if refinement is not safe and the
+                query should be searched instead.
+        """
         
-        # make labels
-        elif query.entity == Label.NAME:
-            items = [Label.from_db(x) for x in results]
+        # check refinement
+        if len(articles) > REFINE_SIZE or not query.refines(previous):
+            return None
         
-        # make collections
-        elif query.entity == Collection.NAME:
-            items = [Collection.from_db(x) for x in results]
+        # assert connection
+        close_db = self._db.connect()
         
-        # unknown entity
-        else:
-            message = "Unsupported entity for query! --> '%s" % query.entity
-            raise KeyError(message)
+        # check free-text terms matching identifiers exactly
+        terms = list(query.terms)
+        if terms:
+            marks = ",".join("?" * len(terms))
+            sql = "SELECT 1 FROM articles WHERE key IN (%s) OR pmid IN (%s) OR LOWER(doi) IN (%s) LIMIT 1" % (marks, marks, marks)
+            self._db.cursor.execute(sql, terms + terms + [x.lower() for x in terms])
+            
+            if self._db.cursor.fetchone():
+                articles = None
+        
+        # load deferred columns at once
+        if articles:
+            self._load_columns([x for x in articles if not x.deferred.isdisjoint(HEAVY_COLUMNS)])
         
         # close connection
         if close_db:
             self._db.close()
         
-        return items
+        # check identifiers
+        if articles is None:
+            return None
+        
+        return [x for x in articles if query.matches(x)]
     
     
     def insert(self, item, commit=True):
@@ -225,6 +412,7 @@ class Library(object):
         # insert article
         if isinstance(item, Article):
             self._insert_article(item)
+            self._refresh_smart(articles_ids=[item.dbid])
         
         # insert journal
         elif isinstance(item, Journal):
@@ -241,19 +429,130 @@ class Library(object):
         # insert collection
         elif isinstance(item, Collection):
             self._insert_collection(item)
+            self._refresh_smart(collections_ids=[item.dbid])
         
         # unknown item type
         else:
             message = "Unsupported item type to be inserted! --> %s" % type(item)
             raise TypeError(message)
         
+        # invalidate cached results
+        self._writes += 1
+        
+        # save changes
+        if commit:
+            self._commit()
+        
+        # close connection
+        if close_db:
+            self._db.close()
+    
+    
+    def insert_many(self, articles, commit=True):
+        """
+        Inserts given articles into library within single transaction.
+        Articles and their links are inserted together after journals,
+        authors and labels are matched to existing items. Articles which
+        cannot be inserted are skipped and reported while the rest of the
+        batch is inserted. New journals, authors and labels of skipped
+        articles are not kept.
+        
+        Args:
+            articles: list of Article
+                Articles to be inserted into library.
+            
+            commit: bool
+                If set to True changes will be committed.
+        
+        Returns:
+            failures: list of (Article, str)
+                Articles which were not inserted and the error message.
+        """
+        
+        # check articles
+        for article in articles:
+            if not isinstance(article, Article):
+                message = "Article must be of type Article! --> '%s" % type(article)
+                raise TypeError(message)
+        
+        # init buffers
+        failures = []
+        batch = []
+        
+        # assert connection
+        close_db = self._db.connect()
+        
+        # get used keys
+        self._db.cursor.execute("SELECT key FROM articles")
+        keys = set(x['key'] for x in self._db.cursor.fetchall())
+        
+        # generate missing keys
+        given = set(x.key for x in articles if x.key is not None)
+        count = sum(1 for x in articles if x.key is None)
+        generated = self._generate_article_keys(count, keys | given)
+        
+        # begin transaction
+        if not self._db.connection.in_transaction:
+            self._db.cursor.execute("BEGIN")
+        
+        # check keys
+        for article in articles:
+            
+            # check key
+            if article.key is not None and article.key in keys:
+                failures.append((article, "Article key already exists! --> %s" % article.key))
+                continue
+            
+            # set unique key
+            if article.key is None:
+                article.key = generated.pop()
+            
+            # reserve key
+            keys.add(article.key)
+            batch.append(article)
+        
+        # insert articles with new related items
+        inserted = self._insert_articles_rows(batch, failures)
+        
+        # get assigned DBIDs
+        query = "SELECT id, key FROM articles WHERE key IN (%s)"
+        ids = {x['key']: x['id'] for x in self._fetch_chunks(query, [x[0].key for x in inserted])}
+        
+        # init links
+        authors = []
+        labels = []
+        
+        # set assigned DBIDs and make links
+        for article, values, authors_ids, labels_ids in inserted:
+            article.dbid = ids[article.key]
+            article.library_path = self._library_path
+            article.reset_changes()
+            authors += [(article.dbid, x, i) for i, x in enumerate(authors_ids)]
+            labels += [(article.dbid, x) for x in labels_ids]
+        
+        # insert authors links
+        query = "INSERT INTO articles_authors (article, author, priority) VALUES (?,?,?)"
+        self._db.cursor.executemany(query, authors)
+        
+        # insert labels links
+        query = "INSERT INTO articles_labels (article, label) VALUES (?,?)"
+        self._db.cursor.executemany(query, labels)
+        
+        # refresh smart collections
+        self._refresh_smart(articles_ids=[x[0].dbid for x in inserted])
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
             self._db.close()
+        
+        return failures
     
     
     def update(self, item, commit=True):
@@ -278,31 +577,39 @@ class Library(object):
         # update article
         if isinstance(item, Article):
             self._update_article(item)
+            self._refresh_smart(articles_ids=[item.dbid])
         
         # update journal
         elif isinstance(item, Journal):
             self._update_journal(item)
+            self._refresh_smart(articles_ids=self._get_related_ids(item))
         
         # update author
         elif isinstance(item, Author):
             self._update_author(item)
+            self._refresh_smart(articles_ids=self._get_related_ids(item))
         
         # update label
         elif isinstance(item, Label):
             self._update_label(item)
+            self._refresh_smart(articles_ids=self._get_related_ids(item))
         
         # update collection
         elif isinstance(item, Collection):
             self._update_collection(item)
+            self._refresh_smart(collections_ids=[item.dbid])
         
         # unknown item type
         else:
             message = "Unsupported item type to be updated! --> %s" % type(item)
             raise TypeError(message)
         
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
@@ -354,12 +661,26 @@ class Library(object):
         # assert connection
         close_db = self._db.connect()
         
+        # get related articles
+        articles_ids = self._get_related_ids(item)
+        
         # execute query
         self._db.cursor.execute(query, (item.dbid,))
         
+        # update matching
+        if isinstance(item, (Journal, Author, Label)):
+            self._resolve('remove', item)
+        
+        # refresh smart collections
+        if articles_ids:
+            self._refresh_smart(articles_ids=articles_ids)
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
@@ -411,9 +732,15 @@ class Library(object):
         # execute query
         self._db.cursor.executemany(query, values)
         
+        # refresh smart collections
+        self._refresh_smart(articles_ids=[x.dbid for x in articles])
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
@@ -435,22 +762,27 @@ class Library(object):
         
         # count articles for journal
         if isinstance(item, Journal):
-            sql = "SELECT COUNT(*) FROM articles WHERE journal = ?"
+            sql = "SELECT articles_count FROM journals WHERE id = ?"
             values = (item.dbid,)
         
         # count articles for author
         elif isinstance(item, Author):
-            sql = "SELECT COUNT(*) FROM articles_authors WHERE author = ?"
+            sql = "SELECT articles_count FROM authors WHERE id = ?"
             values = (item.dbid,)
         
         # count articles for label
         elif isinstance(item, Label):
-            sql = "SELECT COUNT(*) FROM articles_labels WHERE label = ?"
+            sql = "SELECT articles_count FROM labels WHERE id = ?"
             values = (item.dbid,)
         
         # count articles for manual collection
         elif isinstance(item, Collection) and not item.query:
-            sql = "SELECT COUNT(*) FROM articles_collections WHERE collection = ?"
+            sql = "SELECT articles_count FROM collections WHERE id = ?"
+            values = (item.dbid,)
+        
+        # count articles for materialized smart collection
+        elif isinstance(item, Collection) and item.materialized:
+            sql = "SELECT COUNT(*) FROM articles_smart WHERE collection = ?"
             values = (item.dbid,)
         
         # count articles for smart collection
@@ -466,8 +798,8 @@ class Library(object):
         close_db = self._db.connect()
         
         # execute query
-        self._db.cursor.execute(sql, values)
-        count = int(self._db.cursor.fetchone()[0])
+        rows = self._fetch_cached(sql, values)
+        count = int(rows[0][0]) if rows else 0
         
         # close connection
         if close_db:
@@ -476,6 +808,177 @@ class Library(object):
         return count
     
     
+    def count_many(self, items):
+        """
+        Counts articles related to each of given items. Stored counts of
+        items of the same type are read together by single query and smart
+        collections are evaluated together.
+        
+        Args:
+            items: list of Journal, Author, Label, Collection
+                Items for which related articles should be counted.
+        
+        Returns:
+            counts: list of int
+                Number of related articles for each item.
+        """
+        
+        # init buffers
+        counts = [0] * len(items)
+        groups = {'journals': [], 'authors': [], 'labels': [], 'manual': [], 'materialized': [], 'smart': []}
+        
+        # group items by type
+        for i, item in enumerate(items):
+            
+            if isinstance(item, Journal):
+                groups['journals'].append(i)
+            
+            elif isinstance(item, Author):
+                groups['authors'].append(i)
+            
+            elif isinstance(item, Label):
+                groups['labels'].append(i)
+            
+            elif isinstance(item, Collection) and not item.query:
+                groups['manual'].append(i)
+            
+            elif isinstance(item, Collection) and item.materialized:
+                groups['materialized'].append(i)
+            
+            elif isinstance(item, Collection):
+                groups['smart'].append(i)
+            
+            else:
+                message = "Unsupported item type to be used for count! --> %s" % type(item)
+                raise TypeError(message)
+        
+        # init stored counts queries
+        queries = (
+            ('journals', "SELECT id AS item, articles_count AS count FROM journals WHERE id IN (%s)"),
+            ('authors', "SELECT id AS item, articles_count AS count FROM authors WHERE id IN (%s)"),
+            ('labels', "SELECT id AS item, articles_count AS count FROM labels WHERE id IN (%s)"),
+            ('manual', "SELECT id AS item, articles_count AS count FROM collections WHERE id IN (%s)"),
+            ('materialized', "SELECT collection AS item, COUNT(*) AS count FROM articles_smart WHERE collection IN (%s) GROUP BY collection"))
+        
+        # assert connection
+        close_db = self._db.connect()
+        
+        # read stored counts
+        for group, query in queries:
+            
+            # check items
+            indices = groups[group]
+            if not indices:
+                continue
+            
+            # get counts
+            ids = list(set(items[i].dbid for i in indices))
+            rows = self._fetch_chunks(query, ids)
+            results = {x['item']: x['count'] for x in rows}
+            
+            # set counts
+            for i in indices:
+                counts[i] = results.get(items[i].dbid, 0)
+        
+        # count smart collections
+        if groups['smart']:
+            self._count_smart(items, groups['smart'], counts)
+        
+        # close connection
+        if close_db:
+            self._db.close()
+        
+        return counts
+    
+    
+    def stats(self, query=None):
+        """
+        Calculates articles statistics by aggregate queries without creating
+        any articles. Articles in trash are included.
+        
+        Args:
+            query: core.Query or None
+                Articles query to limit the statistics to. If set to None,
+                all articles are used and unused items are reported as well.
+        
+        Returns:
+            stats: dict
+                Statistics as 'total' articles count, 'authors', 'journals'
+                and 'labels' as list of (dbid, name, count) and 'published'
+                and 'imported' years as list of (year, count).
+        """
+        
+        # init stats
+        stats = {
+            'total': 0,
+            'authors': [],
+            'journals': [],
+            'labels': [],
+            'published': [],
+            'imported': []}
+        
+        # init scope
+        scope = ""
+        values = []
+        
+        # get query conditions
+        if query is not None:
+            conditions, values = query.where()
+            
+            # check query
+            if conditions is None:
+                return stats
+            
+            if conditions:
+                scope = "SELECT articles.id FROM articles WHERE %s" % conditions
+        
+        # init queries
+        if scope:
+            total = "SELECT COUNT(*) FROM articles WHERE %s" % conditions
+            authors = "SELECT authors.id AS dbid, lastname, firstname, COUNT(*) AS count FROM articles_authors JOIN authors ON authors.id = articles_authors.author WHERE article IN (%s) GROUP BY authors.id" % scope
+            journals = "SELECT journals.id AS dbid, abbreviation AS name, COUNT(*) AS count FROM articles JOIN journals ON journals.id = articles.journal WHERE articles.id IN (%s) GROUP BY journals.id" % scope
+            labels = "SELECT labels.id AS dbid, title AS name, COUNT(*) AS count FROM articles_labels JOIN labels ON labels.id = articles_labels.label WHERE article IN (%s) GROUP BY labels.id" % scope
+            scope = "AND articles.id IN (%s)" % scope
+        
+        else:
+            total = "SELECT COUNT(*) FROM articles"
+            authors = "SELECT id AS dbid, lastname, firstname, articles_count AS count FROM authors"
+            journals = "SELECT id AS dbid, abbreviation AS name, articles_count AS count FROM journals"
+            labels = "SELECT id AS dbid, title AS name, articles_count AS count FROM labels"
+        
+        published = "SELECT year, COUNT(*) AS count FROM articles WHERE year %s GROUP BY year" % scope
+        imported = "SELECT strftime('%%Y', imported, 'unixepoch') AS year, COUNT(*) AS count FROM articles WHERE imported %s GROUP BY 1" % scope
+        
+        # assert connection
+        close_db = self._db.connect()
+        
+        # count articles
+        self._db.cursor.execute(total, values)
+        stats['total'] = int(self._db.cursor.fetchone()[0])
+        
+        # count authors
+        self._db.cursor.execute(authors, values)
+        for row in self._db.cursor.fetchall():
+            name = "%s %s" % (row['lastname'], row['firstname']) if row['lastname'] and row['firstname'] else row['lastname']
+            stats['authors'].append((row['dbid'], name, row['count']))
+        
+        # count journals and labels
+        for key, sql in (('journals', journals), ('labels', labels)):
+            self._db.cursor.execute(sql, values)
+            stats[key] = [(x['dbid'], x['name'], x['count']) for x in self._db.cursor.fetchall()]
+        
+        # count published and imported years
+        for key, sql in (('published', published), ('imported', imported)):
+            self._db.cursor.execute(sql, values)
+            stats[key] = [(x['year'], x['count']) for x in self._db.cursor.fetchall()]
+        
+        # close connection
+        if close_db:
+            self._db.close()
+        
+        return stats
+    
+    
     def merge(self, master, items, commit=True):
         """
         Merges given items inside database.
@@ -498,6 +1001,9 @@ class Library(object):
         # assert connection
         close_db = self._db.connect()
         
+        # get related articles
+        articles_ids = list(set(x for item in items for x in self._get_related_ids(item)))
+        
         # merge authors
         if isinstance(master, Author):
             self._merge_authors(master, items)
@@ -511,9 +1017,15 @@ class Library(object):
             message = "Unknown items type to be merged! --> %s" % type(items[0])
             raise TypeError(message)
         
+        # refresh smart collections
+        self._refresh_smart(articles_ids=articles_ids)
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
@@ -576,9 +1088,15 @@ class Library(object):
             query = "INSERT INTO articles_collections (collection, article) VALUES (?,?)"
             self._db.cursor.executemany(query, values)
         
+        # refresh smart collections
+        self._refresh_smart(articles_ids=[x.dbid for x in articles])
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
@@ -653,23 +1171,78 @@ class Library(object):
             query = "INSERT INTO articles_labels (label, article) VALUES (?,?)"
             self._db.cursor.executemany(query, values)
         
+        # refresh smart collections
+        self._refresh_smart(articles_ids=[x.dbid for x in articles])
+        
+        # invalidate cached results
+        self._writes += 1
+        
         # save changes
         if commit:
-            self._db.connection.commit()
+            self._commit()
         
         # close connection
         if close_db:
             self._db.close()
     
     
-    def backup(self):
-        """Creates current database backup."""
-        
-        # get time stamp
-        stamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d_%H-%M-%S')
+    def refresh_smart(self, collections=None, timed=False, commit=True):
+        """
+        Rebuilds stored articles of materialized smart collections. This is
+        needed regularly for collections using time-based conditions (e.g.
+        [RECENT]) or after the database was modified directly.
         
-        # init file name
-        filename = "%s_%s.bak" % (self.db_path, stamp)
+        Args:
+            collections: list of Collection or None
+                Collections to be refreshed. If set to None, all materialized
+                collections are refreshed.
+            
+            timed: bool
+                If set to True, only collections using time-based conditions
+                are refreshed.
+            
+            commit: bool
+                If set to True changes will be committed.
+        
+        Returns:
+            changed: bool
+                True if stored articles of any collection were changed.
+        """
+        
+        # get collections IDs
+        collections_ids = None
+        if collections is not None:
+            collections_ids = [x.dbid for x in collections if x.dbid]
+        
+        # assert connection
+        close_db = self._db.connect()
+        
+        # refresh collections
+        changed = self._refresh_smart(collections_ids=collections_ids, timed=timed)
+        
+        # invalidate cached results
+        if changed:
+            self._writes += 1
+        
+        # save changes
+        if changed and commit:
+            self._commit()
+        
+        # close connection
+        if close_db:
+            self._db.close()
+        
+        return changed
+    
+    
+    def backup(self):
+        """Creates current database backup."""
+        
+        # get time stamp
+        stamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d_%H-%M-%S')
+        
+        # init file name
+        filename = "%s_%s.bak" % (self.db_path, stamp)
         
         # duplicate file
         try:
@@ -679,6 +1252,59 @@ class Library(object):
             return False
     
     
+    def clear_cache(self):
+        """Removes all cached search and count results."""
+        
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_rows = 0
+    
+    
+    def clear_slow_queries(self):
+        """Removes all logged slow statements."""
+        
+        self._db.clear_slow_log()
+    
+    
+    def dump_slow_queries(self, path=None):
+        """
+        Formats logged slow statements as text and writes it into a file.
+        
+        Args:
+            path: str or None
+                Path of the output file. If set to None, no file is written.
+        
+        Returns:
+            text: str
+                Formatted log.
+        """
+        
+        # init buffer
+        buff = ""
+        
+        # format statements
+        for record in self._db.slow_log:
+            
+            stamp = datetime.datetime.fromtimestamp(record['time']).strftime('%Y-%m-%d %H:%M:%S')
+            sql = " ".join(record['sql'].split())
+            sql = re.sub(r'\?(,\?){3,}', '?,...', sql)
+            
+            buff += "%s  %.1f ms  %s\n" % (stamp, 1000 * record['duration'], record['caller'])
+            buff += "%s\n" % sql
+            
+            if record['values']:
+                buff += "%s\n" % (list(record['values']),)
+            
+            buff += "\n"
+        
+        # write file
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(buff)
+        
+        return buff
+    
+    
     def _insert_article(self, article):
         """Inserts new article."""
         
@@ -701,12 +1327,13 @@ class Library(object):
                     issue,
                     pages,
                     title,
+                    title_norm,
                     abstract,
                     notes,
                     pdf,
                     colour,
                     rating
-                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
         
         values = (
             article.key,
@@ -718,6 +1345,7 @@ class Library(object):
             article.issue,
             article.pages,
             article.title,
+            normalize_text(article.title),
             article.abstract,
             article.notes,
             int(article.pdf),
@@ -741,6 +1369,147 @@ class Library(object):
         
         # insert labels
         self._insert_article_labels(article, article.labels)
+        
+        # mark stored values
+        article.reset_changes()
+    
+    
+    def _prepare_article(self, article, created):
+        """Makes values and links of new article matching or inserting related items."""
+        
+        # set insertion time
+        if article.imported is None:
+            article.imported = time.time()
+        
+        # make values
+        values = [
+            article.key,
+            article.imported,
+            article.doi,
+            article.pmid,
+            None,
+            article.year,
+            article.volume,
+            article.issue,
+            article.pages,
+            article.title,
+            normalize_text(article.title),
+            article.abstract,
+            article.notes,
+            int(article.pdf),
+            article.colour,
+            article.rating]
+        
+        # match journal or insert new one
+        journal = article.journal
+        if journal is not None:
+            
+            if not journal.dbid:
+                self._match_journal(journal)
+            
+            if not journal.dbid:
+                self._insert_journal(journal)
+                created.append(journal)
+            
+            values[4] = journal.dbid
+        
+        # match authors or insert new ones
+        authors_ids = []
+        for author in article.authors or []:
+            
+            if not author.dbid:
+                self._match_author(author)
+            
+            if not author.dbid:
+                self._insert_author(author)
+                created.append(author)
+            
+            authors_ids.append(author.dbid)
+        
+        # match labels or insert new ones
+        labels_ids = []
+        for label in article.labels or []:
+            
+            if not label.dbid:
+                self._match_label(label)
+            
+            if not label.dbid:
+                self._insert_label(label)
+                created.append(label)
+            
+            labels_ids.append(label.dbid)
+        
+        return article, values, authors_ids, labels_ids
+    
+    
+    def _insert_articles_rows(self, articles, failures):
+        """Inserts articles rows and new related items falling back to single articles on error."""
+        
+        # make query
+        query = """INSERT INTO articles (
+                    key,
+                    imported,
+                    doi,
+                    pmid,
+                    journal,
+                    year,
+                    volume,
+                    issue,
+                    pages,
+                    title,
+                    title_norm,
+                    abstract,
+                    notes,
+                    pdf,
+                    colour,
+                    rating
+                    ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
+        
+        # init new related items
+        created = []
+        
+        # insert all articles
+        self._db.cursor.execute("SAVEPOINT insert_many")
+        try:
+            batch = [self._prepare_article(x, created) for x in articles]
+            self._db.cursor.executemany(query, [x[1] for x in batch])
+            self._db.cursor.execute("RELEASE insert_many")
+            return batch
+        
+        except Exception:
+            self._db.cursor.execute("ROLLBACK TO insert_many")
+            self._db.cursor.execute("RELEASE insert_many")
+            self._discard_items(created)
+        
+        # insert articles one by one
+        inserted = []
+        for article in articles:
+            
+            self._db.cursor.execute("SAVEPOINT insert_one")
+            try:
+                item = self._prepare_article(article, created)
+                self._db.cursor.execute(query, item[1])
+                inserted.append(item)
+            
+            except Exception as error:
+                self._db.cursor.execute("ROLLBACK TO insert_one")
+                self._discard_items(created)
+                failures.append((article, str(error)))
+            
+            self._db.cursor.execute("RELEASE insert_one")
+            del created[:]
+        
+        return inserted
+    
+    
+    def _discard_items(self, items):
+        """Resets journals, authors and labels whose insertion was rolled back."""
+        
+        for item in items:
+            self._resolve('remove', item)
+            item.dbid = None
+        
+        del items[:]
     
     
     def _insert_journal(self, journal):
@@ -749,18 +1518,25 @@ class Library(object):
         # make query
         query = """INSERT INTO journals (
                     title,
-                    abbreviation
-                    ) VALUES (?,?)"""
+                    title_norm,
+                    abbreviation,
+                    abbreviation_norm
+                    ) VALUES (?,?,?,?)"""
         
         values = (
             journal.title,
-            journal.abbreviation)
+            normalize_text(journal.title),
+            journal.abbreviation,
+            normalize_text(journal.abbreviation))
         
         # execute query
         self._db.cursor.execute(query, values)
         
         # set assigned DBID
         journal.dbid = self._db.cursor.lastrowid
+        
+        # update matching
+        self._resolve('add', journal)
     
     
     def _insert_author(self, author):
@@ -769,14 +1545,18 @@ class Library(object):
         # make query
         query = """INSERT INTO authors (
                     shortname,
+                    shortname_norm,
                     lastname,
+                    lastname_norm,
                     firstname,
                     initials
-                    ) VALUES (?,?,?,?)"""
+                    ) VALUES (?,?,?,?,?,?)"""
         
         values = (
             author.shortname,
+            normalize_text(author.shortname),
             author.lastname,
+            normalize_text(author.lastname),
             author.firstname,
             author.initials)
         
@@ -785,20 +1565,26 @@ class Library(object):
         
         # set assigned DBID
         author.dbid = self._db.cursor.lastrowid
+        
+        # update matching
+        self._resolve('add', author)
     
     
     def _insert_label(self, label):
         """Inserts new label."""
         
         # make query
-        query = """INSERT INTO labels (title) VALUES (?)"""
-        values = (label.title,)
+        query = """INSERT INTO labels (title, title_norm) VALUES (?,?)"""
+        values = (label.title, normalize_text(label.title))
         
         # execute query
         self._db.cursor.execute(query, values)
         
         # set assigned DBID
         label.dbid = self._db.cursor.lastrowid
+        
+        # update matching
+        self._resolve('add', label)
     
     
     def _insert_collection(self, collection):
@@ -809,14 +1595,16 @@ class Library(object):
                     title,
                     query,
                     priority,
-                    export
-                    ) VALUES (?,?,?,?)"""
+                    export,
+                    materialized
+                    ) VALUES (?,?,?,?,?)"""
         
         values = (
             collection.title,
             collection.query,
             collection.priority,
-            collection.export)
+            collection.export,
+            collection.materialized)
         
         # execute query
         self._db.cursor.execute(query, values)
@@ -920,57 +1708,57 @@ class Library(object):
     
     
     def _update_article(self, article):
-        """Updates existing article."""
+        """Updates changed columns and relations of existing article."""
         
-        # make article query
-        query = """UPDATE articles SET
-                    doi = ?,
-                    pmid = ?,
-                    journal = NULL,
-                    year = ?,
-                    volume = ?,
-                    issue = ?,
-                    pages = ?,
-                    title = ?,
-                    abstract = ?,
-                    notes = ?,
-                    pdf = ?,
-                    colour = ?,
-                    rating = ?
-                    WHERE id = ?"""
+        # get changed attributes
+        changes = article.changes
+        if changes is None:
+            changes = UPDATE_COLUMNS + UPDATE_RELATIONS
         
-        values = (
-            article.doi,
-            article.pmid,
-            article.year,
-            article.volume,
-            article.issue,
-            article.pages,
-            article.title,
-            article.abstract,
-            article.notes,
-            int(article.pdf),
-            article.colour,
-            article.rating,
-            article.dbid)
+        # check changes
+        if not changes:
+            return
+        
+        # make article values
+        columns = [x for x in UPDATE_COLUMNS if x in changes]
+        values = [getattr(article, x) for x in columns]
+        
+        if 'title' in changes:
+            columns.append('title_norm')
+            values.append(normalize_text(article.title))
+        
+        if 'journal' in changes:
+            columns.append('journal')
+            values.append(None)
         
-        # get stored version of this article
-        old_article = self._get_article(article.dbid)
+        # get stored version of this article if PDF may change
+        old_article = None
+        if any(x in changes for x in PDF_ATTRIBUTES):
+            old_article = self._get_article(article.dbid)
         
         # execute article query
-        self._db.cursor.execute(query, values)
+        if columns:
+            query = "UPDATE articles SET %s WHERE id = ?" % ", ".join("%s = ?" % x for x in columns)
+            self._db.cursor.execute(query, values + [article.dbid])
         
         # insert journal
-        self._insert_article_journal(article, article.journal)
+        if 'journal' in changes:
+            self._insert_article_journal(article, article.journal)
         
         # insert authors
-        self._insert_article_authors(article, article.authors)
+        if 'authors' in changes:
+            self._insert_article_authors(article, article.authors)
         
         # insert labels
-        self._insert_article_labels(article, article.labels)
+        if 'labels' in changes:
+            self._insert_article_labels(article, article.labels)
         
         # update PDF
-        self._update_article_pdf(article, old_article)
+        if old_article is not None:
+            self._update_article_pdf(article, old_article)
+        
+        # mark stored values
+        article.reset_changes()
     
     
     def _update_journal(self, journal):
@@ -979,16 +1767,23 @@ class Library(object):
         # make query
         query = """UPDATE journals SET
                     title = ?,
-                    abbreviation = ?
+                    title_norm = ?,
+                    abbreviation = ?,
+                    abbreviation_norm = ?
                     WHERE id = ?"""
         
         values = (
             journal.title,
+            normalize_text(journal.title),
             journal.abbreviation,
+            normalize_text(journal.abbreviation),
             journal.dbid)
         
         # execute query
         self._db.cursor.execute(query, values)
+        
+        # update matching
+        self._resolve('update', journal)
     
     
     def _update_author(self, author):
@@ -1000,20 +1795,27 @@ class Library(object):
         # make query
         query = """UPDATE authors SET
                     shortname = ?,
+                    shortname_norm = ?,
                     lastname = ?,
+                    lastname_norm = ?,
                     firstname = ?,
                     initials = ?
                     WHERE id = ?"""
         
         values = (
             author.shortname,
+            normalize_text(author.shortname),
             author.lastname,
+            normalize_text(author.lastname),
             author.firstname,
             author.initials,
             author.dbid)
         
         # execute query
         self._db.cursor.execute(query, values)
+        
+        # update matching
+        self._resolve('update', author)
     
     
     def _update_label(self, label):
@@ -1021,15 +1823,20 @@ class Library(object):
         
         # make query
         query = """UPDATE labels SET
-                    title = ?
+                    title = ?,
+                    title_norm = ?
                     WHERE id = ?"""
         
         values = (
             label.title,
+            normalize_text(label.title),
             label.dbid)
         
         # execute query
         self._db.cursor.execute(query, values)
+        
+        # update matching
+        self._resolve('update', label)
     
     
     def _update_collection(self, collection):
@@ -1040,7 +1847,8 @@ class Library(object):
                     title = ?,
                     query = ?,
                     priority = ?,
-                    export = ?
+                    export = ?,
+                    materialized = ?
                     WHERE id = ?"""
         
         values = (
@@ -1048,6 +1856,7 @@ class Library(object):
             collection.query,
             collection.priority,
             collection.export,
+            collection.materialized,
             collection.dbid)
         
         # execute query
@@ -1110,100 +1919,78 @@ class Library(object):
     def _match_journal(self, journal):
         """Updates attributes by matching journal."""
         
-        # prepare conditions and values
-        conditions = []
-        values = []
-        
-        if journal.abbreviation:
-            conditions.append("(LOWER(abbreviation) = ? OR abbreviation = '' OR abbreviation IS NULL)")
-            values.append(journal.abbreviation.lower())
-        
-        elif journal.title:
-            conditions.append("(LOWER(title) = ? OR title = '' OR title IS NULL)")
-            values.append(journal.title.lower())
-        
-        # check conditions
-        if not conditions:
-            return
-        
-        # get matching item
-        query = "SELECT * FROM journals WHERE %s" % " AND ".join(conditions)
-        self._db.cursor.execute(query, values)
-        data = self._db.cursor.fetchone()
-        
-        # check matching item
-        if not data:
-            return
-        
-        # update attributes
-        journal.dbid = data['id']
-        
-        if data['title']:
-            journal.title = data['title']
-        
-        if data['abbreviation']:
-            journal.abbreviation = data['abbreviation']
+        with self._resolver_lock:
+            self._get_resolver().match_journal(journal)
     
     
     def _match_author(self, author):
         """Updates attributes by matching author."""
         
-        # prepare conditions and values
-        conditions = []
-        values = []
-        
-        if author.firstname:
-            conditions.append("(LOWER(firstname) = ? OR firstname = '' OR firstname IS NULL)")
-            values.append(author.firstname.lower())
-        
-        if author.lastname:
-            conditions.append("(LOWER(lastname) = ? OR lastname = '' OR lastname IS NULL)")
-            values.append(author.lastname.lower())
-        
-        if author.initials:
-            conditions.append("(LOWER(initials) = ? OR initials = '' OR initials IS NULL)")
-            values.append(author.initials.lower())
+        with self._resolver_lock:
+            self._get_resolver().match_author(author)
+    
+    
+    def _match_label(self, label):
+        """Updates attributes by matching label."""
         
-        # check conditions
-        if not conditions:
-            return
+        with self._resolver_lock:
+            self._get_resolver().match_label(label)
+    
+    
+    def _get_resolver(self):
+        """Gets in-memory matching of journals, authors and labels."""
         
-        # get matching item
-        query = "SELECT * FROM authors WHERE %s" % " AND ".join(conditions)
-        self._db.cursor.execute(query, values)
-        data = self._db.cursor.fetchone()
+        # check external changes
+        version = self._db.data_version
+        valid = self._resolver_version == version
         
-        # check matching item
-        if not data:
-            return
+        # check discarded own changes
+        if self._resolver_dirty and not self._db.connection.in_transaction:
+            valid = False
         
-        # update attributes
-        author.dbid = data['id']
+        # use current items
+        if self._resolver is not None and valid:
+            return self._resolver
         
-        if data['firstname']:
-            author.firstname = data['firstname']
+        # load items
+        self._resolver = Resolver(self._db)
+        self._resolver.load()
+        self._resolver_version = version
+        self._resolver_dirty = False
         
-        if data['lastname']:
-            author.lastname = data['lastname']
+        return self._resolver
+    
+    
+    def _resolve(self, action, item=None):
+        """Applies change of journal, author or label to in-memory matching if loaded."""
         
-        if data['initials']:
-            author.initials = data['initials']
+        with self._resolver_lock:
+            
+            # drop matching
+            if action == 'clear':
+                self._resolver = None
+            
+            # update matching
+            elif self._resolver is not None:
+                getattr(self._resolver, action)(item)
+                self._resolver_dirty = True
     
     
-    def _match_label(self, label):
-        """Updates attributes by matching label."""
+    def _commit(self):
+        """Commits changes keeping in-memory matching valid for own changes."""
         
-        # get matching label
-        self._db.cursor.execute("SELECT * FROM labels WHERE LOWER(title) = ?", (label.title.lower(),))
-        data = self._db.cursor.fetchone()
+        # get current version
+        version = self._db.data_version
+        changed = self._db.connection.in_transaction
         
-        # check matching item
-        if not data:
-            return
+        # commit changes
+        self._db.connection.commit()
         
-        # update attributes
-        label.dbid = data['id']
-        label.title = data['title']
+        # update matching version
+        with self._resolver_lock:
+            if changed and self._resolver_version == version:
+                self._resolver_version = self._db.data_version
+                self._resolver_dirty = False
     
     
     def _merge_authors(self, master, authors):
@@ -1229,6 +2016,10 @@ class Library(object):
                     WHERE id IN (%s)""" % placeholders
         
         self._db.cursor.execute(query, others_ids)
+        
+        # update matching
+        for author in authors:
+            self._resolve('remove', author)
     
     
     def _merge_journals(self, master, journals):
@@ -1251,6 +2042,10 @@ class Library(object):
                     WHERE id IN (%s)""" % placeholders
         
         self._db.cursor.execute(query, others_ids)
+        
+        # update matching
+        for journal in journals:
+            self._resolve('remove', journal)
     
     
     def _get_article(self, article_id):
@@ -1262,90 +2057,545 @@ class Library(object):
         if not data:
             return None
         
-        article = Article.from_db(data)
-        article.journal = self._get_journal(data['journal'])
-        article.authors = self._get_authors(data['id'])
-        article.labels = self._get_labels(data['id'])
-        article.collections = self._get_collections(data['id'])
-        article.library_path = self._library_path
+        return self._make_articles([data])[0]
+    
+    
+    def _count_smart(self, items, indices, counts):
+        """Counts articles of smart collections within shared table scans."""
         
-        return article
+        # make count columns
+        columns = []
+        for i in indices:
+            
+            # make conditions
+            conditions, values = Query(items[i].query, Article.NAME).where()
+            
+            # skip invalid query
+            if conditions is None:
+                continue
+            
+            # add column
+            if conditions:
+                columns.append((i, "COUNT(CASE WHEN %s THEN 1 END)" % conditions, values))
+            else:
+                columns.append((i, "COUNT(*)", []))
+        
+        # count in batches
+        while columns:
+            
+            # make batch
+            batch = []
+            values = []
+            while columns and len(values) < CHUNK_SIZE:
+                batch.append(columns.pop(0))
+                values += batch[-1][2]
+            
+            # execute query
+            query = "SELECT %s FROM articles" % ", ".join(x[1] for x in batch)
+            data = self._fetch_cached(query, values)[0]
+            
+            # set counts
+            for item, count in zip(batch, data):
+                counts[item[0]] = int(count)
     
     
-    def _get_journal(self, journal_id):
-        """Gets journal by its id."""
+    def _refresh_smart(self, articles_ids=None, collections_ids=None, timed=False):
+        """Refreshes stored articles of materialized smart collections and checks for changes."""
         
-        self._db.cursor.execute("SELECT * FROM journals WHERE id = ?", (journal_id,))
-        data = self._db.cursor.fetchone()
+        # check articles
+        if articles_ids is not None and not articles_ids:
+            return False
         
-        if not data:
-            return None
+        # get current changes count
+        changes = self._db.connection.total_changes
+        
+        # remove stored articles of changed collections
+        if collections_ids is not None:
+            if not collections_ids:
+                return False
+            
+            query = "DELETE FROM articles_smart WHERE collection IN (%s)"
+            self._fetch_chunks(query, collections_ids)
+        
+        # get materialized collections
+        self._db.cursor.execute("SELECT id, query FROM collections WHERE materialized = 1 AND query IS NOT NULL ORDER BY id")
+        queries = {x['id']: Query(x['query'], Article.NAME) for x in self._db.cursor.fetchall()}
+        
+        # sort referenced collections first
+        order, references = self._sort_smart(queries)
+        
+        # get collections to rebuild
+        selected = None
+        if collections_ids is not None:
+            selected = set(collections_ids)
+        elif timed:
+            selected = set(x for x, q in queries.items() if any(t in ARTICLES_TIMED_TAGS for t in q.tags))
+        
+        # add collections referencing rebuilt ones
+        if selected is not None:
+            for dbid in order:
+                if references[dbid] & selected:
+                    selected.add(dbid)
+        
+        # check collections to rebuild
+        if selected is not None and not selected:
+            return self._db.connection.total_changes != changes
+        
+        # refresh collections
+        for dbid in order:
+            
+            # check collection
+            if selected is not None and dbid not in selected:
+                continue
+            
+            # make conditions
+            conditions, values = queries[dbid].where()
+            
+            # make select and insert query
+            select = "SELECT articles.id FROM articles"
+            sql = "INSERT INTO articles_smart (collection, article) SELECT %d, articles.id FROM articles" % dbid
+            if conditions:
+                select += " WHERE (%s)" % conditions
+                sql += " WHERE (%s)" % conditions
+            
+            # rebuild collection
+            if articles_ids is None:
+                
+                # get stored articles
+                self._db.cursor.execute("SELECT article FROM articles_smart WHERE collection = ?", (dbid,))
+                stored = set(x[0] for x in self._db.cursor.fetchall())
+                
+                # get matching articles
+                matching = set()
+                if conditions is not None:
+                    self._db.cursor.execute(select, values)
+                    matching = set(x[0] for x in self._db.cursor.fetchall())
+                
+                # skip unchanged collection
+                if stored == matching:
+                    continue
+                
+                # remove stored articles
+                self._db.cursor.execute("DELETE FROM articles_smart WHERE collection = ?", (dbid,))
+                
+                # insert matching articles
+                if matching:
+                    self._db.cursor.execute(sql, values)
+                
+                continue
+            
+            # refresh changed articles only
+            sql += " AND" if conditions else " WHERE"
+            sql += " articles.id IN (%s)"
+            
+            for i in range(0, len(articles_ids), CHUNK_SIZE):
+                chunk = articles_ids[i:i+CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                
+                # remove stored articles
+                query = "DELETE FROM articles_smart WHERE collection = ? AND article IN (%s)" % placeholders
+                self._db.cursor.execute(query, [dbid] + chunk)
+                
+                # insert matching articles
+                if conditions is not None:
+                    self._db.cursor.execute(sql % placeholders, list(values) + chunk)
         
-        return Journal.from_db(data)
+        return self._db.connection.total_changes != changes
     
     
-    def _get_authors(self, article_id):
-        """Gets authors by article id."""
+    def _sort_smart(self, queries):
+        """Sorts materialized collections so that referenced collections come first."""
         
-        authors = []
+        # get referenced collections
+        references = {}
+        for dbid, query in queries.items():
+            ids = set(int(x) for x in query.values('[SMARTID]') if str(x).isdigit())
+            references[dbid] = ids.intersection(queries).difference((dbid,))
         
-        query = """SELECT * FROM articles_authors
-                    LEFT JOIN authors ON articles_authors.author = authors.id 
-                    WHERE articles_authors.article = ?
-                    ORDER BY articles_authors.priority"""
+        # sort by references
+        order = []
+        done = set()
+        pending = sorted(queries)
+        while pending:
+            
+            # get collections with all references done
+            ready = [x for x in pending if references[x] <= done]
+            
+            # break circular references by id
+            if not ready:
+                ready = pending[:1]
+            
+            order += ready
+            done.update(ready)
+            pending = [x for x in pending if x not in done]
+        
+        return order, references
+    
+    
+    def _get_related_ids(self, item):
+        """Gets IDs of articles linked to given journal, author, label or collection."""
         
-        self._db.cursor.execute(query, (article_id,))
+        # get articles of journal
+        if isinstance(item, Journal):
+            query = "SELECT id FROM articles WHERE journal = ?"
+        
+        # get articles of author
+        elif isinstance(item, Author):
+            query = "SELECT article AS id FROM articles_authors WHERE author = ?"
         
-        for data in self._db.cursor.fetchall():
-            authors.append(Author.from_db(data))
+        # get articles of label
+        elif isinstance(item, Label):
+            query = "SELECT article AS id FROM articles_labels WHERE label = ?"
+        
+        # get articles of manual collection
+        elif isinstance(item, Collection):
+            query = "SELECT article AS id FROM articles_collections WHERE collection = ?"
         
-        return authors
+        # no related articles
+        else:
+            return []
+        
+        # execute query
+        self._db.cursor.execute(query, (item.dbid,))
+        
+        return [x['id'] for x in self._db.cursor.fetchall()]
     
     
-    def _get_labels(self, article_id):
-        """Gets labels by article id."""
+    def _search(self, query, lazy, profile, order_by, reverse, after, limit):
+        """Retrieves items and raw rows according to given query."""
         
-        labels = []
+        # check query type
+        if not isinstance(query, Query):
+            message = "Query must be of type Query! --> '%s" % type(query)
+            raise TypeError(message)
         
-        query = """SELECT * FROM articles_labels
-                    LEFT JOIN labels ON articles_labels.label = labels.id 
-                    WHERE articles_labels.article = ?
-                    ORDER BY labels.title"""
+        # check profile
+        if profile not in PROFILES:
+            message = "Unsupported columns profile! --> '%s" % profile
+            raise KeyError(message)
         
-        self._db.cursor.execute(query, (article_id,))
+        # init buffers
+        results = []
+        items = []
+        
+        # get columns
+        columns = None
+        if query.entity == Article.NAME:
+            columns = PROFILES[profile]
+        
+        # make query and values
+        sql, values = query.select(columns, order_by, reverse, after, limit)
+        
+        # assert connection
+        close_db = self._db.connect()
         
-        for data in self._db.cursor.fetchall():
-            labels.append(Label.from_db(data))
+        # execute query
+        if sql is not None:
+            results = self._fetch_cached(sql, values)
         
-        return labels
+        # make articles
+        if query.entity == Article.NAME:
+            items = self._make_articles(results, lazy)
+        
+        # make journals
+        elif query.entity == Journal.NAME:
+            items = [Journal.from_db(x) for x in results]
+        
+        # make authors
+        elif query.entity == Author.NAME:
+            items = [Author.from_db(x) for x in results]
+        
+        # make labels
+        elif query.entity == Label.NAME:
+            items = [Label.from_db(x) for x in results]
+        
+        # make collections
+        elif query.entity == Collection.NAME:
+            items = [Collection.from_db(x) for x in results]
+        
+        # unknown entity
+        else:
+            message = "Unsupported entity for query! --> '%s" % query.entity
+            raise KeyError(message)
+        
+        # close connection
+        if close_db:
+            self._db.close()
+        
+        return items, results
+    
+    
+    def _fetch_cached(self, sql, values):
+        """Retrieves rows of given query from results cache or database."""
+        
+        key = (sql, tuple(values))
+        version = (self._writes, self._db.data_version)
+        
+        with self._cache_lock:
+            
+            # drop outdated results
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_rows = 0
+                self._cache_version = version
+            
+            # get cached rows
+            rows = self._cache.get(key, None)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                self._cache_hits += 1
+                return rows
+            
+            self._cache_misses += 1
+        
+        # execute query
+        self._db.cursor.execute(sql, values)
+        rows = self._db.cursor.fetchall()
+        
+        with self._cache_lock:
+            
+            # skip outdated or too large results
+            if version != self._cache_version or len(rows) > RESULTS_CACHE_ROWS:
+                return rows
+            
+            # store rows
+            self._cache[key] = rows
+            self._cache_rows += len(rows)
+            
+            # remove least recently used
+            while len(self._cache) > RESULTS_CACHE_SIZE or self._cache_rows > RESULTS_CACHE_ROWS:
+                key, old = self._cache.popitem(last=False)
+                self._cache_rows -= len(old)
+        
+        return rows
+    
+    
+    def _make_articles(self, rows, lazy=False):
+        """Creates articles from database rows including all relations."""
+        
+        # make articles
+        articles = [Article.from_db(x) for x in rows]
+        
+        # get journals
+        journals_ids = set(x['journal'] for x in rows if x['journal'] is not None)
+        journals = self._fetch_journals(journals_ids)
+        
+        # set journals
+        for article, data in zip(articles, rows):
+            journal = journals.get(data['journal'], None)
+            article.journal = Journal.from_db(journal) if journal else None
+            article.library_path = self._library_path
+        
+        # defer heavy columns
+        if rows and not all(x in rows[0].keys() for x in HEAVY_COLUMNS):
+            loader = self._make_columns_loader()
+            for article in articles:
+                article.defer(HEAVY_COLUMNS, loader)
+        
+        # defer relations
+        if lazy:
+            loader = self._make_relations_loader(articles)
+            for article in articles:
+                article.defer(RELATIONS, loader)
+        
+        # set relations
+        else:
+            self._load_relations(articles)
+        
+        # mark loaded values
+        for article in articles:
+            article.reset_changes()
+        
+        return articles
+    
+    
+    def _make_relations_loader(self, articles):
+        """Creates loader to retrieve relations of all given articles at once."""
+        
+        # init waiting articles
+        waiting = list(articles)
+        
+        def loader(article):
+            
+            # get articles still waiting for relations
+            batch = [x for x in waiting if not x.deferred.isdisjoint(RELATIONS)]
+            del waiting[:]
+            
+            # assert connection
+            close_db = self._db.connect()
+            
+            # load relations
+            self._load_relations(batch, deferred=True)
+            
+            # close connection
+            if close_db:
+                self._db.close()
+        
+        return loader
+    
+    
+    def _make_columns_loader(self):
+        """Creates loader to retrieve heavy columns of single article."""
+        
+        def loader(article):
+            
+            # assert connection
+            close_db = self._db.connect()
+            
+            # get data
+            query = "SELECT %s FROM articles WHERE id = ?" % ", ".join(HEAVY_COLUMNS)
+            self._db.cursor.execute(query, (article.dbid,))
+            data = self._db.cursor.fetchone()
+            
+            # close connection
+            if close_db:
+                self._db.close()
+            
+            # set columns
+            names = [x for x in HEAVY_COLUMNS if x in article.deferred]
+            for name in names:
+                setattr(article, name, data[name] if data else None)
+            
+            # mark loaded values
+            article.reset_changes(names)
+        
+        return loader
+    
+    
+    def _load_columns(self, articles):
+        """Sets deferred heavy columns to all given articles at once."""
+        
+        # get data
+        query = "SELECT id, %s FROM articles WHERE id IN (%%s)" % ", ".join(HEAVY_COLUMNS)
+        rows = self._fetch_chunks(query, [x.dbid for x in articles])
+        data = {x['id']: x for x in rows}
+        
+        # set columns
+        for article in articles:
+            row = data.get(article.dbid, None)
+            names = [x for x in HEAVY_COLUMNS if x in article.deferred]
+            for name in names:
+                setattr(article, name, row[name] if row else None)
+            
+            # mark loaded values
+            article.reset_changes(names)
     
     
-    def _get_collections(self, article_id):
-        """Gets manual collections by article id."""
+    def _load_relations(self, articles, deferred=False):
+        """Sets authors, labels and collections to given articles."""
         
-        collections = []
+        # get IDs
+        articles_ids = [x.dbid for x in articles]
+        
+        # get related data
+        authors = self._fetch_articles_authors(articles_ids)
+        labels = self._fetch_articles_labels(articles_ids)
+        collections = self._fetch_articles_collections(articles_ids)
+        
+        # set relations
+        for article in articles:
+            
+            # skip explicitly set relations
+            names = article.deferred if deferred else RELATIONS
+            
+            if 'authors' in names:
+                rows = authors.get(article.dbid, [])
+                article.authors = [Author.from_db(x) for x in rows]
+                article.first_author = article.authors[0] if rows and rows[0]['priority'] == 0 else None
+            
+            if 'labels' in names:
+                article.labels = [Label.from_db(x) for x in labels.get(article.dbid, [])]
+            
+            if 'collections' in names:
+                article.collections = [Collection.from_db(x) for x in collections.get(article.dbid, [])]
+            
+            # mark loaded values
+            article.reset_changes(names)
+    
+    
+    def _fetch_journals(self, journals_ids):
+        """Gets journals data by journals ids."""
+        
+        query = """SELECT * FROM journals
+                    WHERE id IN (%s)"""
+        
+        rows = self._fetch_chunks(query, list(journals_ids))
         
-        query = """SELECT * FROM articles_collections
+        return {x['id']: x for x in rows}
+    
+    
+    def _fetch_articles_authors(self, articles_ids):
+        """Gets authors data grouped by articles ids."""
+        
+        query = """SELECT articles_authors.article, articles_authors.priority, authors.* FROM articles_authors
+                    LEFT JOIN authors ON articles_authors.author = authors.id
+                    WHERE articles_authors.article IN (%s)
+                    ORDER BY articles_authors.article, articles_authors.priority"""
+        
+        return self._group_rows(self._fetch_chunks(query, articles_ids))
+    
+    
+    def _fetch_articles_labels(self, articles_ids):
+        """Gets labels data grouped by articles ids."""
+        
+        query = """SELECT articles_labels.article, labels.* FROM articles_labels
+                    LEFT JOIN labels ON articles_labels.label = labels.id
+                    WHERE articles_labels.article IN (%s)
+                    ORDER BY articles_labels.article, labels.title"""
+        
+        return self._group_rows(self._fetch_chunks(query, articles_ids))
+    
+    
+    def _fetch_articles_collections(self, articles_ids):
+        """Gets manual collections data grouped by articles ids."""
+        
+        query = """SELECT articles_collections.article, collections.* FROM articles_collections
                     LEFT JOIN collections ON articles_collections.collection = collections.id
-                    WHERE articles_collections.article = ?
-                    ORDER BY collections.title"""
+                    WHERE articles_collections.article IN (%s)
+                    ORDER BY articles_collections.article, collections.title"""
         
-        self._db.cursor.execute(query, (article_id,))
+        return self._group_rows(self._fetch_chunks(query, articles_ids))
+    
+    
+    def _fetch_chunks(self, query, ids):
+        """Executes given IN query for all ids using chunks of limited size."""
+        
+        rows = []
+        
+        for i in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[i:i+CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            self._db.cursor.execute(query % placeholders, chunk)
+            rows += self._db.cursor.fetchall()
+        
+        return rows
+    
+    
+    def _group_rows(self, rows):
+        """Groups fetched link rows by article id."""
         
-        for data in self._db.cursor.fetchall():
-            collections.append(Collection.from_db(data))
+        groups = {}
         
-        return collections
+        for data in rows:
+            if data['article'] not in groups:
+                groups[data['article']] = []
+            groups[data['article']].append(data)
+        
+        return groups
     
     
     def _generate_article_key(self):
-        """Generates unique article key."""
+        """Generates unique article key checking database."""
+        
+        # get key size by highest possible articles count
+        self._db.cursor.execute("SELECT MAX(id) FROM articles")
+        size = self._get_article_key_size(self._db.cursor.fetchone()[0] or 0)
         
         # generate unique key
         while True:
             
             # generate random key
-            key = ''.join(random.SystemRandom().choice(KEY_CHARS) for i in range(KEY_SIZE))
+            key = self._make_article_key(size)
             
             # check key
             self._db.cursor.execute("SELECT id FROM articles WHERE key = ?", (key,))
@@ -1353,6 +2603,42 @@ class Library(object):
                 return key
     
     
+    def _generate_article_keys(self, count, keys):
+        """Generates given number of unique article keys checking given used keys."""
+        
+        # get key size
+        size = self._get_article_key_size(len(keys) + count)
+        
+        # generate unique keys
+        generated = set()
+        while len(generated) < count:
+            
+            # generate random key
+            key = self._make_article_key(size)
+            
+            # check key
+            if key not in keys:
+                generated.add(key)
+        
+        return list(generated)
+    
+    
+    def _get_article_key_size(self, count):
+        """Gets key size keeping given number of keys sparse within key space."""
+        
+        size = KEY_SIZE
+        while count > KEY_FILL * len(KEY_CHARS) ** size:
+            size += 1
+        
+        return size
+    
+    
+    def _make_article_key(self, size):
+        """Makes random article key of given size."""
+        
+        return "".join(_KEY_RANDOM.choices(KEY_CHARS, k=size))
+    
+    
     def _delete_article_pdf(self, article):
         """Removes article PDF."""
         
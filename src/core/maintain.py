@@ -2,10 +2,15 @@
 #  Copyright (c) Martin Strohalm. All rights reserved.
 
 # import modules
+import re
+
 from .library import Library
 from .query import Query
+from .article import Article
 from .journal import Journal
 from .author import Author
+from .collection import Collection
+from .schema import COUNT_COLUMNS
 
 
 def merge_duplicate_journals(library, backup=True, verbose=False):
@@ -115,3 +120,207 @@ def merge_duplicate_authors(library, backup=True, verbose=False):
             print("Merging: %s to %s" % (others, master))
         
         library.merge(master, others)
+
+
+def rebuild_counts(library, repair=True, verbose=False):
+    """
+    Verifies stored articles counts of journals, authors, labels and
+    collections and repairs them if requested. Returns list of mismatches as
+    (table, dbid, stored, actual).
+    """
+    
+    # check library
+    if isinstance(library, str):
+        library = Library(library, new=False, delete_old=False)
+    
+    # init buffer
+    mismatches = []
+    
+    # assert connection
+    close_db = library.db.connect()
+    
+    # check counts
+    for table, count in COUNT_COLUMNS:
+        
+        # get stored and actual counts
+        library.db.cursor.execute("SELECT id, articles_count, (%s) AS actual FROM %s" % (count, table))
+        rows = library.db.cursor.fetchall()
+        
+        # find mismatches
+        for row in rows:
+            if row['articles_count'] != row['actual']:
+                mismatches.append((table, row['id'], row['articles_count'], row['actual']))
+                
+                if verbose:
+                    print("Count mismatch: %s #%s stored %s actual %s" % mismatches[-1])
+        
+        # repair counts
+        if repair:
+            query = "UPDATE %s SET articles_count = ? WHERE id = ?" % table
+            values = [(x[3], x[1]) for x in mismatches if x[0] == table]
+            library.db.cursor.executemany(query, values)
+    
+    # commit changes
+    if repair:
+        library.db.connection.commit()
+    
+    # close connection
+    if close_db:
+        library.db.close()
+    
+    return mismatches
+
+
+def rebuild_smart(library, repair=True, verbose=False):
+    """
+    Verifies stored articles of materialized smart collections and rebuilds
+    them if requested. Returns list of mismatches as (dbid, stored, actual)
+    articles counts.
+    """
+    
+    # check library
+    if isinstance(library, str):
+        library = Library(library, new=False, delete_old=False)
+    
+    # init buffer
+    mismatches = []
+    
+    # get materialized collections
+    collections = library.search(Query("", Collection.NAME))
+    collections = [x for x in collections if x.query and x.materialized]
+    
+    # check collections
+    for collection in collections:
+        
+        # get stored articles
+        sql, values = Query("%s[SMARTID]" % collection.dbid, Article.NAME).select(columns=('id',))
+        stored = set(x['id'] for x in library.query(sql, values))
+        
+        # get actual articles
+        sql, values = Query(collection.query, Article.NAME).select(columns=('id',))
+        actual = set(x['id'] for x in library.query(sql, values)) if sql else set()
+        
+        # check mismatch
+        if stored != actual:
+            mismatches.append((collection.dbid, len(stored), len(actual)))
+            
+            if verbose:
+                print("Smart mismatch: #%s stored %s actual %s" % mismatches[-1])
+    
+    # rebuild collections
+    if repair:
+        library.refresh_smart(collections)
+    
+    return mismatches
+
+
+def verify_matches(library, queries=None, verbose=False):
+    """
+    Verifies that in-memory evaluation of articles queries agrees with SQL
+    for all articles in library. If no queries are specified, queries of
+    all smart collections and probes of all tags using library content are
+    checked. Returns list of mismatches as (query, dbid, sql, memory).
+    """
+    
+    # check library
+    if isinstance(library, str):
+        library = Library(library, new=False, delete_old=False)
+    
+    # get all articles
+    articles = library.search(Query("", Article.NAME))
+    
+    # get queries
+    if queries is None:
+        collections = library.search(Query("", Collection.NAME))
+        queries = [x.query for x in collections if x.query]
+        queries += _make_probes(articles)
+    
+    # init buffer
+    mismatches = []
+    
+    # check queries
+    for text in queries:
+        query = Query(text, Article.NAME)
+        
+        # skip queries using stored data
+        if not query.matchable:
+            continue
+        
+        # get SQL results
+        sql, values = query.select(columns=('id',))
+        ids = set(x['id'] for x in library.query(sql, values)) if sql else set()
+        
+        # compare with in-memory results
+        for article in articles:
+            
+            found = article.dbid in ids
+            match = query.matches(article)
+            
+            if found != match:
+                mismatches.append((text, article.dbid, found, match))
+                
+                if verbose:
+                    print("Match mismatch: %s #%s sql %s memory %s" % mismatches[-1])
+    
+    return mismatches
+
+
+def _make_probes(articles):
+    """Makes queries probing all articles tags by values of given articles."""
+    
+    probes = ["NULL[PMID]", "1[PDF]", "0[TRASH]", "30[RECENT]", "red[COLOUR]"]
+    used = set()
+    
+    # get values
+    for article in articles:
+        
+        authors = article.authors
+        labels = article.labels
+        journal = article.journal
+        
+        candidates = (
+            ("%s[ID]", article.dbid),
+            ("%s[KEY]", article.key),
+            ("%s[PMID]", article.pmid),
+            ("%s[DOI]", _get_word(article.doi)),
+            ("%s[PY]", article.year),
+            ("%s[TI]", _get_word(article.title)),
+            ("%s[AB]", _get_word(article.abstract)),
+            ("%s[NOTE]", _get_word(article.notes)),
+            ("%s[COLOUR]", article.colour),
+            ("%s[RATING]", article.rating or None),
+            ("%s[RBE]", article.rating or None),
+            ("%s[RAE]", article.rating or None),
+            ("%s[JT]", _get_word(journal.title) if journal else None),
+            ("%s[JA]", _get_word(journal.abbreviation) if journal else None),
+            ("%s[AU]", _get_word(authors[-1].lastname) if authors else None),
+            ("%s[FAU]", _get_word(authors[0].lastname) if authors else None),
+            ("%s[LAU]", _get_word(authors[-1].lastname) if authors else None),
+            ("%s[AUID]", authors[0].dbid if authors else None),
+            ("\"%s\"[LB]", labels[0].title if labels else None),
+            ("%s[LABELID]", labels[0].dbid if labels else None),
+            ("%s[COLLECTIONID]", article.collections[0].dbid if article.collections else None),
+            ("%s", _get_word(article.title)),
+            ("NOT %s", _get_word(article.abstract)),
+            ("%s OR 1[TRASH]", _get_word(journal.title) if journal else None))
+        
+        # add probes
+        for probe, value in candidates:
+            if value and probe not in used:
+                used.add(probe)
+                probes.append(probe % value)
+    
+    return probes
+
+
+def _get_word(text):
+    """Gets first word of given text usable within query."""
+    
+    # check text
+    if not text:
+        return None
+    
+    # get word
+    match = re.search(r'[\w\-\.\/]+', text)
+    
+    return match.group(0) if match else None
@@ -2,7 +2,90 @@
 #  Copyright (c) Martin Strohalm. All rights reserved.
 
 # import modules
+import functools
+import re
+import string
 import time
+import unicodedata
+
+from .database import FTS5
+from .utils import normalize_text
+
+# set articles tags which can be merged into single IN condition
+ARTICLES_ID_TAGS = ('[ID]', '[AUID]', '[LABELID]', '[COLLECTIONID]', '[SMARTID]')
+
+# set articles tags evaluated from stored data only, not in memory
+ARTICLES_STORED_TAGS = ('[SMARTID]',)
+
+# set articles tags depending on current time
+ARTICLES_TIMED_TAGS = ('[RECENT]',)
+
+# set relative cost of articles conditions by tag (None for untagged)
+ARTICLES_COSTS = {
+    '[ID]': 0,
+    '[KEY]': 0,
+    '[PMID]': 0,
+    '[PY]': 0,
+    '[TRASH]': 0,
+    '[RECENT]': 1,
+    '[PDF]': 1,
+    '[RATING]': 1,
+    '[RBE]': 1,
+    '[RAE]': 1,
+    '[COLOUR]': 1,
+    '[COLOR]': 1,
+    '[AUID]': 2,
+    '[LABELID]': 2,
+    '[COLLECTIONID]': 2,
+    '[SMARTID]': 2,
+    '[LAU]': 3,
+    '[LB]': 3,
+    '[JT]': 3,
+    '[JA]': 3,
+    '[AU]': 3,
+    '[FAU]': 3,
+    '[DOI]': 4,
+    '[TI]': 4,
+    None: 4,
+    '[AB]': 5,
+    '[NOTE]': 5,
+    }
+
+# set articles colours by name
+ARTICLES_COLOURS = {
+    "red": "ff6e64",
+    "orange": "ffb941",
+    "yellow": "f0e646",
+    "green": "b4e646",
+    "blue": "64afff",
+    "purple": "dc8cf0",
+    "gray": "c8c8c8",
+    "none": "c8c8c8"
+    }
+
+# set articles boolean values
+ARTICLES_BOOLS = {
+    "0": 0,
+    "1": 1,
+    "true": 1,
+    "True": 1,
+    "TRUE": 1,
+    "yes": 1,
+    "Yes": 1,
+    "YES": 1,
+    "false": 0,
+    "False": 0,
+    "FALSE": 0,
+    "no": 0,
+    "No": 0,
+    "NO": 0,
+    }
+
+# set ASCII lower case conversion of SQLite LOWER()
+SQL_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# set full-text index tokenizer pattern
+_FTS_TOKEN = re.compile(r'[^\W_]+')
 
 
 def make_articles_query(value, tag=None):
@@ -15,35 +98,8 @@ def make_articles_query(value, tag=None):
     # init value
     value_lower = value.lower()
     value_like = "%%%s%%" % value_lower
-    
-    # init colours
-    colours = {
-        "red": "ff6e64",
-        "orange": "ffb941",
-        "yellow": "f0e646",
-        "green": "b4e646",
-        "blue": "64afff",
-        "purple": "dc8cf0",
-        "gray": "c8c8c8",
-        "none": "c8c8c8"
-        }
-    
-    bools = {
-        "0": 0,
-        "1": 1,
-        "true": 1,
-        "True": 1,
-        "TRUE": 1,
-        "yes": 1,
-        "Yes": 1,
-        "YES": 1,
-        "false": 0,
-        "False": 0,
-        "FALSE": 0,
-        "no": 0,
-        "No": 0,
-        "NO": 0,
-        }
+    value_norm = normalize_text(value)
+    value_norm_like = "%%%s%%" % value_norm
     
     # search by DBID
     if tag == '[ID]':
@@ -71,7 +127,7 @@ def make_articles_query(value, tag=None):
     # search by imported date
     elif tag == '[RECENT]':
         try:
-            values.append(time.time() - int(value)*60*60*24)
+            values.append(_make_time_ago(int(value)))
             sqls.append("(articles.imported >= ?)""")
         except ValueError:
             pass
@@ -83,8 +139,8 @@ def make_articles_query(value, tag=None):
     
     # search by title
     elif tag == '[TI]':
-        sqls.append("(LOWER(articles.title) LIKE ?)""")
-        values.append(value_like)
+        sqls.append("(articles.title_norm LIKE ?)""")
+        values.append(value_norm_like)
     
     # search by abstract
     elif tag == '[AB]':
@@ -99,12 +155,12 @@ def make_articles_query(value, tag=None):
     # search by colour
     elif tag == '[COLOUR]' or tag == '[COLOR]':
         sqls.append("LOWER(articles.colour) = ?""")
-        values.append(colours.get(value_lower, value_lower))
+        values.append(ARTICLES_COLOURS.get(value_lower, value_lower))
     
     # search by PDF status
     elif tag == '[PDF]':
         sqls.append("articles.pdf = ?""")
-        values.append(bools.get(value, 0))
+        values.append(ARTICLES_BOOLS.get(value, 0))
     
     # search by rating
     elif tag == '[RATING]':
@@ -133,109 +189,123 @@ def make_articles_query(value, tag=None):
     # search by trash status
     elif tag == '[TRASH]':
         sqls.append("articles.deleted = ?""")
-        values.append(bools.get(value, 0))
+        values.append(ARTICLES_BOOLS.get(value, 0))
     
     # search by journal title
     elif tag == '[JT]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM journals
-            WHERE articles.journal = journals.id
-            AND LOWER(journals.title) LIKE ?) != 0)""")
+        sqls.append("""(articles.journal IS NOT NULL AND articles.journal IN (
+            SELECT journals.id FROM journals
+            WHERE journals.title_norm LIKE ?))""")
         
-        values.append(value_like)
+        values.append(value_norm_like)
     
     # search by journal abbreviation
     elif tag == '[JA]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM journals
-            WHERE articles.journal = journals.id
-            AND LOWER(journals.abbreviation) LIKE ?) != 0)""")
+        sqls.append("""(articles.journal IS NOT NULL AND articles.journal IN (
+            SELECT journals.id FROM journals
+            WHERE journals.abbreviation_norm LIKE ?))""")
         
-        values.append(value_like)
+        values.append(value_norm_like)
     
     # search by author full name
     elif tag == '[AU]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_authors
-            LEFT JOIN authors ON articles_authors.author = authors.id
-            WHERE articles_authors.article = articles.id
-            AND LOWER(authors.shortname) LIKE ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_authors.article FROM articles_authors
+            WHERE articles_authors.author IN (
+                SELECT authors.id FROM authors
+                WHERE authors.shortname_norm LIKE ?)))""")
         
-        values.append(value_like)
+        values.append(value_norm_like)
     
     # search by author ID
     elif tag == '[AUID]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_authors
-            WHERE articles_authors.article = articles.id
-            AND articles_authors.author = ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_authors.article FROM articles_authors
+            WHERE articles_authors.author = ?))""")
         
         values.append(value)
     
     # search by first author
     elif tag == '[FAU]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_authors
-            LEFT JOIN authors ON articles_authors.author = authors.id
-            WHERE articles_authors.article = articles.id
-            AND articles_authors.priority = 0
-            AND LOWER(authors.shortname) LIKE ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_authors.article FROM articles_authors
+            WHERE articles_authors.priority = 0
+            AND articles_authors.author IN (
+                SELECT authors.id FROM authors
+                WHERE authors.shortname_norm LIKE ?)))""")
         
-        values.append(value_like)
+        values.append(value_norm_like)
     
     # search by last author
     elif tag == '[LAU]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM (
-                SELECT *
-                FROM articles_authors
-                LEFT JOIN authors ON articles_authors.author = authors.id
-                WHERE articles_authors.article = articles.id
-                AND LOWER(authors.shortname) LIKE ?
-                AND articles_authors.priority = (
-                    SELECT MAX(t1.priority) FROM articles_authors t1
-                    WHERE t1.article = articles.id)
-                )) != 0)""")
+        sqls.append("""(articles.last_author IS NOT NULL AND articles.last_author IN (
+            SELECT authors.id FROM authors
+            WHERE authors.shortname_norm LIKE ?))""")
         
-        values.append(value_like)
+        values.append(value_norm_like)
     
     # search by labels
     elif tag == '[LB]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_labels
-            LEFT JOIN labels ON articles_labels.label = labels.id
-            WHERE articles_labels.article = articles.id
-            AND LOWER(labels.title) = ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_labels.article FROM articles_labels
+            WHERE articles_labels.label IN (
+                SELECT labels.id FROM labels
+                WHERE labels.title_norm = ?)))""")
         
-        values.append(value_lower)
+        values.append(value_norm)
     
     # search by label ID
     elif tag == '[LABELID]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_labels
-            WHERE articles_labels.article = articles.id
-            AND articles_labels.label = ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_labels.article FROM articles_labels
+            WHERE articles_labels.label = ?))""")
         
         values.append(value)
     
     # search by collection ID
     elif tag == '[COLLECTIONID]':
         
-        sqls.append("""((
-            SELECT COUNT(*) FROM articles_collections
-            WHERE articles_collections.article = articles.id
-            AND articles_collections.collection = ?) != 0)""")
+        sqls.append("""(articles.id IN (
+            SELECT articles_collections.article FROM articles_collections
+            WHERE articles_collections.collection = ?))""")
+        
+        values.append(value)
+    
+    # search by materialized smart collection ID
+    elif tag == '[SMARTID]':
+        
+        sqls.append("""(articles.id IN (
+            SELECT articles_smart.article FROM articles_smart
+            WHERE articles_smart.collection = ?))""")
         
         values.append(value)
     
+    # search all fields by full-text index
+    elif FTS5:
+        
+        sqls.append("""(
+            articles.key = ?
+            OR articles.pmid = ?
+            OR LOWER(articles.doi) = ?
+            OR articles.id IN (
+                SELECT rowid FROM articles_fts
+                WHERE articles_fts MATCH ?)
+            )""")
+        
+        values += [
+            value,
+            value,
+            value_lower,
+            _make_fts_phrase(value)]
+    
     # search all fields
     else:
         
@@ -243,44 +313,433 @@ def make_articles_query(value, tag=None):
             articles.key = ?
             OR articles.pmid = ?
             OR LOWER(articles.doi) = ?
-            OR LOWER(articles.title) LIKE ?
+            OR articles.title_norm LIKE ?
             OR LOWER(articles.abstract) LIKE ?
             OR LOWER(articles.notes) LIKE ?
             
-            OR (
-                SELECT COUNT(*) FROM journals
+            OR EXISTS (
+                SELECT 1 FROM journals
                 WHERE journals.id = articles.journal
-                AND (LOWER(journals.title) LIKE ?
-                    OR LOWER(journals.abbreviation) LIKE ?)) != 0
+                AND (journals.title_norm LIKE ?
+                    OR journals.abbreviation_norm LIKE ?))
             
-            OR (
-                SELECT COUNT(*) FROM articles_authors
-                LEFT JOIN authors ON articles_authors.author = authors.id
+            OR EXISTS (
+                SELECT 1 FROM articles_authors
+                JOIN authors ON articles_authors.author = authors.id
                 WHERE articles_authors.article = articles.id
-                AND LOWER(authors.shortname) LIKE ?) != 0
+                AND authors.shortname_norm LIKE ?)
             
-            OR (
-                SELECT COUNT(*) FROM articles_labels
-                LEFT JOIN labels ON articles_labels.label = labels.id
+            OR EXISTS (
+                SELECT 1 FROM articles_labels
+                JOIN labels ON articles_labels.label = labels.id
                 WHERE articles_labels.article = articles.id
-                AND LOWER(labels.title) LIKE ?) != 0
+                AND labels.title_norm LIKE ?)
             )""")
         
         values += [
             value,
             value,
             value_lower,
+            value_norm_like,
             value_like,
             value_like,
-            value_like,
-            value_like,
-            value_like,
-            value_like,
-            value_like]
+            value_norm_like,
+            value_norm_like,
+            value_norm_like,
+            value_norm_like]
     
     return sqls, values
 
 
+def make_articles_ids_query(values, tag):
+    """Creates sql and values to query database for articles by any of IDs."""
+    
+    # init placeholders
+    marks = ",".join("?" * len(values))
+    
+    # search by DBIDs
+    if tag == '[ID]':
+        sql = "(articles.id IN (%s))" % marks
+    
+    # search by authors IDs
+    elif tag == '[AUID]':
+        sql = """(articles.id IN (
+            SELECT articles_authors.article FROM articles_authors
+            WHERE articles_authors.author IN (%s)))""" % marks
+    
+    # search by labels IDs
+    elif tag == '[LABELID]':
+        sql = """(articles.id IN (
+            SELECT articles_labels.article FROM articles_labels
+            WHERE articles_labels.label IN (%s)))""" % marks
+    
+    # search by collections IDs
+    elif tag == '[COLLECTIONID]':
+        sql = """(articles.id IN (
+            SELECT articles_collections.article FROM articles_collections
+            WHERE articles_collections.collection IN (%s)))""" % marks
+    
+    # search by materialized smart collections IDs
+    elif tag == '[SMARTID]':
+        sql = """(articles.id IN (
+            SELECT articles_smart.article FROM articles_smart
+            WHERE articles_smart.collection IN (%s)))""" % marks
+    
+    # unknown tag
+    else:
+        message = "Unsupported tag to query articles by IDs! --> %s" % tag
+        raise KeyError(message)
+    
+    return [sql], list(values)
+
+
+def match_articles_query(article, value, tag=None):
+    """
+    Evaluates articles query condition for given article in memory using the
+    same semantics as the SQL condition. Returns None where the SQL condition
+    evaluates to NULL.
+    """
+    
+    # init value
+    value_lower = value.lower()
+    value_like = "%%%s%%" % value_lower
+    value_norm = normalize_text(value)
+    value_norm_like = "%%%s%%" % value_norm
+    
+    # match by DBID
+    if tag == '[ID]':
+        return _match_number(article.dbid, value)
+    
+    # match by key
+    elif tag == '[KEY]':
+        return _match_equal(article.key, value)
+    
+    # match by PMID
+    elif tag == '[PMID]':
+        if value == 'NULL':
+            return article.pmid is None
+        return _match_equal(article.pmid, value)
+    
+    # match by DOI
+    elif tag == '[DOI]':
+        return _match_like(value_like, article.doi)
+    
+    # match by imported date
+    elif tag == '[RECENT]':
+        try:
+            limit = _make_time_ago(int(value))()
+            return article.imported >= limit if article.imported is not None else None
+        except ValueError:
+            return None
+    
+    # match by year
+    elif tag == '[PY]':
+        return _match_number(article.year, value)
+    
+    # match by title
+    elif tag == '[TI]':
+        return _match_like(value_norm_like, normalize_text(article.title))
+    
+    # match by abstract
+    elif tag == '[AB]':
+        return _match_like(value_like, article.abstract)
+    
+    # match by notes
+    elif tag == '[NOTE]':
+        return _match_like(value_like, article.notes)
+    
+    # match by colour
+    elif tag == '[COLOUR]' or tag == '[COLOR]':
+        colour = article.colour.translate(SQL_LOWER) if article.colour else None
+        return _match_equal(colour, ARTICLES_COLOURS.get(value_lower, value_lower))
+    
+    # match by PDF status
+    elif tag == '[PDF]':
+        return int(article.pdf) == ARTICLES_BOOLS.get(value, 0)
+    
+    # match by rating
+    elif tag in ('[RATING]', '[RBE]', '[RAE]'):
+        try:
+            rating = int(value)
+        except ValueError:
+            return None
+        
+        if tag == '[RBE]':
+            return article.rating <= rating
+        
+        if tag == '[RAE]':
+            return article.rating >= rating
+        
+        return article.rating == rating
+    
+    # match by trash status
+    elif tag == '[TRASH]':
+        return int(article.deleted) == ARTICLES_BOOLS.get(value, 0)
+    
+    # match by journal title
+    elif tag == '[JT]':
+        return article.journal is not None and bool(_match_like(value_norm_like, normalize_text(article.journal.title)))
+    
+    # match by journal abbreviation
+    elif tag == '[JA]':
+        return article.journal is not None and bool(_match_like(value_norm_like, normalize_text(article.journal.abbreviation)))
+    
+    # match by author full name
+    elif tag == '[AU]':
+        return any(_match_like(value_norm_like, normalize_text(x.shortname)) for x in article.authors)
+    
+    # match by author ID
+    elif tag == '[AUID]':
+        return any(_match_number(x.dbid, value) for x in article.authors)
+    
+    # match by first author
+    elif tag == '[FAU]':
+        author = article.first_author
+        return author is not None and bool(_match_like(value_norm_like, normalize_text(author.shortname)))
+    
+    # match by last author
+    elif tag == '[LAU]':
+        authors = article.authors[-1:]
+        return any(_match_like(value_norm_like, normalize_text(x.shortname)) for x in authors)
+    
+    # match by labels
+    elif tag == '[LB]':
+        return any(normalize_text(x.title) == value_norm for x in article.labels)
+    
+    # match by label ID
+    elif tag == '[LABELID]':
+        return any(_match_number(x.dbid, value) for x in article.labels)
+    
+    # match by collection ID
+    elif tag == '[COLLECTIONID]':
+        return any(_match_number(x.dbid, value) for x in article.collections)
+    
+    # match identifiers
+    doi = article.doi.translate(SQL_LOWER) if article.doi else None
+    
+    results = [
+        _match_equal(article.key, value),
+        _match_equal(article.pmid, value),
+        _match_equal(doi, value_lower)]
+    
+    # get searchable texts
+    journal = article.journal
+    authors = [x.shortname for x in article.authors if x.shortname]
+    labels = [x.title for x in article.labels if x.title]
+    
+    # match all fields by full-text index
+    if FTS5:
+        
+        texts = [
+            article.title,
+            article.abstract,
+            article.notes,
+            " ".join(authors),
+            "%s %s" % (journal.title, journal.abbreviation or "") if journal and journal.title else None,
+            " ".join(labels)]
+        
+        results.append(_match_fts(value, texts))
+    
+    # match all fields
+    else:
+        
+        results.append(_match_like(value_norm_like, normalize_text(article.title)))
+        results.append(_match_like(value_like, article.abstract))
+        results.append(_match_like(value_like, article.notes))
+        
+        texts = [journal.title, journal.abbreviation] if journal else []
+        texts += authors + labels
+        results.append(any(_match_like(value_norm_like, normalize_text(x)) for x in texts))
+    
+    # combine by SQL OR
+    if True in results:
+        return True
+    
+    return None if None in results else False
+
+
+def match_articles_ids_query(article, values, tag):
+    """Evaluates articles query condition by any of IDs for given article in memory."""
+    
+    # match by DBIDs
+    if tag == '[ID]':
+        items = [article]
+    
+    # match by authors IDs
+    elif tag == '[AUID]':
+        items = article.authors
+    
+    # match by labels IDs
+    elif tag == '[LABELID]':
+        items = article.labels
+    
+    # match by collections IDs
+    elif tag == '[COLLECTIONID]':
+        items = article.collections
+    
+    # unknown tag
+    else:
+        message = "Unsupported tag to match articles by IDs! --> %s" % tag
+        raise KeyError(message)
+    
+    return any(_match_number(x.dbid, v) for x in items for v in values)
+
+
+def implies_articles_query(value, other, tag=None):
+    """
+    Checks whether articles matching condition by given value provably match
+    condition by other value of the same tag as well. Exact matches of free
+    text to key, PMID or DOI are not considered.
+    """
+    
+    # check same value
+    if value == other:
+        return True
+    
+    # check text contained
+    if tag in ('[TI]', '[JT]', '[JA]', '[AU]', '[FAU]', '[LAU]'):
+        return normalize_text(other) in normalize_text(value)
+    
+    if tag in ('[DOI]', '[AB]', '[NOTE]'):
+        return other.lower() in value.lower()
+    
+    # check rating limits
+    if tag in ('[RBE]', '[RAE]'):
+        try:
+            value = int(value)
+            other = int(other)
+        except ValueError:
+            return False
+        
+        return value <= other if tag == '[RBE]' else value >= other
+    
+    # check other tags
+    if tag is not None and tag in ARTICLES_COSTS:
+        return False
+    
+    # check all fields by full-text index
+    if FTS5:
+        tokens = _make_fts_tokens(value)
+        others = _make_fts_tokens(other)
+        size = len(others)
+        
+        if not others or len(tokens) < size:
+            return False
+        
+        return tokens[:size-1] == others[:-1] and tokens[size-1].startswith(others[-1])
+    
+    # check all fields
+    return normalize_text(other) in normalize_text(value) and other.lower() in value.lower()
+
+
+def make_articles_order(name):
+    """Creates sql expression to order articles."""
+    
+    # order by DBID
+    if name == 'id':
+        return "articles.id"
+    
+    # order by key
+    elif name == 'key':
+        return "articles.key"
+    
+    # order by imported date
+    elif name == 'imported':
+        return "articles.imported"
+    
+    # order by year
+    elif name == 'year':
+        return "IFNULL(articles.year, 0)"
+    
+    # order by title
+    elif name == 'title':
+        return "IFNULL(articles.title, '')"
+    
+    # order by rating
+    elif name == 'rating':
+        return "articles.rating"
+    
+    # order by first author
+    elif name == 'author':
+        return """IFNULL((
+            SELECT authors.shortname FROM articles_authors
+            LEFT JOIN authors ON articles_authors.author = authors.id
+            WHERE articles_authors.article = articles.id
+            ORDER BY articles_authors.priority LIMIT 1), '')"""
+    
+    # order by journal abbreviation
+    elif name == 'journal':
+        return """IFNULL((
+            SELECT journals.abbreviation FROM journals
+            WHERE journals.id = articles.journal), '')"""
+    
+    # unknown order
+    message = "Unsupported order for articles! --> %s" % name
+    raise KeyError(message)
+
+
+def get_articles_order(article, name):
+    """Gets value to order article in memory the same way as by SQL."""
+    
+    # order by DBID
+    if name == 'id':
+        return article.dbid
+    
+    # order by key
+    elif name == 'key':
+        return article.key or ''
+    
+    # order by imported date
+    elif name == 'imported':
+        return article.imported or 0
+    
+    # order by year
+    elif name == 'year':
+        return article.year or 0
+    
+    # order by title
+    elif name == 'title':
+        return article.title or ''
+    
+    # order by rating
+    elif name == 'rating':
+        return article.rating
+    
+    # order by first author
+    elif name == 'author':
+        authors = article.authors
+        return authors[0].shortname or '' if authors else ''
+    
+    # order by journal abbreviation
+    elif name == 'journal':
+        journal = article.journal
+        return journal.abbreviation or '' if journal else ''
+    
+    # unknown order
+    message = "Unsupported order for articles in memory! --> %s" % name
+    raise KeyError(message)
+
+
+def make_articles_relevance(terms):
+    """Creates sql order expression, join and values to order articles by relevance."""
+    
+    # check full-text index and terms
+    if not FTS5 or not terms:
+        return "0", "", []
+    
+    # make join with weighted score (title, abstract, notes, authors, journal, labels)
+    join = """LEFT JOIN (
+            SELECT rowid, -bm25(articles_fts, 10.0, 5.0, 2.0, 2.0, 1.0, 1.0) AS score
+            FROM articles_fts
+            WHERE articles_fts MATCH ?) AS _relevance
+        ON _relevance.rowid = articles.id"""
+    
+    # make match
+    match = " OR ".join(_make_fts_phrase(x) for x in terms)
+    
+    return "IFNULL(_relevance.score, 0)", join, [match]
+
+
 def make_journals_query(value, tag=None):
     """Creates sql and values to query database for journals."""
     
@@ -289,7 +748,7 @@ def make_journals_query(value, tag=None):
     values = []
     
     # init value
-    value_like = "%%%s%%" % value.lower()
+    value_like = "%%%s%%" % normalize_text(value)
     
     # search by DBID
     if tag == '[ID]':
@@ -300,8 +759,8 @@ def make_journals_query(value, tag=None):
     else:
         
         sqls.append("""(
-            LOWER(title) LIKE ?
-            OR LOWER(abbreviation) LIKE ?)""")
+            title_norm LIKE ?
+            OR abbreviation_norm LIKE ?)""")
         
         values += [
             value_like,
@@ -318,7 +777,7 @@ def make_authors_query(value, tag=None):
     values = []
     
     # init value
-    value_like = "%%%s%%" % value.lower()
+    value_like = "%%%s%%" % normalize_text(value)
     
     # search by DBID
     if tag == '[ID]':
@@ -329,7 +788,7 @@ def make_authors_query(value, tag=None):
     else:
         
         sqls.append("""(
-            LOWER(shortname) LIKE ?
+            shortname_norm LIKE ?
             OR LOWER(lastname) LIKE ?
             OR LOWER(firstname) LIKE ?)""")
         
@@ -349,7 +808,7 @@ def make_labels_query(value, tag=None):
     values = []
     
     # init value
-    value_like = "%%%s%%" % value.lower()
+    value_like = "%%%s%%" % normalize_text(value)
     
     # search by DBID
     if tag == '[ID]':
@@ -358,7 +817,7 @@ def make_labels_query(value, tag=None):
     
     # search all fields
     else:
-        sqls.append("(LOWER(title) LIKE ?)")
+        sqls.append("(title_norm LIKE ?)")
         values.append(value_like)
     
     return sqls, values
@@ -385,3 +844,104 @@ def make_collections_query(value, tag=None):
         values.append(value_like)
     
     return sqls, values
+
+
+def _make_fts_phrase(value):
+    """Creates full-text prefix phrase for given value."""
+    
+    return '"%s"*' % value.replace('"', '""')
+
+
+def _make_time_ago(days):
+    """Makes value getter of the timestamp given number of days ago."""
+    
+    return lambda: time.time() - days*60*60*24
+
+
+def _make_fts_text(text):
+    """Converts text into lower case without diacritics as full-text index does."""
+    
+    # skip conversion for plain ASCII
+    try:
+        text.encode('ascii')
+        return text.lower()
+    except UnicodeEncodeError:
+        pass
+    
+    # remove diacritics
+    text = unicodedata.normalize('NFD', text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    
+    return text.lower()
+
+
+def _make_fts_tokens(text):
+    """Splits text into tokens the same way as full-text index does."""
+    
+    return _FTS_TOKEN.findall(_make_fts_text(text))
+
+
+def _match_fts(value, texts):
+    """Checks whether any of given texts matches full-text prefix phrase."""
+    
+    # get phrase pattern
+    pattern = _make_fts_regex(value)
+    if pattern is None:
+        return False
+    
+    # search texts
+    return any(pattern.search(_make_fts_text(x)) for x in texts if x)
+
+
+@functools.lru_cache(maxsize=256)
+def _make_fts_regex(value):
+    """Converts full-text prefix phrase into compiled regular expression."""
+    
+    # get phrase tokens
+    phrase = _make_fts_tokens(value)
+    if not phrase:
+        return None
+    
+    # make consecutive tokens with the last one as prefix
+    regex = r"[\W_]+".join(re.escape(x) for x in phrase)
+    
+    return re.compile(r"(?<![^\W_])" + regex)
+
+
+def _match_equal(value, other):
+    """Checks whether value equals to other value. Returns None for NULL value."""
+    
+    return value == other if value is not None else None
+
+
+def _match_like(pattern, text):
+    """Checks whether given text matches SQL LIKE pattern. Returns None for NULL text."""
+    
+    # check text
+    if text is None:
+        return None
+    
+    return _make_like_regex(pattern).fullmatch(text) is not None
+
+
+@functools.lru_cache(maxsize=256)
+def _make_like_regex(pattern):
+    """Converts SQL LIKE pattern into compiled regular expression."""
+    
+    regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+    
+    return re.compile(regex, re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+def _match_number(number, value):
+    """Checks whether number equals to value converted by SQL numeric affinity. Returns None for NULL number."""
+    
+    # check number
+    if number is None:
+        return None
+    
+    # convert value
+    try:
+        return number == float(value)
+    except ValueError:
+        return False
@@ -2,6 +2,10 @@
 #  Copyright (c) Martin Strohalm. All rights reserved.
 
 # import modules
+import re
+import threading
+from collections import OrderedDict
+
 from .grammar import Grammar
 from .queries import *
 from .article import Article
@@ -14,8 +18,8 @@ from .collection import Collection
 # create basic query grammar
 _GRAMMAR = Grammar(
     op = 'AND | OR',
-    val = '[A-Za-z0-9-_\.\\\/]+',
-    quote = '" [A-Za-z0-9-_\.\s\\\/]+ " | \' [A-Za-z0-9-_\.\s\\\/]+ \'',
+    val = '[\w\-\.\\\/]+',
+    quote = '" [\w\-\.\s\\\/]+ " | \' [\w\-\.\s\\\/]+ \'',
     tag = '\[[A-Za-z0-9]+\]',
     elm = 'val tag | quote tag',
     group = '\( expr \)',
@@ -23,6 +27,16 @@ _GRAMMAR = Grammar(
     expr = 'neg | group op expr | elm op expr | quote op expr | val op expr | group | elm | quote | val',
     )
 
+# define max number of cached compiled queries
+QUERY_CACHE_SIZE = 256
+
+# init compiled queries cache shared by all threads
+_CACHE = OrderedDict()
+_CACHE_LOCK = threading.RLock()
+
+# set pattern of full table scan within query plan
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+
 
 class Query(object):
     """
@@ -47,7 +61,8 @@ class Query(object):
         
         self._query = query
         self._entity = entity
-        self._tree = self._parse(query)
+        self._compiled = self._get_compiled(query, entity)
+        self._tree = self._compiled['tree']
     
     
     def __str__(self):
@@ -98,35 +113,208 @@ class Query(object):
         return self._tree
     
     
-    def select(self):
+    @property
+    def optimized(self):
         """
-        Parses query into SQL SELECT and list of values.
+        Gets optimized logical tree of the query. Nodes are represented as
+        ['and', node, ...], ['or', node, ...], ['not', node], ['term', value,
+        tag] and ['in', tag, value, ...] for merged ID terms.
         
         Returns:
-            result: (sql, list of values)
-                Tuple of SQL query and values.
+            tree: hierarchical list or None
+                Optimized query tree.
         """
         
-        conditions = ""
-        values = []
+        # check tree
+        if not self._tree:
+            return None
         
-        # get query tree
-        tree = self.tree
+        # make optimized tree
+        with _CACHE_LOCK:
+            if 'optimized' not in self._compiled:
+                tokens = self._parse_expr(self._tree[0])
+                self._compiled['optimized'] = self._optimize(self._make_node(tokens))
+            
+            return self._compiled['optimized']
+    
+    
+    @property
+    def terms(self):
+        """
+        Gets free-text terms which are not negated.
         
-        # make sqls and values from tree
-        if tree:
-            sqls, values = self._parse_expr(tree[0])
-            conditions = " ".join(sqls)
+        Returns:
+            terms: (str,)
+                Untagged values and quoted phrases.
+        """
+        
+        if not self._tree:
+            return ()
+        
+        return tuple(self._get_terms(self.optimized))
+    
+    
+    @property
+    def tags(self):
+        """
+        Gets all tags used by the query.
+        
+        Returns:
+            tags: frozenset of str
+                Used tags including None for untagged values.
+        """
+        
+        if not self._tree:
+            return frozenset()
+        
+        with _CACHE_LOCK:
+            if 'tags' not in self._compiled:
+                self._compiled['tags'] = frozenset(self._get_tags(self.optimized))
+            
+            return self._compiled['tags']
+    
+    
+    @property
+    def matchable(self):
+        """
+        Checks whether the query can be evaluated in memory by the 'matches'
+        method. Queries using stored data only (e.g. materialized smart
+        collections) must be evaluated by SQL.
+        
+        Returns:
+            matchable: bool
+                True if query can be evaluated in memory.
+        """
+        
+        if self._entity != Article.NAME:
+            return False
+        
+        return not any(x in ARTICLES_STORED_TAGS for x in self.tags)
+    
+    
+    def values(self, tag):
+        """
+        Gets all values used by the query with given tag including negated
+        ones.
+        
+        Args:
+            tag: str
+                Tag of the values.
+        
+        Returns:
+            values: (str,)
+                Used values of the tag.
+        """
+        
+        if not self._tree:
+            return ()
+        
+        return tuple(self._get_values(self.optimized, tag))
+    
+    
+    def where(self):
+        """
+        Parses query into SQL conditions and list of values.
+        
+        Returns:
+            result: (sql, list of values)
+                Tuple of SQL conditions and values. The conditions are empty
+                if query is empty and None if query cannot be parsed.
+        """
+        
+        # make conditions
+        with _CACHE_LOCK:
+            if 'where' not in self._compiled:
+                self._compiled['where'] = self._make_where()
+            
+            conditions, values = self._compiled['where']
         
         # check conditions
-        if not conditions and self._query:
+        if conditions is None:
+            return None, None
+        
+        # bind time-dependent values
+        values = [x() if callable(x) else x for x in values]
+        
+        return conditions, values
+    
+    
+    def select(self, columns=None, order_by=None, reverse=False, after=None, limit=None):
+        """
+        Parses query into SQL SELECT and list of values.
+        
+        Args:
+            columns: (str,) or None
+                Names of columns to retrieve. If set to None, all columns
+                are retrieved.
+            
+            order_by: str or None
+                Name of the order to sort items by. The value used for
+                sorting is retrieved as '_order' column. Items with the same
+                value are sorted by id. Articles can also be ordered by
+                'relevance' of the free-text terms.
+            
+            reverse: bool
+                If set to True, items are sorted in descending order.
+            
+            after: (any, int) or None
+                Sorting value and id of the last item retrieved previously.
+                If specified, only the items following this one are
+                retrieved.
+            
+            limit: int or None
+                Maximum number of items to retrieve.
+        
+        Returns:
+            result: (sql, list of values)
+                Tuple of SQL query and values.
+        """
+        
+        # make conditions
+        conditions, values = self.where()
+        if conditions is None:
             return None, None
         
+        # make columns
+        fields = "*"
+        if columns:
+            fields = ", ".join("%s.%s" % (self._entity, x) for x in columns)
+        elif order_by:
+            fields = "%s.*" % self._entity
+        
+        # make order
+        order = None
+        source = self._entity
+        if order_by:
+            order, joins, joins_values = self._make_order(order_by)
+            fields += ", %s AS _order" % order
+            
+            # add joins
+            if joins:
+                source += " %s" % joins
+                values = list(joins_values) + list(values)
+        
         # make sql query
-        sql = "SELECT * FROM %s" % self._entity
+        sql = "SELECT %s FROM %s" % (fields, source)
+        
+        # add conditions
+        if after is not None:
+            comparison = "(%s, %s.id) %s (?, ?)" % (order, self._entity, "<" if reverse else ">")
+            conditions = "(%s) AND %s" % (conditions, comparison) if conditions else comparison
+            values = list(values) + list(after)
+        
         if conditions:
             sql += " WHERE %s" % conditions
         
+        # add order
+        if order:
+            direction = " DESC" if reverse else ""
+            sql += " ORDER BY _order%s, %s.id%s" % (direction, self._entity, direction)
+        
+        # add limit
+        if limit:
+            sql += " LIMIT %d" % limit
+        
         return sql, values
     
     
@@ -139,27 +327,199 @@ class Query(object):
                 Tuple of SQL query and values.
         """
         
+        # make conditions
+        conditions, values = self.where()
+        if conditions is None:
+            return None, None
+        
+        # make sql query
+        sql = "SELECT COUNT(*) FROM %s" % self._entity
+        if conditions:
+            sql += " WHERE %s" % conditions
+        
+        return sql, values
+    
+    
+    def explain(self, library, order_by=None, reverse=False):
+        """
+        Explains how SQLite executes SELECT of the query within given
+        library.
+        
+        Args:
+            library: core.Library
+                Library to be used.
+            
+            order_by: str or None
+                Name of the order to sort items by.
+            
+            reverse: bool
+                If set to True, items are sorted in descending order.
+        
+        Returns:
+            explain: dict
+                Generated 'sql', bound 'values', query 'plan' as list of
+                steps indented by depth and 'scans' as list of tables read
+                by full scan (directly or in order of an index).
+        """
+        
+        # make query
+        sql, values = self.select(order_by=order_by, reverse=reverse)
+        
+        # init explain
+        explain = {
+            'sql': sql,
+            'values': values,
+            'plan': [],
+            'scans': []}
+        
+        # check query
+        if sql is None:
+            return explain
+        
+        # assert connection
+        close_db = library.db.connect()
+        
+        # get query plan
+        library.db.cursor.execute("EXPLAIN QUERY PLAN %s" % sql, values)
+        rows = library.db.cursor.fetchall()
+        
+        # close connection
+        if close_db:
+            library.db.close()
+        
+        # make plan
+        depths = {}
+        for row in rows:
+            
+            # get step
+            step_id, parent, detail = row[0], row[1], row[3]
+            depths[step_id] = depths.get(parent, -1) + 1
+            explain['plan'].append("  " * depths[step_id] + detail)
+            
+            # check full scan
+            match = _FULL_SCAN.match(detail)
+            if match:
+                explain['scans'].append(match.group(1))
+        
+        return explain
+    
+    
+    def refines(self, query):
+        """
+        Checks whether this query is a conjunctive strengthening of given
+        query, so that its results can be obtained by filtering the results
+        of given query in memory. Exact matches of free-text terms to
+        article key, PMID or DOI must be checked separately.
+        
+        Args:
+            query: Query
+                Previous query.
+        
+        Returns:
+            refines: bool
+                True if results of this query are subset of the results of
+                given query.
+        """
+        
+        # check evaluation in memory
+        if not self.matchable or not query.matchable:
+            return False
+        
+        # get conditions trees
+        tree = self._get_matching()
+        other = query._get_matching()
+        
+        if tree is None or other is None:
+            return False
+        
+        # get conjunctions
+        nodes = tree[1:] if tree[0] == 'and' else [tree]
+        others = other[1:] if other[0] == 'and' else [other]
+        
+        # check all previous conditions are implied
+        for item in others:
+            if not any(self._implies(x, item) for x in nodes):
+                return False
+        
+        return True
+    
+    
+    def matches(self, article):
+        """
+        Checks whether given article matches the query. Conditions are
+        evaluated in memory using the same semantics as the SQL query.
+        
+        Args:
+            article: Article
+                Article to check.
+        
+        Returns:
+            match: bool
+                True if article matches the query.
+        """
+        
+        # check entity
+        if self._entity != Article.NAME:
+            message = "Unsupported entity to match in memory! --> %s" % self._entity
+            raise KeyError(message)
+        
+        # check tags
+        if not self.matchable:
+            message = "Query cannot be matched in memory! --> %s" % self._query
+            raise KeyError(message)
+        
+        # get conditions tree
+        tree = self._get_matching()
+        if tree is None:
+            return self.where()[0] == ""
+        
+        return self._match(tree, article) is True
+    
+    
+    def _make_where(self):
+        """Makes unbound SQL conditions and values."""
+        
         conditions = ""
         values = []
         
-        # get query tree
-        tree = self.tree
+        # get optimized tree
+        tree = self.optimized
         
         # make sqls and values from tree
         if tree:
-            sqls, values = self._parse_expr(tree[0])
+            sqls, values = self._make_sql(tree)
             conditions = " ".join(sqls)
         
         # check conditions
         if not conditions and self._query:
             return None, None
         
-        # make sql query
-        sql = "SELECT COUNT(*) FROM %s" % self._entity
-        if conditions:
-            sql += " WHERE %s" % conditions
+        return conditions, tuple(values)
+    
+    
+    def _get_compiled(self, query, entity):
+        """Gets cached compilation of the query or makes new one."""
         
-        return sql, values
+        key = (query, entity)
+        
+        # get from cache
+        with _CACHE_LOCK:
+            compiled = _CACHE.get(key)
+            if compiled is not None:
+                _CACHE.move_to_end(key)
+                return compiled
+        
+        # parse query
+        compiled = {'tree': self._parse(query)}
+        
+        # store in cache unless parsed by other thread meanwhile
+        with _CACHE_LOCK:
+            compiled = _CACHE.setdefault(key, compiled)
+            _CACHE.move_to_end(key)
+            if len(_CACHE) > QUERY_CACHE_SIZE:
+                _CACHE.popitem(last=False)
+        
+        return compiled
     
     
     def _to_str(self, tree):
@@ -198,92 +558,406 @@ class Query(object):
     
     
     def _parse_expr(self, expr):
-        """Parses expr into SQL conditions."""
+        """Parses expr into flat list of logical tokens."""
         
-        sqls = []
-        values = []
+        tokens = []
         
         for item in expr[1:]:
             name = item[0]
             
             if name == 'expr':
-                parsed = self._parse_expr(item)
+                tokens += self._parse_expr(item)
             
             elif name == 'neg':
-                parsed = self._parse_neg(item)
+                tokens += self._parse_neg(item)
             
             elif name == 'group':
-                parsed = self._parse_group(item)
+                tokens += self._parse_group(item)
             
             elif name == 'elm':
-                parsed = self._parse_elm(item)
+                tokens += self._parse_elm(item)
             
             elif name == 'quote':
-                parsed = self._parse_quote(item)
+                tokens += self._parse_quote(item)
             
             elif name == 'val':
-                parsed = self._parse_val(item)
+                tokens += self._parse_val(item)
             
             elif name == 'op':
-                parsed = [item[1]], []
+                tokens.append(item[1])
             
             else:
                 raise KeyError("Unknown rule! --> '%s" % name)
-            
-            sqls += parsed[0]
-            values += parsed[1]
         
-        return sqls, values
+        return tokens
     
     
     def _parse_neg(self, item):
-        """Parses negation into SQL conditions."""
-        
-        results = self._parse_expr(item[2])
-        sqls = [item[1]] + results[0]
-        values = results[1]
+        """Parses negation into logical tokens."""
         
-        return sqls, values
+        return ['NOT'] + self._parse_expr(item[2])
     
     
     def _parse_group(self, item):
-        """Parses group into SQL conditions."""
-        
-        results = self._parse_expr(item[2])
-        sqls = [item[1]] + results[0] + [item[3]]
-        values = results[1]
+        """Parses group into logical tokens."""
         
-        return sqls, values
+        return [['group', self._parse_expr(item[2])]]
     
     
     def _parse_elm(self, item):
-        """Parses element into SQL conditions."""
+        """Parses element into logical tokens."""
         
-        tag = item[2][1]
+        tag = item[2][1].upper()
         value = item[1][2] if item[1][0] == 'quote' else item[1][1]
         
-        return self._make_query(value, tag)
+        return [['term', value, tag]]
     
     
     def _parse_quote(self, item):
-        """Parses quote into SQL conditions."""
+        """Parses quote into logical tokens."""
         
-        return self._make_query(item[2])
+        return [['term', item[2], None]]
     
     
     def _parse_val(self, item):
-        """Parses value into SQL conditions."""
+        """Parses value into logical tokens."""
+        
+        return [['term', item[1], None]]
+    
+    
+    def _make_node(self, tokens):
+        """Creates logical tree from tokens using SQL operators precedence."""
+        
+        node = ['or']
+        
+        # split by OR
+        for part in self._split_tokens(tokens, 'OR'):
+            
+            # split by AND
+            factors = self._split_tokens(part, 'AND')
+            node.append(['and'] + [self._make_factor(x) for x in factors])
+        
+        return node
+    
+    
+    def _make_factor(self, tokens):
+        """Creates logical tree from negated or simple tokens."""
+        
+        # make negation
+        if tokens[0] == 'NOT':
+            return ['not', self._make_factor(tokens[1:])]
+        
+        # make group
+        if tokens[0][0] == 'group':
+            return self._make_node(tokens[0][1])
+        
+        # make term
+        return tokens[0]
+    
+    
+    def _split_tokens(self, tokens, op):
+        """Splits tokens by given operator."""
+        
+        parts = [[]]
+        
+        for token in tokens:
+            if token == op:
+                parts.append([])
+            else:
+                parts[-1].append(token)
+        
+        return parts
+    
+    
+    def _optimize(self, node):
+        """Simplifies logical tree and orders cheap conditions first."""
+        
+        name = node[0]
+        
+        # remove double negation
+        if name == 'not':
+            child = self._optimize(node[1])
+            return child[1] if child[0] == 'not' else ['not', child]
+        
+        # keep terms
+        if name not in ('and', 'or'):
+            return node
+        
+        # flatten nested operations and remove duplicates
+        children = []
+        for child in node[1:]:
+            child = self._optimize(child)
+            
+            for item in (child[1:] if child[0] == name else [child]):
+                if item not in children:
+                    children.append(item)
+        
+        # merge alternative IDs
+        if name == 'or':
+            children = self._merge_ids(children)
+        
+        # order cheap conditions first
+        children.sort(key=self._get_cost)
+        
+        # remove unnecessary operation
+        if len(children) == 1:
+            return children[0]
+        
+        return [name] + children
+    
+    
+    def _merge_ids(self, children):
+        """Merges alternative ID terms into single IN term."""
+        
+        # check entity
+        if self._entity != Article.NAME:
+            return children
+        
+        # group ID terms by tag
+        groups = {}
+        for child in children:
+            
+            if child[0] == 'term' and child[2] in ARTICLES_ID_TAGS:
+                groups.setdefault(child[2], []).append(child[1])
+            
+            elif child[0] == 'in':
+                groups.setdefault(child[1], []).extend(child[2:])
+        
+        # replace groups
+        merged = []
+        for child in children:
+            
+            # get tag
+            tag = None
+            if child[0] == 'term' and child[2] in ARTICLES_ID_TAGS:
+                tag = child[2]
+            elif child[0] == 'in':
+                tag = child[1]
+            
+            # keep other children
+            if tag is None:
+                merged.append(child)
+            
+            # skip already merged
+            elif tag not in groups:
+                continue
+            
+            # keep single term
+            elif len(groups[tag]) == 1:
+                merged.append(child)
+            
+            # add merged term at first occurrence
+            else:
+                merged.append(['in', tag] + list(dict.fromkeys(groups.pop(tag))))
+        
+        return merged
+    
+    
+    def _get_cost(self, node):
+        """Estimates relative cost of evaluating given node."""
         
-        return self._make_query(item[1])
+        # check entity
+        if self._entity != Article.NAME:
+            return 0
+        
+        # get term cost
+        if node[0] == 'term':
+            return ARTICLES_COSTS.get(node[2], ARTICLES_COSTS[None])
+        
+        # get merged IDs cost
+        if node[0] == 'in':
+            return ARTICLES_COSTS.get(node[1], ARTICLES_COSTS[None])
+        
+        # get highest cost of children
+        return max(self._get_cost(x) for x in node[1:])
+    
+    
+    def _get_terms(self, node):
+        """Collects free-text terms which are not negated."""
+        
+        # get term
+        if node[0] == 'term':
+            return [node[1]] if node[2] is None else []
+        
+        # collect children terms
+        if node[0] in ('and', 'or'):
+            return [x for child in node[1:] for x in self._get_terms(child)]
+        
+        return []
+    
+    
+    def _get_tags(self, node):
+        """Collects all tags used within logical tree."""
+        
+        # get term tag
+        if node[0] == 'term':
+            return {node[2]}
+        
+        # get merged IDs tag
+        if node[0] == 'in':
+            return {node[1]}
+        
+        # collect children tags
+        return set(x for child in node[1:] for x in self._get_tags(child))
+    
+    
+    def _get_values(self, node, tag):
+        """Collects all values of given tag used within logical tree."""
+        
+        # get term value
+        if node[0] == 'term':
+            return [node[1]] if node[2] == tag else []
+        
+        # get merged IDs values
+        if node[0] == 'in':
+            return list(node[2:]) if node[1] == tag else []
+        
+        # collect children values
+        return [x for child in node[1:] for x in self._get_values(child, tag)]
+    
+    
+    def _make_sql(self, node):
+        """Creates SQL conditions and values from logical tree."""
+        
+        name = node[0]
+        
+        # make term
+        if name == 'term':
+            return self._make_query(node[1], node[2])
+        
+        # make merged IDs
+        if name == 'in':
+            return make_articles_ids_query(node[2:], node[1])
+        
+        # make negation
+        if name == 'not':
+            sqls, values = self._make_sql(node[1])
+            return (['NOT', '('] + sqls + [')'], values) if sqls else ([], [])
+        
+        # make operation
+        sqls = []
+        values = []
+        
+        for child in node[1:]:
+            
+            # make child
+            child_sqls, child_values = self._make_sql(child)
+            if not child_sqls:
+                continue
+            
+            # add operator
+            if sqls:
+                sqls.append(name.upper())
+            
+            sqls += ['('] + child_sqls + [')']
+            values += child_values
+        
+        return sqls, values
+    
+    
+    def _get_matching(self):
+        """Gets optimized tree without conditions skipped by SQL."""
+        
+        with _CACHE_LOCK:
+            if 'matching' not in self._compiled:
+                tree = self.optimized
+                self._compiled['matching'] = self._prune(tree) if tree else None
+            
+            return self._compiled['matching']
+    
+    
+    def _prune(self, node):
+        """Removes conditions skipped by SQL from logical tree."""
+        
+        name = node[0]
+        
+        # check term
+        if name == 'term':
+            sqls, values = self._make_query(node[1], node[2])
+            return node if sqls else None
+        
+        # keep merged IDs
+        if name == 'in':
+            return node
+        
+        # prune negation
+        if name == 'not':
+            child = self._prune(node[1])
+            return ['not', child] if child else None
+        
+        # prune operation
+        children = [x for x in (self._prune(child) for child in node[1:]) if x]
+        
+        return [name] + children if children else None
+    
+    
+    def _match(self, node, article):
+        """Evaluates logical tree for given article using SQL three-valued logic."""
+        
+        name = node[0]
+        
+        # match term
+        if name == 'term':
+            return match_articles_query(article, node[1], node[2])
+        
+        # match merged IDs
+        if name == 'in':
+            return match_articles_ids_query(article, node[2:], node[1])
+        
+        # match negation
+        if name == 'not':
+            result = self._match(node[1], article)
+            return None if result is None else not result
+        
+        # match operation
+        result = name == 'and'
+        
+        for child in node[1:]:
+            value = self._match(child, article)
+            
+            if value is None:
+                result = None
+            
+            elif value != (name == 'and'):
+                return value
+        
+        return result
+    
+    
+    def _implies(self, node, other):
+        """Checks whether matching node provably implies matching other node."""
+        
+        # check same node
+        if node == other:
+            return True
+        
+        # check terms
+        if node[0] != 'term' or other[0] != 'term' or node[2] != other[2]:
+            return False
+        
+        return implies_articles_query(node[1], other[1], node[2])
+    
+    
+    def _make_order(self, name):
+        """Creates SQL order expression, joins and values for specific entity type."""
+        
+        # make articles relevance order
+        if self._entity == Article.NAME and name == 'relevance':
+            return make_articles_relevance(self.terms)
+        
+        # make articles order
+        if self._entity == Article.NAME:
+            return make_articles_order(name), "", []
+        
+        # unknown entity type
+        else:
+            message = "Unsupported entity to create SQL order from! --> %s" % self._entity
+            raise KeyError(message)
     
     
     def _make_query(self, value, tag=None):
         """Creates SQL for specific entity type."""
         
-        # uppercase tag
-        if tag:
-            tag = tag.upper()
-        
         # parse articles tags
         if self._entity == Article.NAME:
             return make_articles_query(value, tag)
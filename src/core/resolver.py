@@ -0,0 +1,450 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import bisect
+
+from .journal import Journal
+from .author import Author
+from .label import Label
+from .queries import SQL_LOWER
+from .utils import normalize_text
+
+
+class Resolver(object):
+    """
+    Matches journals, authors and labels to stored items in memory. The same
+    rules are used as by SQL matching within the library, i.e. values are
+    compared by SQLite LOWER(), empty stored values match anything and the
+    stored item with the lowest id wins.
+    
+    Journals and labels are loaded at once. Authors are loaded on demand by
+    normalized last name using its index, so that only the small set of
+    candidates is checked for each author.
+    """
+    
+    
+    def __init__(self, db):
+        """
+        Initializes a new instance of Resolver.
+        
+        Args:
+            db: core.Database
+                Library database.
+        """
+        
+        super(Resolver, self).__init__()
+        
+        self._db = db
+        
+        # init journals
+        self._journals = {}
+        self._journals_abbr = {}
+        self._journals_abbr_any = []
+        self._journals_title = {}
+        self._journals_title_any = []
+        
+        # init authors
+        self._authors = {}
+        self._authors_norm = {}
+        self._authors_last_any = []
+        
+        # init labels
+        self._labels = {}
+        self._labels_title = {}
+    
+    
+    def load(self):
+        """Loads all journals and labels and authors without last name from database."""
+        
+        cursor = self._db.cursor
+        
+        # load journals
+        cursor.execute("SELECT id, title, abbreviation FROM journals ORDER BY id")
+        for row in cursor.fetchall():
+            self._add_journal(row['id'], row['title'], row['abbreviation'])
+        
+        # load authors without last name
+        cursor.execute("SELECT id, firstname, lastname, initials FROM authors WHERE lastname_norm IS NULL OR lastname_norm = '' ORDER BY id")
+        for row in cursor.fetchall():
+            self._add_author(row['id'], row['firstname'], row['lastname'], row['initials'])
+        
+        # load labels
+        cursor.execute("SELECT id, title FROM labels ORDER BY id")
+        for row in cursor.fetchall():
+            self._add_label(row['id'], row['title'])
+    
+    
+    def add(self, item):
+        """
+        Registers inserted journal, author or label.
+        
+        Args:
+            item: core.Journal, core.Author or core.Label
+                Inserted item.
+        """
+        
+        # add journal
+        if isinstance(item, Journal):
+            self._add_journal(item.dbid, item.title, item.abbreviation)
+        
+        # add author
+        elif isinstance(item, Author):
+            self._add_author(item.dbid, item.firstname, item.lastname, item.initials)
+        
+        # add label
+        elif isinstance(item, Label):
+            self._add_label(item.dbid, item.title)
+        
+        # unknown item type
+        else:
+            message = "Unsupported item type to be resolved! --> %s" % type(item)
+            raise TypeError(message)
+    
+    
+    def remove(self, item):
+        """
+        Unregisters deleted journal, author or label.
+        
+        Args:
+            item: core.Journal, core.Author or core.Label
+                Deleted item.
+        """
+        
+        # remove journal
+        if isinstance(item, Journal):
+            self._remove_journal(item.dbid)
+        
+        # remove author
+        elif isinstance(item, Author):
+            self._remove_author(item.dbid)
+        
+        # remove label
+        elif isinstance(item, Label):
+            self._remove_label(item.dbid)
+        
+        # unknown item type
+        else:
+            message = "Unsupported item type to be resolved! --> %s" % type(item)
+            raise TypeError(message)
+    
+    
+    def update(self, item):
+        """
+        Updates registered values of changed journal, author or label.
+        
+        Args:
+            item: core.Journal, core.Author or core.Label
+                Updated item.
+        """
+        
+        self.remove(item)
+        self.add(item)
+    
+    
+    def match_journal(self, journal):
+        """
+        Updates attributes by matching journal.
+        
+        Args:
+            journal: core.Journal
+                Journal to be matched.
+        """
+        
+        # match by abbreviation
+        if journal.abbreviation:
+            exact = self._journals_abbr.get(journal.abbreviation.lower(), [])
+            dbid = _get_first(exact, self._journals_abbr_any)
+        
+        # match by title
+        elif journal.title:
+            exact = self._journals_title.get(journal.title.lower(), [])
+            dbid = _get_first(exact, self._journals_title_any)
+        
+        # nothing to match
+        else:
+            return
+        
+        # check matching item
+        if dbid is None:
+            return
+        
+        # update attributes
+        title, abbreviation = self._journals[dbid]
+        journal.dbid = dbid
+        
+        if title:
+            journal.title = title
+        
+        if abbreviation:
+            journal.abbreviation = abbreviation
+    
+    
+    def match_author(self, author):
+        """
+        Updates attributes by matching author.
+        
+        Args:
+            author: core.Author
+                Author to be matched.
+        """
+        
+        # get conditions
+        conditions = [x.lower() if x else None for x in (author.firstname, author.lastname, author.initials)]
+        
+        # check conditions
+        if not any(conditions):
+            return
+        
+        # get candidates by last name
+        if conditions[1]:
+            key = normalize_text(author.lastname)
+            groups = (self._get_authors(key), self._authors_last_any) if key else (self._authors_last_any,)
+        
+        # get candidate by other names
+        else:
+            groups = (self._find_authors(conditions),)
+        
+        # find first matching item
+        dbid = None
+        for group in groups:
+            for candidate in group:
+                
+                # skip worse candidates
+                if dbid is not None and candidate > dbid:
+                    break
+                
+                # check values
+                values = self._authors[candidate]
+                if all(_match_value(x, v) for x, v in zip(conditions, values)):
+                    dbid = candidate
+                    break
+        
+        # check matching item
+        if dbid is None:
+            return
+        
+        # update attributes
+        firstname, lastname, initials = self._authors[dbid]
+        author.dbid = dbid
+        
+        if firstname:
+            author.firstname = firstname
+        
+        if lastname:
+            author.lastname = lastname
+        
+        if initials:
+            author.initials = initials
+    
+    
+    def match_label(self, label):
+        """
+        Updates attributes by matching label.
+        
+        Args:
+            label: core.Label
+                Label to be matched.
+        """
+        
+        # get matching item
+        dbid = _get_first(self._labels_title.get(label.title.lower(), []))
+        
+        # check matching item
+        if dbid is None:
+            return
+        
+        # update attributes
+        label.dbid = dbid
+        label.title = self._labels[dbid]
+    
+    
+    def _add_journal(self, dbid, title, abbreviation):
+        """Registers journal values."""
+        
+        self._journals[dbid] = (title, abbreviation)
+        
+        # index abbreviation
+        if abbreviation:
+            _insert_id(self._journals_abbr.setdefault(abbreviation.translate(SQL_LOWER), []), dbid)
+        else:
+            _insert_id(self._journals_abbr_any, dbid)
+        
+        # index title
+        if title:
+            _insert_id(self._journals_title.setdefault(title.translate(SQL_LOWER), []), dbid)
+        else:
+            _insert_id(self._journals_title_any, dbid)
+    
+    
+    def _add_author(self, dbid, firstname, lastname, initials):
+        """Registers author values if related candidates are loaded."""
+        
+        # get loaded candidates
+        key = normalize_text(lastname)
+        if key:
+            ids = self._authors_norm.get(key, None)
+        else:
+            ids = self._authors_last_any
+        
+        # skip not loaded
+        if ids is None:
+            return
+        
+        # register values
+        self._authors[dbid] = (firstname, lastname, initials)
+        _insert_id(ids, dbid)
+    
+    
+    def _add_label(self, dbid, title):
+        """Registers label values."""
+        
+        self._labels[dbid] = title
+        _insert_id(self._labels_title.setdefault(title.translate(SQL_LOWER), []), dbid)
+    
+    
+    def _remove_journal(self, dbid):
+        """Unregisters journal values."""
+        
+        # get values
+        values = self._journals.pop(dbid, None)
+        if values is None:
+            return
+        
+        title, abbreviation = values
+        
+        # remove abbreviation
+        if abbreviation:
+            _remove_id(self._journals_abbr, abbreviation.translate(SQL_LOWER), dbid)
+        else:
+            self._journals_abbr_any.remove(dbid)
+        
+        # remove title
+        if title:
+            _remove_id(self._journals_title, title.translate(SQL_LOWER), dbid)
+        else:
+            self._journals_title_any.remove(dbid)
+    
+    
+    def _remove_author(self, dbid):
+        """Unregisters author values."""
+        
+        # get values
+        values = self._authors.pop(dbid, None)
+        if values is None:
+            return
+        
+        key = normalize_text(values[1])
+        
+        # get loaded candidates
+        if key:
+            ids = self._authors_norm.get(key, ())
+        else:
+            ids = self._authors_last_any
+        
+        # remove candidate
+        if dbid in ids:
+            ids.remove(dbid)
+    
+    
+    def _remove_label(self, dbid):
+        """Unregisters label values."""
+        
+        # get values
+        title = self._labels.pop(dbid, None)
+        if title is None:
+            return
+        
+        # remove title
+        _remove_id(self._labels_title, title.translate(SQL_LOWER), dbid)
+    
+    
+    def _get_authors(self, key):
+        """Gets sorted IDs of authors with given normalized last name."""
+        
+        # check loaded candidates
+        ids = self._authors_norm.get(key, None)
+        if ids is not None:
+            return ids
+        
+        # load candidates
+        self._db.cursor.execute("SELECT id, firstname, lastname, initials FROM authors WHERE lastname_norm = ? ORDER BY id", (key,))
+        
+        ids = []
+        for row in self._db.cursor.fetchall():
+            self._authors[row['id']] = (row['firstname'], row['lastname'], row['initials'])
+            ids.append(row['id'])
+        
+        self._authors_norm[key] = ids
+        
+        return ids
+    
+    
+    def _find_authors(self, conditions):
+        """Gets ID of first author matching lowered names without last name."""
+        
+        # prepare conditions and values
+        sqls = []
+        values = []
+        
+        for column, value in zip(('firstname', 'lastname', 'initials'), conditions):
+            if value:
+                sqls.append("(LOWER({0}) = ? OR {0} = '' OR {0} IS NULL)".format(column))
+                values.append(value)
+        
+        # get matching item
+        query = "SELECT id, firstname, lastname, initials FROM authors WHERE %s ORDER BY id LIMIT 1" % " AND ".join(sqls)
+        self._db.cursor.execute(query, values)
+        row = self._db.cursor.fetchone()
+        
+        # check matching item
+        if not row:
+            return []
+        
+        # register values
+        self._authors[row['id']] = (row['firstname'], row['lastname'], row['initials'])
+        
+        return [row['id']]
+
+
+def _get_first(*groups):
+    """Gets lowest ID of given sorted IDs lists."""
+    
+    ids = [x[0] for x in groups if x]
+    return min(ids) if ids else None
+
+
+def _insert_id(ids, dbid):
+    """Inserts ID into sorted IDs list."""
+    
+    # append higher ID
+    if not ids or ids[-1] < dbid:
+        ids.append(dbid)
+    
+    # insert lower ID
+    else:
+        bisect.insort(ids, dbid)
+
+
+def _remove_id(index, key, dbid):
+    """Removes ID from indexed sorted IDs list."""
+    
+    ids = index[key]
+    ids.remove(dbid)
+    
+    if not ids:
+        del index[key]
+
+
+def _match_value(condition, value):
+    """Checks stored value against lowered condition (None for any)."""
+    
+    # no condition
+    if not condition:
+        return True
+    
+    # empty value matches anything
+    if value is None or value == '':
+        return True
+    
+    return value.translate(SQL_LOWER) == condition
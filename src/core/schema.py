@@ -1,8 +1,167 @@
 #  Created byMartin.cz
 #  Copyright (c) Martin Strohalm. All rights reserved.
 
+# import modules
+from .database import FTS5
+from .utils import normalize_text
+
 # set database schema version
-VERSION = 4
+VERSION = 12
+
+# define indexes of links and lookup columns
+LOOKUP_INDEXES = """
+                -- indexes of articles
+                
+                CREATE INDEX IF NOT EXISTS articles_doi ON articles (doi);
+                CREATE INDEX IF NOT EXISTS articles_pmid ON articles (pmid);
+                CREATE INDEX IF NOT EXISTS articles_journal ON articles (journal);
+                CREATE INDEX IF NOT EXISTS articles_imported ON articles (imported);
+                
+                -- indexes of links
+                
+                CREATE INDEX IF NOT EXISTS articles_authors_article ON articles_authors (article, priority);
+                CREATE INDEX IF NOT EXISTS articles_authors_author ON articles_authors (author, article);
+                CREATE INDEX IF NOT EXISTS articles_labels_article ON articles_labels (article, label);
+                CREATE INDEX IF NOT EXISTS articles_labels_label ON articles_labels (label, article);
+                CREATE INDEX IF NOT EXISTS articles_collections_article ON articles_collections (article, collection);
+                CREATE INDEX IF NOT EXISTS articles_collections_collection ON articles_collections (collection, article);
+                """
+
+# define articles count triggers
+COUNT_TRIGGERS = """
+                -- triggers of journals count
+                
+                CREATE TRIGGER IF NOT EXISTS journals_count_insert AFTER INSERT ON articles BEGIN
+                    UPDATE journals SET articles_count = articles_count + 1 WHERE id = new.journal;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS journals_count_update AFTER UPDATE OF journal ON articles BEGIN
+                    UPDATE journals SET articles_count = articles_count - 1 WHERE id = old.journal;
+                    UPDATE journals SET articles_count = articles_count + 1 WHERE id = new.journal;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS journals_count_delete AFTER DELETE ON articles BEGIN
+                    UPDATE journals SET articles_count = articles_count - 1 WHERE id = old.journal;
+                END;
+                
+                -- triggers of authors count
+                
+                CREATE TRIGGER IF NOT EXISTS authors_count_insert AFTER INSERT ON articles_authors BEGIN
+                    UPDATE authors SET articles_count = articles_count + 1 WHERE id = new.author;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS authors_count_update AFTER UPDATE OF author ON articles_authors BEGIN
+                    UPDATE authors SET articles_count = articles_count - 1 WHERE id = old.author;
+                    UPDATE authors SET articles_count = articles_count + 1 WHERE id = new.author;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS authors_count_delete AFTER DELETE ON articles_authors BEGIN
+                    UPDATE authors SET articles_count = articles_count - 1 WHERE id = old.author;
+                END;
+                
+                -- triggers of labels count
+                
+                CREATE TRIGGER IF NOT EXISTS labels_count_insert AFTER INSERT ON articles_labels BEGIN
+                    UPDATE labels SET articles_count = articles_count + 1 WHERE id = new.label;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS labels_count_update AFTER UPDATE OF label ON articles_labels BEGIN
+                    UPDATE labels SET articles_count = articles_count - 1 WHERE id = old.label;
+                    UPDATE labels SET articles_count = articles_count + 1 WHERE id = new.label;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS labels_count_delete AFTER DELETE ON articles_labels BEGIN
+                    UPDATE labels SET articles_count = articles_count - 1 WHERE id = old.label;
+                END;
+                
+                -- triggers of collections count
+                
+                CREATE TRIGGER IF NOT EXISTS collections_count_insert AFTER INSERT ON articles_collections BEGIN
+                    UPDATE collections SET articles_count = articles_count + 1 WHERE id = new.collection;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS collections_count_update AFTER UPDATE OF collection ON articles_collections BEGIN
+                    UPDATE collections SET articles_count = articles_count - 1 WHERE id = old.collection;
+                    UPDATE collections SET articles_count = articles_count + 1 WHERE id = new.collection;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS collections_count_delete AFTER DELETE ON articles_collections BEGIN
+                    UPDATE collections SET articles_count = articles_count - 1 WHERE id = old.collection;
+                END;
+                """
+
+# define last author triggers
+LAST_AUTHOR_TRIGGERS = """
+                CREATE TRIGGER IF NOT EXISTS articles_last_author_insert AFTER INSERT ON articles_authors BEGIN
+                    UPDATE articles SET last_author = (
+                        SELECT author FROM articles_authors WHERE article = new.article
+                        ORDER BY priority DESC LIMIT 1)
+                    WHERE id = new.article;
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS articles_last_author_update AFTER UPDATE ON articles_authors BEGIN
+                    UPDATE articles SET last_author = (
+                        SELECT author FROM articles_authors WHERE article = articles.id
+                        ORDER BY priority DESC LIMIT 1)
+                    WHERE id IN (old.article, new.article);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS articles_last_author_delete AFTER DELETE ON articles_authors BEGIN
+                    UPDATE articles SET last_author = (
+                        SELECT author FROM articles_authors WHERE article = old.article
+                        ORDER BY priority DESC LIMIT 1)
+                    WHERE id = old.article;
+                END;
+                """
+
+# define articles count columns as (table, actual count query)
+COUNT_COLUMNS = (
+    ('journals', "SELECT COUNT(*) FROM articles WHERE articles.journal = journals.id"),
+    ('authors', "SELECT COUNT(*) FROM articles_authors WHERE articles_authors.author = authors.id"),
+    ('labels', "SELECT COUNT(*) FROM articles_labels WHERE articles_labels.label = labels.id"),
+    ('collections', "SELECT COUNT(*) FROM articles_collections WHERE articles_collections.collection = collections.id"))
+
+# define normalized shadow columns as (table, column, source)
+NORM_COLUMNS = (
+    ('articles', 'title_norm', 'title'),
+    ('journals', 'title_norm', 'title'),
+    ('journals', 'abbreviation_norm', 'abbreviation'),
+    ('authors', 'shortname_norm', 'shortname'),
+    ('labels', 'title_norm', 'title'))
+
+# define full-text index refresh of articles matching given condition
+FTS_REFRESH = """
+                    DELETE FROM articles_fts WHERE rowid IN (SELECT articles.id FROM articles WHERE {0});
+                    INSERT INTO articles_fts (rowid, title, abstract, notes, authors, journal, labels)
+                    SELECT
+                        articles.id,
+                        articles.title,
+                        articles.abstract,
+                        articles.notes,
+                        (SELECT GROUP_CONCAT(authors.shortname, ' ') FROM articles_authors
+                            JOIN authors ON authors.id = articles_authors.author
+                            WHERE articles_authors.article = articles.id),
+                        (SELECT journals.title || ' ' || IFNULL(journals.abbreviation, '') FROM journals
+                            WHERE journals.id = articles.journal),
+                        (SELECT GROUP_CONCAT(labels.title, ' ') FROM articles_labels
+                            JOIN labels ON labels.id = articles_labels.label
+                            WHERE articles_labels.article = articles.id)
+                    FROM articles WHERE {0};"""
+
+# define full-text index triggers
+FTS_TRIGGERS = (
+    ('articles_fts_insert', "AFTER INSERT ON articles", FTS_REFRESH.format("articles.id = new.id")),
+    ('articles_fts_update', "AFTER UPDATE OF title, abstract, notes, journal ON articles", FTS_REFRESH.format("articles.id = new.id")),
+    ('articles_fts_delete', "AFTER DELETE ON articles", "DELETE FROM articles_fts WHERE rowid = old.id;"),
+    ('articles_authors_fts_insert', "AFTER INSERT ON articles_authors", FTS_REFRESH.format("articles.id = new.article")),
+    ('articles_authors_fts_update', "AFTER UPDATE ON articles_authors", FTS_REFRESH.format("articles.id IN (old.article, new.article)")),
+    ('articles_authors_fts_delete', "AFTER DELETE ON articles_authors", FTS_REFRESH.format("articles.id = old.article")),
+    ('articles_labels_fts_insert', "AFTER INSERT ON articles_labels", FTS_REFRESH.format("articles.id = new.article")),
+    ('articles_labels_fts_update', "AFTER UPDATE ON articles_labels", FTS_REFRESH.format("articles.id IN (old.article, new.article)")),
+    ('articles_labels_fts_delete', "AFTER DELETE ON articles_labels", FTS_REFRESH.format("articles.id = old.article")),
+    ('authors_fts_update', "AFTER UPDATE OF shortname ON authors", FTS_REFRESH.format("articles.id IN (SELECT article FROM articles_authors WHERE author = new.id)")),
+    ('journals_fts_update', "AFTER UPDATE OF title, abbreviation ON journals", FTS_REFRESH.format("articles.journal = new.id")),
+    ('labels_fts_update', "AFTER UPDATE OF title ON labels", FTS_REFRESH.format("articles.id IN (SELECT article FROM articles_labels WHERE label = new.id)")))
 
 
 class Schema(object):
@@ -68,12 +227,14 @@ class Schema(object):
                     issue           TEXT,
                     pages           TEXT,
                     title           TEXT,
+                    title_norm      TEXT,
                     abstract        TEXT,
                     notes           TEXT,
                     pdf             INTEGER NOT NULL DEFAULT 0,
                     colour          TEXT,
                     rating          INTEGER NOT NULL DEFAULT 0,
-                    deleted         INTEGER NOT NULL DEFAULT 0
+                    deleted         INTEGER NOT NULL DEFAULT 0,
+                    last_author     INTEGER
                 );
                 
                 -- table of journals
@@ -81,7 +242,10 @@ class Schema(object):
                 CREATE TABLE IF NOT EXISTS journals (
                     id              INTEGER PRIMARY KEY NOT NULL,
                     title           TEXT NOT NULL,
-                    abbreviation    TEXT
+                    title_norm      TEXT,
+                    abbreviation    TEXT,
+                    abbreviation_norm TEXT,
+                    articles_count  INTEGER NOT NULL DEFAULT 0
                 );
                 
                 -- table of authors
@@ -89,16 +253,21 @@ class Schema(object):
                 CREATE TABLE IF NOT EXISTS authors (
                     id              INTEGER PRIMARY KEY NOT NULL,
                     shortname       TEXT NOT NULL,
+                    shortname_norm  TEXT,
                     lastname        TEXT NOT NULL,
+                    lastname_norm   TEXT,
                     firstname       TEXT,
-                    initials        TEXT
+                    initials        TEXT,
+                    articles_count  INTEGER NOT NULL DEFAULT 0
                 );
                 
                 -- table of labels
                 
                 CREATE TABLE IF NOT EXISTS labels (
                     id              INTEGER PRIMARY KEY NOT NULL,
-                    title           TEXT UNIQUE NOT NULL
+                    title           TEXT UNIQUE NOT NULL,
+                    title_norm      TEXT,
+                    articles_count  INTEGER NOT NULL DEFAULT 0
                 );
                 
                 -- table of collections
@@ -108,7 +277,9 @@ class Schema(object):
                     title           TEXT NOT NULL,
                     query           TEXT,
                     priority        INTEGER NOT NULL DEFAULT 0,
-                    export          INTEGER NOT NULL DEFAULT 0
+                    export          INTEGER NOT NULL DEFAULT 0,
+                    articles_count  INTEGER NOT NULL DEFAULT 0,
+                    materialized    INTEGER NOT NULL DEFAULT 0
                 );
                 
                 -- table of links between articles and authors
@@ -132,11 +303,44 @@ class Schema(object):
                     collection      INTEGER NOT NULL REFERENCES collections ON DELETE CASCADE,
                     article         INTEGER NOT NULL REFERENCES articles ON DELETE CASCADE
                 );
+                
+                -- table of stored members of materialized smart collections
+                
+                CREATE TABLE IF NOT EXISTS articles_smart (
+                    collection      INTEGER NOT NULL REFERENCES collections ON DELETE CASCADE,
+                    article         INTEGER NOT NULL REFERENCES articles ON DELETE CASCADE
+                );
+                
+                -- indexes of articles
+                
+                CREATE INDEX IF NOT EXISTS articles_last_author ON articles (last_author);
+                
+                -- indexes of links
+                
+                CREATE INDEX IF NOT EXISTS articles_smart_article ON articles_smart (article, collection);
+                CREATE INDEX IF NOT EXISTS articles_smart_collection ON articles_smart (collection, article);
+                
+                -- indexes of normalized columns
+                
+                CREATE INDEX IF NOT EXISTS journals_title_norm ON journals (title_norm);
+                CREATE INDEX IF NOT EXISTS journals_abbreviation_norm ON journals (abbreviation_norm);
+                CREATE INDEX IF NOT EXISTS authors_shortname_norm ON authors (shortname_norm);
+                CREATE INDEX IF NOT EXISTS authors_lastname_norm ON authors (lastname_norm);
+                CREATE INDEX IF NOT EXISTS labels_title_norm ON labels (title_norm);
                 """
         
         # init schema
         self._db.cursor.executescript(query)
         
+        # init lookup indexes
+        self._db.cursor.executescript(LOOKUP_INDEXES)
+        
+        # init count triggers
+        self._db.cursor.executescript(COUNT_TRIGGERS)
+        
+        # init last author triggers
+        self._db.cursor.executescript(LAST_AUTHOR_TRIGGERS)
+        
         # insert version info
         self.set_version(VERSION, "Initial version.")
         
@@ -176,11 +380,55 @@ class Schema(object):
             if update is not None:
                 update()
         
+        # check full-text index
+        self._check_fts()
+        
         # close connection
         if close_db:
             self._db.close()
     
     
+    def _check_fts(self):
+        """Ensures full-text index is available and maintained if supported."""
+        
+        # get existing index and triggers
+        self._db.cursor.execute("SELECT name FROM sqlite_master WHERE name = 'articles_fts' OR type = 'trigger'")
+        existing = set(x[0] for x in self._db.cursor.fetchall())
+        
+        # remove triggers if full-text search is not supported
+        if not FTS5:
+            
+            for name, event, body in FTS_TRIGGERS:
+                if name in existing:
+                    self._db.cursor.execute("DROP TRIGGER %s" % name)
+            
+            self._db.connection.commit()
+            return
+        
+        # check index and triggers
+        if all(x[0] in existing for x in FTS_TRIGGERS) and 'articles_fts' in existing:
+            return
+        
+        # create index
+        self._db.cursor.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    title,
+                    abstract,
+                    notes,
+                    authors,
+                    journal,
+                    labels)""")
+        
+        # create triggers
+        for name, event, body in FTS_TRIGGERS:
+            self._db.cursor.execute("CREATE TRIGGER IF NOT EXISTS %s %s BEGIN %s END" % (name, event, body))
+        
+        # rebuild index
+        self._db.cursor.executescript(FTS_REFRESH.format("1"))
+        
+        # commit changes
+        self._db.connection.commit()
+    
+    
     def _update_1_to_2(self):
         """Runs schema update to add notes column to articles."""
         
@@ -209,7 +457,7 @@ class Schema(object):
     
     def _update_3_to_4(self):
         """Runs schema update to allow empty author's first name."""
-
+        
         self._db.cursor.execute("PRAGMA writable_schema = 1")
         self._db.cursor.execute("UPDATE SQLITE_MASTER SET SQL = replace(SQL, 'firstname       TEXT NOT NULL', 'firstname       TEXT') WHERE NAME = 'authors'")
         self._db.cursor.execute("PRAGMA writable_schema = 0")
@@ -222,3 +470,170 @@ class Schema(object):
         
         # refresh
         self._db.cursor.execute("VACUUM")
+    
+    
+    def _update_4_to_5(self):
+        """Runs schema update to add indexes for links and lookup columns."""
+        
+        # create indexes
+        self._db.cursor.executescript(LOOKUP_INDEXES)
+        
+        # set version
+        self.set_version(5, "Added indexes for links and lookup columns.")
+        
+        # commit changes
+        self._db.connection.commit()
+        
+        # refresh statistics
+        self._db.cursor.execute("ANALYZE")
+    
+    
+    def _update_5_to_6(self):
+        """Runs schema update to add full-text index of articles."""
+        
+        # create full-text index
+        self._check_fts()
+        
+        # set version
+        self.set_version(6, "Added full-text index of articles.")
+        
+        # commit changes
+        self._db.connection.commit()
+    
+    
+    def _update_6_to_7(self):
+        """Runs schema update to add normalized columns for searching."""
+        
+        # add columns
+        for table, column, source in NORM_COLUMNS:
+            self._db.cursor.execute("ALTER TABLE %s ADD COLUMN %s TEXT" % (table, column))
+        
+        # fill columns
+        for table, column, source in NORM_COLUMNS:
+            self._db.cursor.execute("SELECT id, %s FROM %s" % (source, table))
+            values = [(normalize_text(x[1]), x[0]) for x in self._db.cursor.fetchall()]
+            self._db.cursor.executemany("UPDATE %s SET %s = ? WHERE id = ?" % (table, column), values)
+        
+        # create indexes
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS journals_title_norm ON journals (title_norm)")
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS journals_abbreviation_norm ON journals (abbreviation_norm)")
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS authors_shortname_norm ON authors (shortname_norm)")
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS labels_title_norm ON labels (title_norm)")
+        
+        # set version
+        self.set_version(7, "Added normalized columns for searching.")
+        
+        # commit changes
+        self._db.connection.commit()
+    
+    
+    def _update_7_to_8(self):
+        """Runs schema update to add articles counts maintained by triggers."""
+        
+        # add columns and fill counts
+        for table, count in COUNT_COLUMNS:
+            self._db.cursor.execute("ALTER TABLE %s ADD COLUMN articles_count INTEGER NOT NULL DEFAULT 0" % table)
+            self._db.cursor.execute("UPDATE %s SET articles_count = (%s)" % (table, count))
+        
+        # create triggers
+        self._db.cursor.executescript(COUNT_TRIGGERS)
+        
+        # set version
+        self.set_version(8, "Added articles counts maintained by triggers.")
+        
+        # commit changes
+        self._db.connection.commit()
+    
+    
+    def _update_8_to_9(self):
+        """Runs schema update to store last author of articles."""
+        
+        # add column
+        self._db.cursor.execute("ALTER TABLE articles ADD COLUMN last_author INTEGER")
+        
+        # fill column
+        self._db.cursor.execute("""UPDATE articles SET last_author = (
+                    SELECT author FROM articles_authors WHERE article = articles.id
+                    ORDER BY priority DESC LIMIT 1)""")
+        
+        # create index
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS articles_last_author ON articles (last_author)")
+        
+        # create triggers
+        self._db.cursor.executescript(LAST_AUTHOR_TRIGGERS)
+        
+        # set version
+        self.set_version(9, "Added last author of articles.")
+        
+        # commit changes
+        self._db.connection.commit()
+        
+        # refresh statistics
+        self._db.cursor.execute("ANALYZE")
+    
+    
+    def _update_9_to_10(self):
+        """Runs schema update to add materialized smart collections."""
+        
+        # add column
+        self._db.cursor.execute("ALTER TABLE collections ADD COLUMN materialized INTEGER NOT NULL DEFAULT 0")
+        
+        # make table query
+        query = """
+                CREATE TABLE IF NOT EXISTS articles_smart (
+                    collection      INTEGER NOT NULL REFERENCES collections ON DELETE CASCADE,
+                    article         INTEGER NOT NULL REFERENCES articles ON DELETE CASCADE
+                );
+                
+                CREATE INDEX IF NOT EXISTS articles_smart_article ON articles_smart (article, collection);
+                CREATE INDEX IF NOT EXISTS articles_smart_collection ON articles_smart (collection, article);
+                """
+        
+        # create table
+        self._db.cursor.executescript(query)
+        
+        # set version
+        self.set_version(10, "Added materialized smart collections.")
+        
+        # commit changes
+        self._db.connection.commit()
+    
+    
+    def _update_10_to_11(self):
+        """Runs schema update to add normalized last name for authors matching."""
+        
+        # add column
+        self._db.cursor.execute("ALTER TABLE authors ADD COLUMN lastname_norm TEXT")
+        
+        # fill column
+        self._db.cursor.execute("SELECT id, lastname FROM authors")
+        values = [(normalize_text(x[1]), x[0]) for x in self._db.cursor.fetchall()]
+        self._db.cursor.executemany("UPDATE authors SET lastname_norm = ? WHERE id = ?", values)
+        
+        # create index
+        self._db.cursor.execute("CREATE INDEX IF NOT EXISTS authors_lastname_norm ON authors (lastname_norm)")
+        
+        # set version
+        self.set_version(11, "Added normalized last name of authors.")
+        
+        # commit changes
+        self._db.connection.commit()
+        
+        # refresh statistics
+        self._db.cursor.execute("ANALYZE")
+    
+    
+    def _update_11_to_12(self):
+        """Runs schema update to remove index of trash status."""
+        
+        # remove index
+        self._db.cursor.execute("DROP INDEX IF EXISTS articles_deleted")
+        
+        # set version
+        self.set_version(12, "Removed index of trash status.")
+        
+        # commit changes
+        self._db.connection.commit()
+        
+        # refresh statistics
+        self._db.cursor.execute("ANALYZE")
@@ -99,6 +99,13 @@ def remove_diacritics(value):
     # copy value
     text = str(value)
     
+    # skip conversion for plain ASCII
+    try:
+        text.encode('ascii')
+        return text.replace(".", "")
+    except UnicodeEncodeError:
+        pass
+    
     # replace known characters
     for pair in REPLACERS:
         text = text.replace(pair[0], pair[1])
@@ -214,3 +221,27 @@ def count_pages(pages):
     
     except ValueError:
         return None
+
+
+def normalize_text(value):
+    """Converts text into casefolded form without diacritics for searching."""
+    
+    # check value
+    if not value:
+        return value
+    
+    # copy value
+    text = str(value)
+    
+    # skip conversion for plain ASCII
+    try:
+        text.encode('ascii')
+        return text.lower()
+    except UnicodeEncodeError:
+        pass
+    
+    # remove diacritics
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    
+    return text.casefold()
@@ -29,12 +29,18 @@ class ArticlesList(wx.Panel):
         self._make_ui()
     
     
-    def SetArticles(self, articles):
-        """Sets articles to display."""
+    def SetArticles(self, articles, ranked=False):
+        """Sets articles to display. Ranked articles are kept in given order."""
         
         # unselect all
         self._list_ctrl.UnselectAll()
         
+        # clear sorting to keep ranking
+        if ranked:
+            sort_column = self._list_ctrl.GetSortingColumn()
+            if sort_column is not None:
+                sort_column.UnsetAsSortKey()
+        
         # set data
         before = len(self._articles)
         self._articles[:] = articles if articles else []
@@ -2,6 +2,8 @@
 #  Copyright (c) Martin Strohalm. All rights reserved.
 
 # import modules
+import bisect
+import threading
 import wx
 
 import core
@@ -14,6 +16,9 @@ from .. hotkeys import *
 from .list_ctrl import ArticlesList
 from .top_bar import ArticlesTopBar
 
+# set delay of search while typing (ms)
+SEARCH_DELAY = 250
+
 
 class ArticlesView(wx.Panel):
     """Articles view panel."""
@@ -30,6 +35,12 @@ class ArticlesView(wx.Panel):
         self._articles = []
         self._collection_ids = {}
         
+        self._query = None
+        self._order_by = None
+        self._search_id = 0
+        self._search_timer = None
+        self._search_pending = None
+        
         # make UI
         self._make_ui()
     
@@ -46,6 +57,12 @@ class ArticlesView(wx.Panel):
         return self._list.GetSelectedArticles()
     
     
+    def GetQuery(self):
+        """Gets final query of displayed articles."""
+        
+        return self._query
+    
+    
     def GetColumnsSettings(self):
         """Gets current column order and settings."""
         
@@ -57,11 +74,74 @@ class ArticlesView(wx.Panel):
         
         # set library
         self._library = library
+        self._query = None
         
         # display all articles
         self.ShowAllArticles()
     
     
+    def UpdateArticles(self, articles):
+        """Updates displayed articles after given articles were inserted or changed."""
+        
+        # check current query
+        if self._query is None or not self._query.matchable:
+            self.ShowArticles()
+            return
+        
+        # cancel running search
+        self._search_id += 1
+        self._search_pending = None
+        
+        # update displayed articles
+        current = list(self._articles)
+        indices = {x.dbid: i for i, x in enumerate(current)}
+        added = []
+        
+        for article in articles:
+            
+            # check query
+            index = indices.get(article.dbid, None)
+            match = self._query.matches(article)
+            
+            # replace existing
+            if index is not None and match:
+                current[index] = article
+            
+            # remove existing
+            elif index is not None:
+                current[index] = None
+            
+            # add new
+            elif match:
+                added.append(article)
+        
+        # remove unmatched
+        current = [x for x in current if x is not None]
+        
+        # insert new articles by current descending order
+        if added:
+            
+            # get order values
+            try:
+                order = [(core.get_articles_order(x, self._order_by), x.dbid) for x in current]
+                added = [((core.get_articles_order(x, self._order_by), x.dbid), x) for x in added]
+            
+            # order not available in memory
+            except KeyError:
+                self.ShowArticles()
+                return
+            
+            # insert articles
+            order.reverse()
+            for value, article in sorted(added, key=lambda x: x[0]):
+                index = bisect.bisect(order, value)
+                order.insert(index, value)
+                current.insert(len(current) - index, article)
+        
+        # show articles
+        self._set_articles(current, self._query, self._order_by)
+    
+    
     def SetQuery(self, value):
         """Sets query to top bar."""
         
@@ -109,7 +189,42 @@ class ArticlesView(wx.Panel):
     def _on_query_changed(self, evt):
         """Handles query changed event."""
         
-        self.ShowArticles()
+        # restart delayed search
+        if self._search_timer is not None:
+            self._search_timer.Stop()
+        
+        self._search_timer = wx.CallLater(SEARCH_DELAY, self._search_async)
+    
+    
+    def _on_search_done(self, search_id, articles, query, order_by):
+        """Handles finished background search."""
+        
+        # check if still valid
+        if not self or search_id != self._search_pending:
+            return
+        
+        # reset pending search
+        self._search_pending = None
+        
+        # show articles
+        self._set_articles(articles, query, order_by)
+    
+    
+    def _on_search_failed(self, search_id, error):
+        """Handles failed background search."""
+        
+        # check if still valid
+        if not self or search_id != self._search_pending:
+            return
+        
+        # reset pending search
+        self._search_pending = None
+        
+        # show message
+        wx.Bell()
+        dlg = mwx.MessageDlg(self, -1, "Cannot search articles.", str(error), "Error")
+        dlg.ShowModal()
+        dlg.Destroy()
     
     
     def _on_item_context_menu(self, evt):
@@ -343,7 +458,7 @@ class ArticlesView(wx.Panel):
             
             # get related articles
             query = "%s[COLLECTIONID]" % collection.dbid
-            coll_articles = self._library.search(core.Query(query, core.Article.NAME))
+            coll_articles = self._library.search(core.Query(query, core.Article.NAME), lazy=True, profile='list')
             coll_articles_ids = set(x.dbid for x in coll_articles)
             status = all(x.dbid in coll_articles_ids for x in articles)
             
@@ -361,29 +476,100 @@ class ArticlesView(wx.Panel):
         return menu
     
     
-    def _show_articles(self, query="", order_by=lambda x:x.imported, reverse=True):
+    def _show_articles(self, query="", order_by=None, reverse=True):
         """Shows articles according to given query."""
         
-        self._articles = []
+        # cancel running search
+        self._search_id += 1
+        self._search_pending = None
+        
+        # make query
+        query, order_by = self._make_query(query, order_by)
+        
+        # get articles
+        articles = []
+        if self._library is not None:
+            articles = self._library.search(query, lazy=True, profile='list', order_by=order_by, reverse=reverse)
+        
+        # show articles
+        self._set_articles(articles, query, order_by)
+    
+    
+    def _search_async(self):
+        """Shows articles according to current query without blocking UI."""
+        
+        self._search_timer = None
+        
+        # cancel running search
+        self._search_id += 1
+        self._search_pending = None
+        
+        # check library
+        if self._library is None:
+            return
+        
+        # make query
+        query, order_by = self._make_query(self._top_bar.GetQuery())
+        
+        # refine current articles
+        if self._query is not None and order_by == self._order_by:
+            articles = self._library.refine(query, self._query, self._articles)
+            if articles is not None:
+                self._set_articles(articles, query, order_by)
+                return
+        
+        # search in background
+        self._search_pending = self._search_id
+        task = threading.Thread(target=self._search_task, args=(self._search_id, self._library, query, order_by))
+        task.daemon = True
+        task.start()
+    
+    
+    def _search_task(self, search_id, library, query, order_by):
+        """Retrieves articles according to given query."""
+        
+        # get articles
+        try:
+            articles = library.search(query, lazy=True, profile='list', order_by=order_by, reverse=True)
+        
+        # report error
+        except Exception as error:
+            wx.CallAfter(self._on_search_failed, search_id, error)
+            return
+        
+        # show articles
+        wx.CallAfter(self._on_search_done, search_id, articles, query, order_by)
+    
+    
+    def _make_query(self, query="", order_by=None):
+        """Makes final query and order for given query."""
         
         # parse query
         if not isinstance(query, core.Query):
             query = core.Query(query, core.Article.NAME)
         
+        # show best matches first for free-text query
+        if order_by is None:
+            order_by = 'relevance' if query.terms else 'imported'
+        
         # add master query
         if query.tree is not None and self._master_query:
             query = "(%s) AND (%s)" % (query.query, self._master_query) if query.tree else self._master_query
             query = core.Query(query, core.Article.NAME)
         
-        # get articles
-        if self._library is not None:
-            self._articles = self._library.search(query)
+        return query, order_by
+    
+    
+    def _set_articles(self, articles, query, order_by):
+        """Shows given articles retrieved by query."""
         
-        # sort articles
-        self._articles.sort(key=order_by, reverse=reverse)
+        # remember articles
+        self._articles = articles
+        self._query = query
+        self._order_by = order_by
         
         # update list
-        self._list.SetArticles(self._articles)
+        self._list.SetArticles(self._articles, ranked=(order_by == 'relevance'))
         
         # post event
         event = events.ArticlesSetEvent(self.GetId())
@@ -270,8 +270,9 @@ class AuthorsView(wx.Dialog):
         # get authors
         if self._library is not None:
             self._authors = self._library.search(query)
-            for item in self._authors:
-                item.count = self._library.count(item)
+            counts = self._library.count_many(self._authors)
+            for item, count in zip(self._authors, counts):
+                item.count = count
         
         # sort authors
         self._authors.sort(key=order_by, reverse=reverse)
@@ -46,6 +46,7 @@ class CollectionsEditDlg(wx.Dialog):
         title = self._title_value.GetValue().strip()
         query = self._query_value.GetValue().strip()
         export = self._export_check.GetValue()
+        materialized = self._materialized_check.GetValue()
         
         # check values
         if not title or (self._is_smart and not query):
@@ -64,6 +65,7 @@ class CollectionsEditDlg(wx.Dialog):
         self._collection.title = title
         self._collection.query = query
         self._collection.export = export
+        self._collection.materialized = materialized and bool(query)
         
         # close dialog
         self.EndModal(wx.ID_OK)
@@ -91,6 +93,10 @@ class CollectionsEditDlg(wx.Dialog):
         self._export_check.SetValue(self._collection.export)
         self._export_check.SetToolTip("Creates a text export with citations when application quits")
         
+        self._materialized_check = wx.CheckBox(self, -1, "Store articles for faster access")
+        self._materialized_check.SetValue(self._collection.materialized)
+        self._materialized_check.SetToolTip("Keeps matching articles updated in library instead of searching them each time")
+        
         cancel_butt = wx.Button(self, wx.ID_CANCEL, "Cancel")
         ok_butt = wx.Button(self, wx.ID_OK, "OK")
         
@@ -99,6 +105,8 @@ class CollectionsEditDlg(wx.Dialog):
             self._query_value.ChangeValue("")
             self._query_value.Disable()
             self._query_label.Disable()
+            self._materialized_check.SetValue(False)
+            self._materialized_check.Disable()
         
         # bind events
         self._title_value.Bind(wx.EVT_TEXT_ENTER, self._on_ok)
@@ -113,6 +121,7 @@ class CollectionsEditDlg(wx.Dialog):
         grid.Add(self._query_label, (1,0), flag=wx.ALIGN_RIGHT | wx.ALIGN_CENTER_VERTICAL)
         grid.Add(self._query_value, (1,1), (1,2), flag=wx.ALIGN_CENTER_VERTICAL | wx.EXPAND)
         grid.Add(self._export_check, (2,1), flag=wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
+        grid.Add(self._materialized_check, (3,1), flag=wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
         grid.AddGrowableCol(1)
         
         buttons = wx.BoxSizer(wx.HORIZONTAL)
@@ -68,8 +68,7 @@ class CollectionsView(wx.Panel):
         
         # update articles count
         if self._library is not None:
-            for collection in self._library_collections:
-                collection.count = self._library.count(collection)
+            self._update_counts(self._library_collections)
         else:
             for collection in self._library_collections:
                 collection.count = 0
@@ -96,8 +95,7 @@ class CollectionsView(wx.Panel):
             self._manual_collections = [x for x in collections if not x.query]
             
             # update articles count
-            for collection in self._manual_collections:
-                collection.count = self._library.count(collection)
+            self._update_counts(self._manual_collections)
         
         # update tree
         self._tree.SetManualCollections(self._manual_collections)
@@ -121,8 +119,7 @@ class CollectionsView(wx.Panel):
             self._smart_collections = [x for x in collections if x.query]
             
             # update articles count
-            for collection in self._smart_collections:
-                collection.count = self._library.count(collection)
+            self._update_counts(self._smart_collections)
         
         # update tree
         self._tree.SetSmartCollections(self._smart_collections)
@@ -154,8 +151,7 @@ class CollectionsView(wx.Panel):
                         attachment = label))
             
             # update articles count
-            for collection in self._labels_collections:
-                collection.count = self._library.count(collection)
+            self._update_counts(self._labels_collections)
         
         # update tree
         self._tree.SetLabelsCollections(self._labels_collections)
@@ -167,24 +163,29 @@ class CollectionsView(wx.Panel):
     def UpdateCounts(self):
         """Updates labels for each collection."""
         
-        # update counts for library collections
-        for collection in self._library_collections:
-            collection.count = self._library.count(collection)
+        # update counts for all collections
+        self._update_counts(
+            self._library_collections +
+            self._manual_collections +
+            self._smart_collections +
+            self._labels_collections)
         
-        # update counts for manual collections
-        for collection in self._manual_collections:
-            collection.count = self._library.count(collection)
+        # update tree
+        self._tree.UpdateItemsText()
+    
+    
+    def _update_counts(self, collections):
+        """Updates articles count for given collections."""
         
-        # update counts for smart collections
-        for collection in self._smart_collections:
-            collection.count = self._library.count(collection)
+        # use labels directly for labels collections
+        items = [x.attachment if x.group == "labels" else x for x in collections]
         
-        # update counts for labels collections
-        for collection in self._labels_collections:
-            collection.count = self._library.count(collection.attachment)
+        # get counts
+        counts = self._library.count_many(items)
         
-        # update tree
-        self._tree.UpdateItemsText()
+        # set counts
+        for collection, count in zip(collections, counts):
+            collection.count = count
     
     
     def _on_paint(self, evt):
@@ -16,6 +16,9 @@ _PARAMS = dict(
     library = ['', str, True],
     recent_days = [10, int, True],
     
+    # minimal duration of logged slow queries in ms (0 to disable)
+    slow_query_threshold = [100, int, True],
+    
     # application layout
     unlock_ui = [False, bool, False],
     menu_bar_enabled = [True, bool, True],
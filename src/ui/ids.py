@@ -14,6 +14,7 @@ ID_LIBRARY_NEW = wx.NewIdRef()
 ID_LIBRARY_OPEN = wx.NewIdRef()
 ID_LIBRARY_BACKUP = wx.NewIdRef()
 ID_LIBRARY_ANALYZE = wx.NewIdRef()
+ID_LIBRARY_SLOW_QUERIES = wx.NewIdRef()
 
 ID_ARTICLES_SEARCH = wx.NewIdRef()
 ID_ARTICLES_OPEN_PDF = wx.NewIdRef()
@@ -36,11 +36,15 @@ from .collections_view import CollectionsView, CollectionsEditDlg
 from .repository_view import RepositoryView
 from .labels_view import LabelsView, LabelsEditDlg
 from .stats_view import StatsView
+from .queries_dlg import QueriesDlg
 
 # compile patterns
 DETAILS_URL_PATTERN = re.compile("papyrus:\?(?P<parameter>[a-z]+)=(?P<value>.+)")
 EXPORT_PATTERN = re.compile("^_export_.+\.txt$")
 
+# set refresh interval of time-based materialized collections (ms)
+SMART_REFRESH_INTERVAL = 10 * 60 * 1000
+
 
 class MainFrame(wx.Frame):
     """Main application frame."""
@@ -84,9 +88,15 @@ class MainFrame(wx.Frame):
             print(config.SETTINGS)
             self.Maximize()
         
+        # init time-based collections refresh
+        self._smart_timer = wx.Timer(self)
+        
         # bind events
         self._bind_events()
         
+        # start time-based collections refresh
+        self._smart_timer.Start(SMART_REFRESH_INTERVAL)
+        
         # set hot keys
         self.SetAcceleratorTable(wx.AcceleratorTable(ACCELERATORS))
         
@@ -111,6 +121,9 @@ class MainFrame(wx.Frame):
         except:
             pass
         
+        # stop timers
+        self._smart_timer.Stop()
+        
         # safe destroy
         self.AUIManager.UnInit()
         self.Destroy()
@@ -127,7 +140,7 @@ class MainFrame(wx.Frame):
             
             # get absolute path
             path = os.path.abspath(path)
-           
+            
             # get extension
             dirname, filename = os.path.split(path)
             basename, extension = os.path.splitext(filename)
@@ -146,6 +159,8 @@ class MainFrame(wx.Frame):
             
             try:
                 self._library = core.Library(libraries[0])
+                self._library.refresh_smart(timed=True)
+                self._library.slow_threshold = config.SETTINGS['slow_query_threshold'] / 1000. or None
                 self._menu_bar.SetLibrary(self._library)
                 self._collections_view.SetLibrary(self._library)
                 self._articles_view.SetMasterQuery("0[TRASH]")
@@ -276,6 +291,29 @@ class MainFrame(wx.Frame):
         dlg.Destroy()
     
     
+    def _on_library_slow_queries(self, evt=None):
+        """Shows slow queries log and plan of current articles query."""
+        
+        dlg = QueriesDlg(self, self._library, self._articles_view.GetQuery())
+        dlg.ShowModal()
+        dlg.Destroy()
+    
+    
+    def _on_smart_timer(self, evt=None):
+        """Refreshes materialized collections using time-based conditions."""
+        
+        # check library
+        if self._library is None:
+            return
+        
+        # refresh collections
+        if not self._library.refresh_smart(timed=True):
+            return
+        
+        # refresh counts
+        self._collections_view.UpdateCounts()
+    
+    
     def _on_collections_selection_changed(self, evt=None):
         """Handles collection selection changed event."""
         
@@ -300,6 +338,10 @@ class MainFrame(wx.Frame):
         elif collection.group == "custom" and not collection.query:
             query = "%s[COLLECTIONID]" % collection.dbid
         
+        # handle materialized smart collection
+        elif collection.group == "custom" and collection.materialized:
+            query = "%s[SMARTID]" % collection.dbid
+        
         # handle smart collection
         elif collection.group == "custom" and collection.query:
             query = collection.query
@@ -468,7 +510,7 @@ class MainFrame(wx.Frame):
             return
         
         # get articles in trash
-        articles = self._library.search(core.Query("1[TRASH]", core.Article.NAME))
+        articles = self._library.search(core.Query("1[TRASH]", core.Article.NAME), lazy=True, profile='list')
         
         # remove articles from library
         for article in articles:
@@ -503,7 +545,7 @@ class MainFrame(wx.Frame):
                 query = core.Query("%s[COLLECTIONID]" % collection.dbid, core.Article.NAME)
             
             # get articles
-            articles = self._library.search(query)
+            articles = self._library.search(query, lazy=True, profile='list')
             
             # make export
             text = ""
@@ -646,7 +688,7 @@ class MainFrame(wx.Frame):
         
         # get selected articles
         articles = self._articles_view.GetSelectedArticles()
-
+        
         # update menu bar
         self._menu_bar.SetArticles(articles)
         
@@ -660,8 +702,9 @@ class MainFrame(wx.Frame):
         article = articles[0]
         
         # get authors articles count
-        for author in article.authors:
-            author.count = self._library.count(author)
+        counts = self._library.count_many(article.authors)
+        for author, count in zip(article.authors, counts):
+            author.count = count
         
         # show article details
         self._details_view.SetArticle(article)
@@ -914,7 +957,7 @@ class MainFrame(wx.Frame):
         self._collections_view.UpdateCounts()
         
         # refresh articles view
-        self._articles_view.ShowArticles()
+        self._articles_view.UpdateArticles([article])
         self._articles_view.SetSelectedArticles([article])
     
     
@@ -952,7 +995,7 @@ class MainFrame(wx.Frame):
         self._collections_view.UpdateCounts()
         
         # refresh articles view
-        self._articles_view.ShowArticles()
+        self._articles_view.UpdateArticles([article])
         self._articles_view.SetSelectedArticles([article])
     
     
@@ -1583,6 +1626,7 @@ class MainFrame(wx.Frame):
         
         # main
         self.Bind(wx.EVT_CLOSE, self.OnClose)
+        self.Bind(wx.EVT_TIMER, self._on_smart_timer, self._smart_timer)
         
         # drag files
         self.DragAcceptFiles(True)
@@ -1612,7 +1656,7 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self._on_library_new, id=ID_LIBRARY_NEW)
         self.Bind(wx.EVT_MENU, self._on_library_open, id=ID_LIBRARY_OPEN)
         self.Bind(wx.EVT_MENU, self._on_library_backup, id=ID_LIBRARY_BACKUP)
-
+        
         self.Bind(wx.EVT_MENU, self._on_articles_search, id=ID_ARTICLES_SEARCH)
         self.Bind(wx.EVT_MENU, self._on_articles_open_pdf, id=ID_ARTICLES_OPEN_PDF)
         self.Bind(wx.EVT_MENU, self._on_articles_open_doi, id=ID_ARTICLES_OPEN_DOI)
@@ -1663,6 +1707,7 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_MENU, self._on_repository_search, id=ID_REPOSITORY_RECENT_JOURNAL)
         
         self.Bind(wx.EVT_MENU, self._on_library_analyze, id=ID_LIBRARY_ANALYZE)
+        self.Bind(wx.EVT_MENU, self._on_library_slow_queries, id=ID_LIBRARY_SLOW_QUERIES)
         self.Bind(wx.EVT_MENU, self._on_authors_list, id=ID_AUTHORS_LIST)
         
         self.Bind(wx.EVT_MENU, self._on_view_pane, id=ID_VIEW_COLLECTIONS)
@@ -1716,9 +1761,15 @@ class MainFrame(wx.Frame):
             return
         
         # insert articles
-        for article in articles:
-            if article.checked:
-                self._library.insert(article)
+        failures = self._library.insert_many([x for x in articles if x.checked])
+        
+        # show failures
+        if failures:
+            wx.Bell()
+            details = "\n".join("%s: %s" % (x.title, error) for x, error in failures[:10])
+            dlg = mwx.MessageDlg(self, -1, "Some articles cannot be imported.", details, "Error")
+            dlg.ShowModal()
+            dlg.Destroy()
         
         # refresh collections view
         self._collections_view.UpdateCounts()
@@ -1735,6 +1786,9 @@ class MainFrame(wx.Frame):
         self._progress_max = len(paths)
         self._progress_message = "Importing PDFs..."
         
+        # init failures
+        self._import_failures = []
+        
         # show gauge panel
         gauge = mwx.GaugeDlg(self, -1, self._progress_message, "Import")
         gauge.SetRange(self._progress_max)
@@ -1760,6 +1814,14 @@ class MainFrame(wx.Frame):
         
         # close gauge
         gauge.Close()
+        
+        # show failures
+        if self._import_failures:
+            wx.Bell()
+            details = "\n".join("%s: %s" % (x.title, error) for x, error in self._import_failures[:10])
+            dlg = mwx.MessageDlg(self, -1, "Some PDFs cannot be imported.", details, "Error")
+            dlg.ShowModal()
+            dlg.Destroy()
     
     
     def _pdf_import_task(self, paths, auto_match):
@@ -1768,7 +1830,8 @@ class MainFrame(wx.Frame):
         # remember articles to match later
         articles_to_match = []
         
-        # import PDFs
+        # init articles
+        articles = []
         for path in paths:
             
             # get filename
@@ -1780,8 +1843,26 @@ class MainFrame(wx.Frame):
             # get DOI from PDF
             article.doi = core.doi_from_pdf(path)
             
-            # insert article into library
-            self._library.insert(article)
+            # remember article
+            articles.append(article)
+            
+            # increase progress
+            self._progress += 1
+        
+        # insert articles into library
+        self._import_failures = self._library.insert_many(articles)
+        
+        # reset progress info
+        self._progress = 0
+        self._progress_message = "Copying PDFs..."
+        
+        # import PDFs
+        for path, article in zip(paths, articles):
+            
+            # skip failed article
+            if not article.dbid:
+                self._progress += 1
+                continue
             
             # copy PDF into library folder
             shutil.copy(path, article.pdf_path)
@@ -1817,7 +1898,7 @@ class MainFrame(wx.Frame):
             
             # match to existing article
             query = "%s[DOI] AND NOT %s[ID]" % (article.doi, article.dbid)
-            matches = self._library.search(core.Query(query, core.Article.NAME))
+            matches = self._library.search(core.Query(query, core.Article.NAME), lazy=True, profile='list')
             
             if len(matches) == 1 and article.doi == matches[0].doi:
                 match = matches[0]
@@ -50,6 +50,7 @@ class MenuBar(wx.MenuBar):
         self.Enable(ID_ARTICLES_NEW, self._library is not None)
         self.Enable(ID_ARTICLES_IMPORT, self._library is not None)
         self.Enable(ID_LIBRARY_BACKUP, self._library is not None)
+        self.Enable(ID_LIBRARY_SLOW_QUERIES, self._library is not None)
         
         # set others
         self.SetCollection()
@@ -133,6 +134,7 @@ class MenuBar(wx.MenuBar):
         
         menu.AppendSeparator()
         menu.Append(ID_LIBRARY_ANALYZE, "Analyze Library\t"+HK_LIBRARY_ANALYZE)
+        menu.Append(ID_LIBRARY_SLOW_QUERIES, "Slow Queries...")
         menu.Append(ID_AUTHORS_LIST, "List Authors...\t"+HK_AUTHORS_LIST)
         
         menu.AppendSeparator()
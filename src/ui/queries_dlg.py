@@ -0,0 +1,136 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import wx
+
+from . import mwx
+
+
+class QueriesDlg(wx.Dialog):
+    """Dialog to show slow queries log and plan of current query."""
+    
+    
+    def __init__(self, parent, library, query=None):
+        """Initializes queries dialog."""
+        
+        # init dialog
+        wx.Dialog.__init__(self, parent, -1, title="Slow Queries", size=(210, 350), style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+        self.Bind(wx.EVT_PAINT, self._on_paint)
+        
+        # init buffers
+        self._library = library
+        self._query = query
+        
+        # make UI
+        self._make_ui()
+        
+        # show data
+        self._update_text()
+        
+        # display dialog
+        self.Layout()
+        self.Sizer.Fit(self)
+        self.Centre()
+    
+    
+    def _on_paint(self, evt):
+        """Draws background image."""
+        
+        if mwx.IS_WIN:
+            mwx.panel_top_line(self)
+    
+    
+    def _on_clear(self, evt=None):
+        """Handles clear button."""
+        
+        self._library.clear_slow_queries()
+        self._update_text()
+    
+    
+    def _on_save(self, evt=None):
+        """Handles save button."""
+        
+        # get path
+        wildcard = "Text files (*.txt)|*.txt"
+        dlg = wx.FileDialog(self, "Save Slow Queries", "", "slow_queries.txt", wildcard=wildcard, style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            path = dlg.GetPath()
+            dlg.Destroy()
+        else:
+            dlg.Destroy()
+            return
+        
+        # save log
+        try:
+            self._library.dump_slow_queries(path)
+        
+        except IOError:
+            wx.Bell()
+            dlg = mwx.MessageDlg(self, -1, "Cannot save the log.", "Please make sure you have write access\nfor selected location.", "Error")
+            dlg.ShowModal()
+            dlg.Destroy()
+    
+    
+    def _on_close(self, evt=None):
+        """Handles close button."""
+        
+        self.EndModal(wx.ID_CANCEL)
+    
+    
+    def _update_text(self):
+        """Shows current query plan and slow log."""
+        
+        buff = ""
+        
+        # add current query plan
+        if self._query is not None:
+            explain = self._query.explain(self._library)
+            
+            buff += "Current query: %s\n" % self._query.query
+            buff += "%s\n" % (" ".join(explain['sql'].split()) if explain['sql'] else "")
+            buff += "%s\n" % (explain['values'],)
+            buff += "\n".join(explain['plan']) + "\n"
+            
+            if explain['scans']:
+                buff += "Full scans: %s\n" % ", ".join(explain['scans'])
+            
+            buff += "\n"
+        
+        # add slow log
+        threshold = self._library.slow_threshold
+        if threshold is None:
+            buff += "Slow queries log is disabled.\n"
+        else:
+            buff += "Slow queries over %.0f ms:\n\n" % (1000 * threshold)
+            buff += self._library.dump_slow_queries() or "No slow queries logged.\n"
+        
+        # show text
+        self._text_value.ChangeValue(buff)
+    
+    
+    def _make_ui(self):
+        """Makes dialog UI."""
+        
+        # make items
+        self._text_value = wx.TextCtrl(self, -1, "", size=(600,400), style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_DONTWRAP)
+        self._text_value.SetFont(wx.SMALL_FONT)
+        
+        clear_butt = wx.Button(self, -1, "Clear Log")
+        save_butt = wx.Button(self, wx.ID_SAVE, "Save...")
+        close_butt = wx.Button(self, wx.ID_CANCEL, "Close")
+        
+        # bind events
+        clear_butt.Bind(wx.EVT_BUTTON, self._on_clear)
+        save_butt.Bind(wx.EVT_BUTTON, self._on_save)
+        close_butt.Bind(wx.EVT_BUTTON, self._on_close)
+        
+        # pack items
+        buttons = wx.BoxSizer(wx.HORIZONTAL)
+        buttons.Add(clear_butt, 0, wx.RIGHT, mwx.PANEL_SPACE_MAIN)
+        buttons.Add(save_butt, 0, wx.RIGHT, mwx.PANEL_SPACE_MAIN)
+        buttons.Add(close_butt, 0)
+        
+        self.Sizer = wx.BoxSizer(wx.VERTICAL)
+        self.Sizer.Add(self._text_value, 1, wx.ALL | wx.EXPAND, mwx.PANEL_SPACE_MAIN)
+        self.Sizer.Add(buttons, 0, wx.LEFT | wx.RIGHT | wx.BOTTOM | wx.ALIGN_RIGHT, mwx.PANEL_SPACE_MAIN)
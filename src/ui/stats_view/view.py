@@ -3,9 +3,7 @@
 
 # import modules
 import wx
-import datetime
 
-import core
 from .. import mwx
 from .list_ctrl import StatsList
 
@@ -133,56 +131,22 @@ class StatsView(wx.Dialog):
         if self._library is None:
             return
         
-        # load articles
-        query = core.Query("", core.Article.NAME)
-        articles = self._library.search(query)
-        total = len(articles)
+        # get stats
+        stats = self._library.stats()
+        total = stats['total'] or 1
         
         # update authors
-        items = []
-        query = core.Query("", core.Author.NAME)
-        data = self._library.search(query)
-        for item in data:
-            count = self._library.count(item)
-            items.append((item.longname, count, count/total))
-        
+        items = [(name, count, count/total) for dbid, name, count in stats['authors']]
         self._authors_list.SetItems(items)
         
         # update journals
-        items = []
-        query = core.Query("", core.Journal.NAME)
-        data = self._library.search(query)
-        for item in data:
-            count = self._library.count(item)
-            items.append((item.abbreviation, count, count/total))
-        
+        items = [(name, count, count/total) for dbid, name, count in stats['journals']]
         self._journals_list.SetItems(items)
         
         # update labels
-        items = []
-        query = core.Query("", core.Label.NAME)
-        data = self._library.search(query)
-        for item in data:
-            count = self._library.count(item)
-            items.append((item.title, count, count/total))
-        
+        items = [(name, count, count/total) for dbid, name, count in stats['labels']]
         self._labels_list.SetItems(items)
         
         # update years
-        published = {}
-        imported = {}
-        
-        for item in articles:
-            
-            # year published
-            if item.year is not None:
-                year = item.year
-                published[year] = 1 + published.get(year, 0)
-            
-            # year imported
-            if item.imported is not None:
-                year = datetime.datetime.utcfromtimestamp(item.imported).strftime('%Y')
-                imported[year] = 1 + imported.get(year, 0)
-        
-        self._published_list.SetItems([(k, v, v/total) for k,v in published.items()])
-        self._imported_list.SetItems([(k, v, v/total) for k,v in imported.items()])
+        self._published_list.SetItems([(k, v, v/total) for k,v in stats['published']])
+        self._imported_list.SetItems([(k, v, v/total) for k,v in stats['imported']])
@@ -0,0 +1,55 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import os.path
+import sys
+
+import pytest
+
+# make sources importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import core
+from generate import make_library
+
+
+def pytest_addoption(parser):
+    """Adds command line options."""
+    
+    parser.addoption("--run-slow", action="store_true", default=False, help="Run slow benchmarks.")
+
+
+def pytest_configure(config):
+    """Registers custom markers."""
+    
+    config.addinivalue_line("markers", "slow: slow benchmark, runs only with --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skips slow tests unless requested."""
+    
+    # check option
+    if config.getoption("--run-slow"):
+        return
+    
+    # skip slow tests
+    skip = pytest.mark.skip(reason="needs --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def library(tmp_path):
+    """Creates new empty library."""
+    
+    return core.Library(str(tmp_path / "library.papyrus"), new=True)
+
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    """Creates generated library shared by module tests."""
+    
+    path = tmp_path_factory.mktemp("generated") / "library.papyrus"
+    return make_library(str(path), count=600, seed=42)
@@ -0,0 +1,218 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import os.path
+import sys
+import random
+import argparse
+
+# make sources importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import core
+
+
+# define generated values
+JOURNALS = (
+    ("Analytical Chemistry", "Anal Chem"),
+    ("Journal of Proteome Research", "J Proteome Res"),
+    ("Journal of Mass Spectrometry", "J Mass Spectrom"),
+    ("Revue Médicale Suisse", "Rev Méd Suisse"),
+    ("Nature", "Nature"),
+    ("NATURE methods", "Nat Methods"),
+    ("Proteomics", None),
+    ("Bioinformatics", "bioinformatics"))
+
+LASTNAMES = ("Novak", "Novák", "Smith", "Smith-Jones", "O'Brien", "Müller", "Mueller", "Lee", "van Dyke", "Ng", "Strohalm", "Hassman")
+FIRSTNAMES = ("Jan", "Anna", "Martin", "Li", "Eva Marie", "John Paul", None)
+
+LABELS = ("Algorithms", "protein ID", "Čeština", "mass spec", "ms", "Review")
+
+COLLECTIONS = ("Reading", "Thesis", "Empty")
+
+WORDS = ("mass", "spectrometry", "protein", "open", "source", "software", "analysis", "peptide", "identification", "quantitative", "café", "naïve", "tandem", "data")
+
+
+def make_library(path, count=1000, seed=0):
+    """
+    Creates new library filled with random articles. Besides regular items
+    the library contains articles without journal, authors or labels,
+    journals without abbreviation, empty-named journal, author and label
+    rows and articles whose first author was deleted.
+    
+    Args:
+        path: str
+            Path of the library file. Existing file is replaced.
+        
+        count: int
+            Number of articles to be generated.
+        
+        seed: int
+            Random generator seed.
+    
+    Returns:
+        library: core.Library
+            Generated library.
+    """
+    
+    # init random generator
+    rand = random.Random(seed)
+    
+    # init library
+    library = core.Library(path, new=True, delete_old=True)
+    
+    # insert journals
+    journals = []
+    for title, abbreviation in JOURNALS:
+        journal = core.Journal(title=title, abbreviation=abbreviation)
+        library.insert(journal)
+        journals.append(journal)
+    
+    # insert authors
+    authors = []
+    for lastname in LASTNAMES:
+        for firstname in rand.sample(FIRSTNAMES, 3):
+            author = core.Author(lastname=lastname, firstname=firstname)
+            library.insert(author)
+            authors.append(author)
+    
+    # insert labels
+    labels = []
+    for title in LABELS:
+        label = core.Label(title=title)
+        library.insert(label)
+        labels.append(label)
+    
+    # insert empty-named items
+    close_db = library.db.connect()
+    library.query("INSERT INTO journals (title, title_norm, abbreviation, abbreviation_norm) VALUES ('', '', NULL, NULL)")
+    journals.append(core.Journal(dbid=library.db.cursor.lastrowid))
+    library.query("INSERT INTO authors (shortname, shortname_norm, lastname, lastname_norm, firstname, initials) VALUES ('', '', '', '', NULL, NULL)")
+    authors.append(core.Author(dbid=library.db.cursor.lastrowid))
+    library.query("INSERT INTO labels (title, title_norm) VALUES ('', '')")
+    labels.append(core.Label(dbid=library.db.cursor.lastrowid))
+    library.db.connection.commit()
+    if close_db:
+        library.db.close()
+    
+    # make articles
+    articles = []
+    for i in range(count):
+        
+        article = core.Article(
+            doi = "10.1000/%d" % i if rand.random() < 0.8 else None,
+            pmid = str(20000000 + i) if rand.random() < 0.8 else None,
+            year = rand.randint(1990, 2024),
+            volume = str(rand.randint(1, 80)),
+            issue = str(rand.randint(1, 12)),
+            pages = "%d-%d" % (i, i + 10),
+            title = " ".join(rand.choice(WORDS) for x in range(rand.randint(3, 8))).capitalize(),
+            abstract = " ".join(rand.choice(WORDS) for x in range(rand.randint(0, 40))) or None,
+            notes = rand.choice((None, "", "check data", "Mass SPEC")),
+            colour = rand.choice((None, "red", "green")),
+            rating = rand.randint(0, 5))
+        
+        # set journal
+        if rand.random() < 0.85:
+            article.journal = rand.choice(journals)
+        
+        # set authors
+        if rand.random() < 0.85:
+            article.authors = rand.sample(authors, rand.randint(1, 6))
+        
+        # set labels
+        if rand.random() < 0.6:
+            article.labels = rand.sample(labels, rand.randint(1, 3))
+        
+        articles.append(article)
+    
+    # insert articles
+    library.insert_many(articles)
+    
+    # insert collections
+    for title in COLLECTIONS:
+        collection = core.Collection(title=title)
+        library.insert(collection)
+        
+        if title != "Empty":
+            library.collect(rand.sample(articles, count // 5), collection)
+    
+    # trash articles
+    library.trash(rand.sample(articles, count // 20))
+    
+    # delete author leaving articles without first author
+    library.delete(articles[0].authors[0] if articles[0].authors else authors[0])
+    
+    return library
+
+
+def make_articles(count=1000, seed=0):
+    """
+    Creates random articles to be imported. Journals, authors and labels
+    are new instances without DBID, partly using the same names as items of
+    generated library and partly new ones. Labels with non-ASCII capitals
+    are not used, since matching folds ASCII case only and such labels
+    would be inserted again.
+    
+    Args:
+        count: int
+            Number of articles to be generated.
+        
+        seed: int
+            Random generator seed.
+    
+    Returns:
+        articles: list of core.Article
+            Generated articles.
+    """
+    
+    # init random generator
+    rand = random.Random(seed)
+    
+    # make names
+    journals = list(JOURNALS) + [("Imported Journal %d" % i, "Imp J %d" % i) for i in range(20)]
+    lastnames = list(LASTNAMES) + ["Imported%d" % i for i in range(200)]
+    labels = [x for x in LABELS if all(ord(c) < 128 for c in x)] + ["imported %d" % i for i in range(20)]
+    
+    # make articles
+    articles = []
+    for i in range(count):
+        
+        article = core.Article(
+            key = "import-%d" % i,
+            imported = 1600000000 + i,
+            doi = "10.2000/%d" % i,
+            year = rand.randint(1990, 2024),
+            title = " ".join(rand.choice(WORDS) for x in range(rand.randint(3, 8))).capitalize(),
+            abstract = " ".join(rand.choice(WORDS) for x in range(rand.randint(0, 40))) or None)
+        
+        # set journal
+        if rand.random() < 0.85:
+            title, abbreviation = rand.choice(journals)
+            article.journal = core.Journal(title=title, abbreviation=abbreviation)
+        
+        # set authors
+        names = rand.sample(lastnames, rand.randint(0, 6))
+        article.authors = [core.Author(lastname=x, firstname=rand.choice(FIRSTNAMES)) for x in names]
+        
+        # set labels
+        titles = rand.sample(labels, rand.randint(0, 2))
+        article.labels = [core.Label(title=x) for x in titles]
+        
+        articles.append(article)
+    
+    return articles
+
+
+if __name__ == "__main__":
+    
+    # parse arguments
+    parser = argparse.ArgumentParser(description="Creates library filled with random articles.")
+    parser.add_argument("path", help="path of the library file")
+    parser.add_argument("--count", type=int, default=20000, help="number of articles")
+    parser.add_argument("--seed", type=int, default=0, help="random generator seed")
+    args = parser.parse_args()
+    
+    # make library
+    make_library(args.path, args.count, args.seed)
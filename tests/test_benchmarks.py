@@ -0,0 +1,353 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import re
+import shutil
+import time
+
+import pytest
+
+import core
+from core.grammar import Grammar
+from core.query import _GRAMMAR
+from generate import make_library, make_articles
+
+
+# set number of generated and imported articles
+BENCHMARK_SIZE = 20000
+IMPORT_SIZE = 1000
+
+# set number of repeated searches and tolerated noise of unchanged plans
+REPEAT = 10
+NOISE = 1.25
+
+# set indexes of article links and lookup columns
+INDEXES = (
+    'articles_doi',
+    'articles_pmid',
+    'articles_journal',
+    'articles_imported',
+    'articles_authors_article',
+    'articles_authors_author',
+    'articles_labels_article',
+    'articles_labels_label',
+    'articles_collections_article',
+    'articles_collections_collection')
+
+
+class SlicingGrammar(Grammar):
+    """Grammar parsing text remainders without memo as before."""
+    
+    
+    def parse(self, rule, text):
+        """Parses given text into an expression tree."""
+        
+        parsed = []
+        
+        while text:
+            
+            result = self._parse(rule, text)
+            if result is None:
+                return None
+            
+            parsed.append(result[0])
+            text = result[1]
+        
+        return parsed
+    
+    
+    def _parse(self, rule, text):
+        """Parses text using given rule."""
+        
+        # match rule to text
+        if rule in self._rules:
+            
+            for alt in self._rules[rule]:
+                tree = []
+                remainder = text
+                
+                for elm in alt:
+                    result = self._parse(elm, remainder)
+                    if result is None:
+                        tree = None
+                        break
+                    
+                    tree.append(result[0])
+                    remainder = result[1]
+                
+                if tree is not None:
+                    return [rule]+tree, remainder
+            
+            return None
+        
+        # match pattern to text
+        match = re.match(self._rules["whitespace"] + "(%s)" % rule, text)
+        if not match:
+            return None
+        
+        return match.group(1), text[match.end():]
+
+
+def measure(func, *args, **kwargs):
+    """Calls given function and returns its result and elapsed time."""
+    
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    
+    return result, time.perf_counter() - start
+
+
+def measure_min(func, *args, **kwargs):
+    """Calls given function repeatedly and returns its result and shortest time."""
+    
+    times = []
+    for i in range(REPEAT):
+        result, elapsed = measure(func, *args, **kwargs)
+        times.append(elapsed)
+    
+    return result, min(times)
+
+
+def report(label, before, after, unit="s"):
+    """Prints compared times."""
+    
+    print("%-45s %9.4f %s -> %9.4f %s" % (label, before, unit, after, unit))
+
+
+@pytest.fixture(scope="module")
+def benchmark_library(tmp_path_factory):
+    """Creates generated library shared by benchmarks."""
+    
+    path = tmp_path_factory.mktemp("benchmark") / "library.papyrus"
+    return make_library(str(path), count=BENCHMARK_SIZE, seed=0)
+
+
+@pytest.mark.slow
+def test_indexes(benchmark_library, tmp_path):
+    """Compares searches with and without indexes of links and lookup columns."""
+    
+    # copy library without indexes
+    path = str(tmp_path / "plain.papyrus")
+    shutil.copy(benchmark_library.db_path, path)
+    plain = core.Library(path)
+    
+    plain.db.connect()
+    for name in INDEXES:
+        plain.query("DROP INDEX %s" % name)
+    plain.query("ANALYZE")
+    plain.db.connection.commit()
+    plain.db.close()
+    
+    # get searched IDs
+    author = benchmark_library.query("SELECT author FROM articles_authors GROUP BY author ORDER BY COUNT(*) DESC LIMIT 1")[0][0]
+    label = benchmark_library.query("SELECT label FROM articles_labels GROUP BY label ORDER BY COUNT(*) DESC LIMIT 1")[0][0]
+    
+    # set queries and whether indexes must make them faster
+    queries = (
+        ("0[TRASH]", False),
+        ("%d[AUID]" % author, True),
+        ("%d[LABELID]" % label, False),
+        ("novak[AU]", False),
+        ("20000005[PMID]", True),
+        ("1[COLLECTIONID]", False))
+    
+    # keep connections
+    plain.db.connect()
+    benchmark_library.db.connect()
+    
+    # compare searches
+    for text, faster in queries:
+        query = core.Query(text, core.Article.NAME)
+        sql, values = query.select(columns=('id',))
+        
+        before, before_time = measure_min(plain.query, sql, values)
+        after, after_time = measure_min(benchmark_library.query, sql, values)
+        
+        assert [x['id'] for x in before] == [x['id'] for x in after]
+        
+        report("%s (scans %s -> %s)" % (text, query.explain(plain)['scans'], query.explain(benchmark_library)['scans']), before_time, after_time)
+        
+        # check search is not slower
+        if faster:
+            assert after_time < before_time, text
+        else:
+            assert after_time < NOISE * before_time, text
+    
+    # compare links lookup by article
+    ids = [x['id'] for x in benchmark_library.query("SELECT id FROM articles ORDER BY id LIMIT 2000")]
+    sql = "SELECT author FROM articles_authors WHERE article = ? ORDER BY priority"
+    
+    before_time = sum(measure(plain.query, sql, [x])[1] for x in ids)
+    after_time = sum(measure(benchmark_library.query, sql, [x])[1] for x in ids)
+    
+    report("authors of %d articles one by one" % len(ids), before_time, after_time)
+    
+    # close connections
+    plain.db.close()
+    benchmark_library.db.close()
+    
+    assert after_time < before_time
+
+
+def get_article(library, dbid):
+    """Gets article with relations by one query per relation as before."""
+    
+    # get article
+    data = library.query("SELECT * FROM articles WHERE id = ?", [dbid])[0]
+    article = core.Article.from_db(data)
+    
+    # get journal
+    rows = library.query("SELECT * FROM journals WHERE id = ?", [data['journal']])
+    article.journal = core.Journal.from_db(rows[0]) if rows else None
+    
+    # get authors
+    rows = library.query("""SELECT * FROM articles_authors
+        LEFT JOIN authors ON articles_authors.author = authors.id
+        WHERE articles_authors.article = ?
+        ORDER BY articles_authors.priority""", [dbid])
+    article.authors = [core.Author.from_db(x) for x in rows]
+    
+    # get labels
+    rows = library.query("""SELECT * FROM articles_labels
+        LEFT JOIN labels ON articles_labels.label = labels.id
+        WHERE articles_labels.article = ?
+        ORDER BY labels.title""", [dbid])
+    article.labels = [core.Label.from_db(x) for x in rows]
+    
+    # get collections
+    rows = library.query("""SELECT * FROM articles_collections
+        LEFT JOIN collections ON articles_collections.collection = collections.id
+        WHERE articles_collections.article = ?
+        ORDER BY collections.title""", [dbid])
+    article.collections = [core.Collection.from_db(x) for x in rows]
+    
+    return article
+
+
+def get_values(article):
+    """Gets comparable values of article and its relations."""
+    
+    journal = article.journal
+    return (
+        article.dbid, article.key, article.title, article.abstract, article.rating, article.deleted,
+        (journal.dbid, journal.title, journal.abbreviation) if journal else None,
+        tuple((x.dbid, x.lastname, x.firstname, x.initials) for x in article.authors),
+        tuple((x.dbid, x.title) for x in article.labels),
+        tuple((x.dbid, x.title) for x in article.collections))
+
+
+@pytest.mark.slow
+def test_hydration(benchmark_library):
+    """Compares set-based loading of searched articles with loading one by one."""
+    
+    query = core.Query("", core.Article.NAME)
+    
+    # keep connection
+    benchmark_library.db.connect()
+    
+    for count in (1000, 10000, BENCHMARK_SIZE):
+        
+        # load set-based
+        benchmark_library.clear_cache()
+        after, after_time = measure(benchmark_library.search, query, order_by='id', limit=count)
+        
+        # load one by one
+        ids = [x['id'] for x in benchmark_library.query("SELECT id FROM articles ORDER BY id LIMIT ?", [count])]
+        before, before_time = measure(lambda: [get_article(benchmark_library, x) for x in ids])
+        
+        assert [get_values(x) for x in before] == [get_values(x) for x in after]
+        
+        report("%d articles" % count, before_time, after_time)
+        assert after_time < before_time
+    
+    # close connection
+    benchmark_library.db.close()
+
+
+def make_nested(count):
+    """Makes query of nested groups with NOT and tags."""
+    
+    text = "x[TI]"
+    for i in range(count):
+        text = "(%s OR NOT y%d[AU])" % (text, i)
+    
+    return text
+
+
+@pytest.mark.slow
+def test_grammar():
+    """Compares memoized query parsing with parsing without memo."""
+    
+    # init grammars
+    rules = {k: " | ".join(" ".join(x) for x in v) for k, v in _GRAMMAR._rules.items() if k != 'whitespace'}
+    reference = SlicingGrammar(rules, whitespace=_GRAMMAR._rules['whitespace'])
+    
+    queries = (
+        ("6 nested groups with NOT and tags", make_nested(6), 50),
+        ("10 nested groups", make_nested(10), 50),
+        ("40 OR'ed 'x[AU] AND NOT y' clauses", " OR ".join("x%d[AU] AND NOT y%d" % (i, i) for i in range(40)), 20),
+        ("12 nested 'NOT (' groups", "NOT (" * 12 + "x" + ")" * 12, 3),
+        ("typical three-term query", 'strohalm[AU] "open source"[TI] 2010[PY]', 500))
+    
+    total_before = 0
+    total_after = 0
+    
+    for label, text, repeat in queries:
+        
+        # parse without memo
+        before, before_time = measure(lambda: [reference.parse('expr', text) for i in range(repeat)])
+        
+        # parse with memo
+        after, after_time = measure(lambda: [_GRAMMAR.parse('expr', text) for i in range(repeat)])
+        
+        assert before[0] is not None
+        assert before[0] == after[0]
+        
+        report("%s (per parse)" % label, 1000 * before_time / repeat, 1000 * after_time / repeat, "ms")
+        total_before += before_time / repeat
+        total_after += after_time / repeat
+    
+    assert total_after < total_before
+
+
+def get_rows(library):
+    """Gets rows of all tables changed by import."""
+    
+    tables = (
+        ("articles", "id"),
+        ("journals", "id"),
+        ("authors", "id"),
+        ("labels", "id"),
+        ("articles_authors", "article, priority"),
+        ("articles_labels", "article, label"))
+    
+    return {x: [tuple(r) for r in library.query("SELECT * FROM %s ORDER BY %s" % (x, o))] for x, o in tables}
+
+
+@pytest.mark.slow
+def test_insert_many(benchmark_library, tmp_path):
+    """Compares bulk import of articles with inserting them one by one."""
+    
+    # copy library
+    paths = []
+    for name in ("single.papyrus", "bulk.papyrus"):
+        paths.append(str(tmp_path / name))
+        shutil.copy(benchmark_library.db_path, paths[-1])
+    
+    single = core.Library(paths[0])
+    bulk = core.Library(paths[1])
+    
+    # insert one by one
+    articles = make_articles(IMPORT_SIZE, seed=1)
+    before, before_time = measure(lambda: [single.insert(x) for x in articles])
+    
+    # insert in bulk
+    articles = make_articles(IMPORT_SIZE, seed=1)
+    failures, after_time = measure(bulk.insert_many, articles)
+    
+    assert failures == []
+    assert get_rows(single) == get_rows(bulk)
+    
+    report("%d articles" % IMPORT_SIZE, before_time, after_time)
+    assert after_time < before_time
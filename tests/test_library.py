@@ -0,0 +1,74 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import core
+
+
+def get_count(library, table):
+    """Gets number of rows in table."""
+    
+    return library.query("SELECT COUNT(*) FROM %s" % table)[0][0]
+
+
+def test_insert_many(library):
+    """Tests that articles are inserted with new and matched related items."""
+    
+    journal = core.Journal(title="Analytical Chemistry", abbreviation="Anal Chem")
+    author = core.Author(lastname="Strohalm", firstname="Martin")
+    
+    articles = [
+        core.Article(title="First", journal=journal, authors=[author], labels=[core.Label(title="ms")]),
+        core.Article(title="Second", journal=core.Journal(abbreviation="ANAL CHEM"), authors=[core.Author(lastname="strohalm", initials="M")]),
+        core.Article(title="Third")]
+    
+    assert library.insert_many(articles) == []
+    
+    assert all(x.dbid for x in articles)
+    assert articles[1].journal.dbid == journal.dbid
+    assert articles[1].authors[0].dbid == author.dbid
+    assert get_count(library, "journals") == 1
+    assert get_count(library, "authors") == 1
+    assert get_count(library, "labels") == 1
+
+
+def test_insert_many_failed(library):
+    """Tests that failed articles leave no new related items behind."""
+    
+    # reject articles by title
+    library.db.connect()
+    library.query("CREATE TRIGGER reject BEFORE INSERT ON articles WHEN NEW.title = 'Rejected' BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    library.db.connection.commit()
+    library.db.close()
+    
+    shared = core.Journal(title="Shared Journal", abbreviation="Shared J")
+    
+    articles = [
+        core.Article(title="Inserted", journal=core.Journal(title="Kept Journal", abbreviation="Kept J"), authors=[core.Author(lastname="Kept")]),
+        core.Article(title="Rejected", journal=shared, authors=[core.Author(lastname="Orphan")], labels=[core.Label(title="orphan")]),
+        core.Article(title="Broken", journal=core.Journal(title="Broken Journal", abbreviation="Broken J"), authors=[core.Author(lastname="Broken")], labels=[core.Label()]),
+        core.Article(title="Shared", journal=shared)]
+    
+    failures = library.insert_many(articles)
+    
+    # check failures
+    assert [x[0] for x in failures] == articles[1:3]
+    assert articles[0].dbid and articles[3].dbid
+    
+    # check related items
+    titles = set(x['title'] for x in library.query("SELECT title FROM journals"))
+    assert titles == {"Kept Journal", "Shared Journal"}
+    
+    lastnames = set(x['lastname'] for x in library.query("SELECT lastname FROM authors"))
+    assert lastnames == {"Kept"}
+    
+    assert get_count(library, "labels") == 0
+    assert articles[1].authors[0].dbid is None
+    assert articles[3].journal.dbid == library.query("SELECT id FROM journals WHERE title = 'Shared Journal'")[0][0]
+    
+    # check matching of discarded items
+    article = core.Article(title="Again", journal=core.Journal(title="Broken Journal", abbreviation="Broken J"), authors=[core.Author(lastname="Orphan")])
+    assert library.insert_many([article]) == []
+    
+    assert get_count(library, "journals") == 3
+    assert get_count(library, "authors") == 2
@@ -0,0 +1,172 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import re
+
+import core
+
+
+# set maximum number of probed values per tag
+MAX_VALUES = 12
+
+
+def get_word(text):
+    """Gets first word of given text usable within query."""
+    
+    if not text:
+        return None
+    
+    match = re.search(r'[\w\-\.\/]+', text)
+    return match.group(0) if match else None
+
+
+def get_candidates(article):
+    """Gets candidate values of all tags using article content."""
+    
+    journal = article.journal
+    authors = article.authors
+    labels = article.labels
+    
+    names = [x.lastname for x in authors] + [x.shortname for x in authors]
+    
+    return (
+        ('[ID]', [article.dbid]),
+        ('[KEY]', [article.key]),
+        ('[PMID]', [article.pmid, "NULL"]),
+        ('[DOI]', [article.doi, get_word(article.doi)]),
+        ('[PY]', [article.year]),
+        ('[TI]', [get_word(article.title), article.title]),
+        ('[AB]', [get_word(article.abstract)]),
+        ('[NOTE]', [article.notes, get_word(article.notes)]),
+        ('[COLOUR]', [article.colour]),
+        ('[PDF]', ["0", "1"]),
+        ('[RATING]', [article.rating]),
+        ('[RBE]', [article.rating]),
+        ('[RAE]', [article.rating]),
+        ('[TRASH]', ["0", "1"]),
+        ('[RECENT]', ["1", "30"]),
+        ('[JT]', [journal.title, get_word(journal.title)] if journal else []),
+        ('[JA]', [journal.abbreviation, get_word(journal.abbreviation)] if journal else []),
+        ('[AU]', names),
+        ('[FAU]', names),
+        ('[LAU]', names),
+        ('[AUID]', [x.dbid for x in authors]),
+        ('[LB]', [x.title for x in labels]),
+        ('[LABELID]', [x.dbid for x in labels]),
+        ('[COLLECTIONID]', [x.dbid for x in article.collections]),
+        (None, [get_word(article.title), get_word(article.abstract), article.doi, article.pmid]))
+
+
+def get_probes(articles):
+    """Gets several distinct values of every tag using articles content."""
+    
+    probes = {}
+    
+    for article in articles:
+        for tag, values in get_candidates(article):
+            
+            used = probes.setdefault(tag, [])
+            
+            for value in values:
+                value = str(value) if value is not None else None
+                if value and value not in used and len(used) < MAX_VALUES:
+                    used.append(value)
+    
+    return probes
+
+
+def make_text(value, tag):
+    """Makes query text of value and tag."""
+    
+    value = '"%s"' % value if re.search(r'[\s"()]', value) else value
+    return value + (tag or "")
+
+
+def get_sql(library, text):
+    """Gets IDs of articles matching query by SQL."""
+    
+    sql, values = core.Query(text, core.Article.NAME).select(columns=('id',))
+    return set(x['id'] for x in library.query(sql, values)) if sql else set()
+
+
+def get_memory(articles, text):
+    """Gets IDs of articles matching query in memory."""
+    
+    query = core.Query(text, core.Article.NAME)
+    return set(x.dbid for x in articles if query.matches(x))
+
+
+def test_matches(generated):
+    """Tests that in-memory matching agrees with SQL for several values of every tag."""
+    
+    articles = generated.search(core.Query("", core.Article.NAME))
+    probes = get_probes(articles)
+    
+    for tag, values in probes.items():
+        
+        assert len(values) > 1, tag
+        
+        for value in values:
+            for text in (make_text(value, tag), "NOT %s" % make_text(value, tag)):
+                assert get_memory(articles, text) == get_sql(generated, text), text
+
+
+def test_refines(generated):
+    """Tests that refined queries filter previous results as SQL does."""
+    
+    articles = generated.search(core.Query("", core.Article.NAME))
+    probes = get_probes(articles)
+    refined = 0
+    
+    for tag, values in probes.items():
+        for value in values:
+            for other in values:
+                
+                text = make_text(value, tag)
+                previous = make_text(other, tag)
+                
+                # check refinement
+                query = core.Query(text, core.Article.NAME)
+                if not query.refines(core.Query(previous, core.Article.NAME)):
+                    continue
+                
+                refined += 1
+                
+                # filter previous results
+                ids = get_sql(generated, previous)
+                filtered = set(x.dbid for x in articles if x.dbid in ids and query.matches(x))
+                
+                assert filtered == get_sql(generated, text), (text, previous)
+                
+                # filter conjunction
+                text = "%s AND 1[RAE]" % text
+                filtered = set(x.dbid for x in articles if x.dbid in ids and core.Query(text, core.Article.NAME).matches(x))
+                
+                assert filtered == get_sql(generated, text), (text, previous)
+    
+    assert refined > len(probes)
+
+
+def test_first_author_deleted(library):
+    """Tests that first author is not replaced by the second one after deletion."""
+    
+    # insert article
+    first = core.Author(lastname="First", firstname="Anna")
+    second = core.Author(lastname="Second", firstname="Bob")
+    article = core.Article(title="Article", authors=[first, second])
+    library.insert(article)
+    
+    assert get_sql(library, "second[FAU]") == set()
+    
+    # delete first author
+    library.delete(first)
+    
+    articles = library.search(core.Query("", core.Article.NAME))
+    
+    assert [x.lastname for x in articles[0].authors] == ["Second"]
+    assert articles[0].first_author is None
+    
+    for text in ("second[FAU]", "second[LAU]", "second[AU]"):
+        assert get_memory(articles, text) == get_sql(library, text), text
+
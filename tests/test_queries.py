@@ -0,0 +1,195 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import core
+import core.queries
+
+
+# define previous correlated COUNT conditions of relational tags
+OLD_QUERIES = {
+    
+    '[JT]': ("""((
+        SELECT COUNT(*) FROM journals
+        WHERE articles.journal = journals.id
+        AND journals.title_norm LIKE ?) != 0)""", 'norm_like'),
+    
+    '[JA]': ("""((
+        SELECT COUNT(*) FROM journals
+        WHERE articles.journal = journals.id
+        AND journals.abbreviation_norm LIKE ?) != 0)""", 'norm_like'),
+    
+    '[AU]': ("""((
+        SELECT COUNT(*) FROM articles_authors
+        LEFT JOIN authors ON articles_authors.author = authors.id
+        WHERE articles_authors.article = articles.id
+        AND authors.shortname_norm LIKE ?) != 0)""", 'norm_like'),
+    
+    '[AUID]': ("""((
+        SELECT COUNT(*) FROM articles_authors
+        WHERE articles_authors.article = articles.id
+        AND articles_authors.author = ?) != 0)""", 'raw'),
+    
+    '[FAU]': ("""((
+        SELECT COUNT(*) FROM articles_authors
+        LEFT JOIN authors ON articles_authors.author = authors.id
+        WHERE articles_authors.article = articles.id
+        AND articles_authors.priority = 0
+        AND authors.shortname_norm LIKE ?) != 0)""", 'norm_like'),
+    
+    '[LAU]': ("""((
+        SELECT COUNT(*) FROM (
+            SELECT *
+            FROM articles_authors
+            LEFT JOIN authors ON articles_authors.author = authors.id
+            WHERE articles_authors.article = articles.id
+            AND authors.shortname_norm LIKE ?
+            AND articles_authors.priority = (
+                SELECT MAX(t1.priority) FROM articles_authors t1
+                WHERE t1.article = articles.id)
+            )) != 0)""", 'norm_like'),
+    
+    '[LB]': ("""((
+        SELECT COUNT(*) FROM articles_labels
+        LEFT JOIN labels ON articles_labels.label = labels.id
+        WHERE articles_labels.article = articles.id
+        AND labels.title_norm = ?) != 0)""", 'norm'),
+    
+    '[LABELID]': ("""((
+        SELECT COUNT(*) FROM articles_labels
+        WHERE articles_labels.article = articles.id
+        AND articles_labels.label = ?) != 0)""", 'raw'),
+    
+    '[COLLECTIONID]': ("""((
+        SELECT COUNT(*) FROM articles_collections
+        WHERE articles_collections.article = articles.id
+        AND articles_collections.collection = ?) != 0)""", 'raw')}
+
+# define previous untagged condition without full-text index
+OLD_UNTAGGED = """(
+    articles.key = ?
+    OR articles.pmid = ?
+    OR LOWER(articles.doi) = ?
+    OR articles.title_norm LIKE ?
+    OR LOWER(articles.abstract) LIKE ?
+    OR LOWER(articles.notes) LIKE ?
+    
+    OR (
+        SELECT COUNT(*) FROM journals
+        WHERE journals.id = articles.journal
+        AND (journals.title_norm LIKE ?
+            OR journals.abbreviation_norm LIKE ?)) != 0
+    
+    OR (
+        SELECT COUNT(*) FROM articles_authors
+        LEFT JOIN authors ON articles_authors.author = authors.id
+        WHERE articles_authors.article = articles.id
+        AND authors.shortname_norm LIKE ?) != 0
+    
+    OR (
+        SELECT COUNT(*) FROM articles_labels
+        LEFT JOIN labels ON articles_labels.label = labels.id
+        WHERE articles_labels.article = articles.id
+        AND labels.title_norm LIKE ?) != 0
+    )"""
+
+# define searched names
+NAMES = {
+    '[JT]': ("", "nature", "NATURE", "journal of", "médicale", "medicale", "zzz"),
+    '[JA]': ("", "nat", "Anal Chem", "méd", "med", "bioinformatics", "zzz"),
+    '[AU]': ("", "novak", "Novák J", "NOVAK a", "smith", "smith-jones", "o'brien", "muller", "müller", "van dyke", "zzz"),
+    '[FAU]': ("", "novak", "Novák J", "smith", "o'brien", "muller", "zzz"),
+    '[LAU]': ("", "novak", "Novák J", "smith", "o'brien", "muller", "zzz"),
+    '[LB]': ("", "ms", "MS", "mass spec", "mass", "Čeština", "cestina", "protein id", "zzz")}
+
+UNTAGGED = ("", "mass", "Mass SPEC", "novak", "nat", "cestina", "café", "cafe", "10.1000/1", "20000001", "zzz")
+
+
+def get_ids(library, sql, values):
+    """Gets IDs of articles matching given conditions."""
+    
+    rows = library.query("SELECT id FROM articles WHERE %s" % sql, values)
+    return set(x['id'] for x in rows)
+
+
+def get_old_value(value, kind):
+    """Makes value of previous condition."""
+    
+    if kind == 'norm_like':
+        return "%%%s%%" % core.normalize_text(value)
+    
+    if kind == 'norm':
+        return core.normalize_text(value)
+    
+    return value
+
+
+def get_values(library):
+    """Gets searched values for all relational tags."""
+    
+    values = [(tag, x) for tag, names in NAMES.items() for x in names]
+    
+    # add existing IDs
+    for tag, table in (('[AUID]', 'authors'), ('[LABELID]', 'labels'), ('[COLLECTIONID]', 'collections')):
+        rows = library.query("SELECT id FROM %s" % table)
+        values += [(tag, str(x['id'])) for x in rows]
+        values.append((tag, "999999"))
+    
+    return values
+
+
+def test_generated_rows(generated):
+    """Tests that generated library contains empty and NULL rows."""
+    
+    assert get_ids(generated, "articles.journal IS NULL", [])
+    assert get_ids(generated, "articles.id NOT IN (SELECT article FROM articles_authors)", [])
+    assert get_ids(generated, "articles.id NOT IN (SELECT article FROM articles_labels)", [])
+    assert get_ids(generated, "articles.journal IN (SELECT id FROM journals WHERE abbreviation IS NULL)", [])
+    assert get_ids(generated, "articles.journal IN (SELECT id FROM journals WHERE title = '')", [])
+    assert get_ids(generated, "articles.id IN (SELECT article FROM articles_authors JOIN authors ON author = authors.id WHERE shortname = '')", [])
+    assert get_ids(generated, "articles.id IN (SELECT article FROM articles_labels JOIN labels ON label = labels.id WHERE title = '')", [])
+
+
+def test_relational(generated):
+    """Tests that relational tags match the same articles as previous conditions."""
+    
+    for tag, value in get_values(generated):
+        
+        # make conditions
+        old_sql, kind = OLD_QUERIES[tag]
+        old_values = [get_old_value(value, kind)]
+        sqls, values = core.make_articles_query(value, tag)
+        sql = " ".join(sqls)
+        
+        # check matches
+        expected = get_ids(generated, old_sql, old_values)
+        assert get_ids(generated, sql, values) == expected, (tag, value)
+        
+        # check negation
+        expected = get_ids(generated, "NOT %s" % old_sql, old_values)
+        assert get_ids(generated, "NOT (%s)" % sql, values) == expected, ("NOT", tag, value)
+
+
+def test_untagged(generated, monkeypatch):
+    """Tests that untagged terms without full-text index match the same articles as previous condition."""
+    
+    monkeypatch.setattr(core.queries, 'FTS5', False)
+    
+    for value in UNTAGGED:
+        
+        # make conditions
+        value_lower = value.lower()
+        value_like = "%%%s%%" % value_lower
+        value_norm_like = "%%%s%%" % core.normalize_text(value)
+        old_values = [value, value, value_lower, value_norm_like, value_like, value_like] + [value_norm_like] * 4
+        sqls, values = core.make_articles_query(value)
+        sql = " ".join(sqls)
+        
+        # check matches
+        expected = get_ids(generated, OLD_UNTAGGED, old_values)
+        assert get_ids(generated, sql, values) == expected, value
+        
+        # check negation
+        expected = get_ids(generated, "NOT %s" % OLD_UNTAGGED, old_values)
+        assert get_ids(generated, "NOT (%s)" % sql, values) == expected, ("NOT", value)
+
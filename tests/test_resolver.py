@@ -0,0 +1,342 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import pytest
+
+import core
+from generate import make_library
+
+
+# define additional duplicate and wildcard rows
+JOURNALS = (
+    ("Analytical chemistry", "ANAL CHEM"),
+    ("Empty Abbreviation", ""),
+    ("Nature", "Nature Alt"),
+    ("", "Rev MÉD Suisse"))
+
+AUTHORS = (
+    (None, "Novak", None),
+    ("jan", "NOVAK", "j"),
+    ("", "Smith", ""),
+    ("Anna", "", "A"),
+    ("Jiří", "Šťastný", "J"),
+    ("JIŘÍ", "ŠŤASTNÝ", "J"),
+    ("Ann", "Unique", "A"))
+
+LABELS = ("MS", "ČEŠTINA", "protein id")
+
+
+def get_state(item):
+    """Gets matched DBID and attributes of item."""
+    
+    if isinstance(item, core.Journal):
+        return item.dbid, item.title, item.abbreviation
+    
+    if isinstance(item, core.Author):
+        return item.dbid, item.firstname, item.lastname, item.initials
+    
+    return item.dbid, item.title
+
+
+def match_sql(library, item):
+    """Matches item by previous SQL conditions taking the lowest ID."""
+    
+    # init conditions
+    conditions = []
+    values = []
+    
+    # make journal conditions
+    if isinstance(item, core.Journal):
+        names = ('abbreviation',) if item.abbreviation else ('title',) if item.title else ()
+        table = 'journals'
+    
+    # make author conditions
+    elif isinstance(item, core.Author):
+        names = [x for x in ('firstname', 'lastname', 'initials') if getattr(item, x)]
+        table = 'authors'
+    
+    # make label conditions
+    else:
+        conditions.append("LOWER(title) = ?")
+        values.append(item.title.lower())
+        names = ()
+        table = 'labels'
+    
+    for name in names:
+        conditions.append("(LOWER({0}) = ? OR {0} = '' OR {0} IS NULL)".format(name))
+        values.append(getattr(item, name).lower())
+    
+    # check conditions
+    if not conditions:
+        return
+    
+    # get matching item
+    rows = library.query("SELECT * FROM %s WHERE %s ORDER BY id LIMIT 1" % (table, " AND ".join(conditions)), values)
+    if not rows:
+        return
+    
+    # update attributes
+    item.dbid = rows[0]['id']
+    
+    if table == 'labels':
+        item.title = rows[0]['title']
+        return
+    
+    for name in ('title', 'abbreviation') if table == 'journals' else ('firstname', 'lastname', 'initials'):
+        if rows[0][name]:
+            setattr(item, name, rows[0][name])
+
+
+def match_library(library, item):
+    """Matches item by library session cache."""
+    
+    close_db = library.db.connect()
+    getattr(library, "_match_%s" % item.NAME[:-1])(item)
+    if close_db:
+        library.db.close()
+
+
+def get_probes(library):
+    """Makes probes of stored values and their case variants."""
+    
+    probes = []
+    
+    # make journals
+    rows = library.query("SELECT title, abbreviation FROM journals")
+    for row in rows:
+        for title, abbreviation in ((row['title'], row['abbreviation']), (None, row['abbreviation']), (row['title'], None)):
+            for change in (str, str.upper, str.lower, str.swapcase):
+                probes.append((core.Journal, dict(
+                    title = change(title) if title else None,
+                    abbreviation = change(abbreviation) if abbreviation else None)))
+    
+    probes += [
+        (core.Journal, dict(title="Unknown")),
+        (core.Journal, dict(abbreviation="Unknown")),
+        (core.Journal, dict())]
+    
+    # make authors
+    rows = library.query("SELECT firstname, lastname, initials FROM authors")
+    for row in rows:
+        names = (row['firstname'], row['lastname'], row['initials'])
+        for mask in ((1, 1, 1), (0, 1, 1), (0, 1, 0), (1, 0, 0), (0, 0, 1), (1, 1, 0)):
+            for change in (str, str.upper, str.lower):
+                values = [change(x) if x and m else None for x, m in zip(names, mask)]
+                probes.append((core.Author, dict(zip(('firstname', 'lastname', 'initials'), values))))
+    
+    probes += [
+        (core.Author, dict(lastname="Unknown")),
+        (core.Author, dict(firstname="Unknown", lastname="Novak")),
+        (core.Author, dict())]
+    
+    # make labels
+    rows = library.query("SELECT title FROM labels WHERE title != ''")
+    for row in rows:
+        for change in (str, str.upper, str.lower, str.swapcase):
+            probes.append((core.Label, dict(title=change(row['title']))))
+    
+    probes.append((core.Label, dict(title="Unknown")))
+    
+    # remove duplicates
+    unique = {(cls, tuple(sorted(attrs.items()))): attrs for cls, attrs in probes}
+    
+    return [(key[0], attrs) for key, attrs in unique.items()]
+
+
+def check_matches(library):
+    """Checks that session cache matches all probes as previous SQL did."""
+    
+    close_db = library.db.connect()
+    
+    for cls, attrs in get_probes(library):
+        
+        # match by SQL
+        expected = cls(**attrs)
+        match_sql(library, expected)
+        
+        # match by cache
+        matched = cls(**attrs)
+        match_library(library, matched)
+        
+        assert get_state(matched) == get_state(expected), (cls.__name__, attrs)
+    
+    if close_db:
+        library.db.close()
+
+
+def insert_rows(library):
+    """Inserts duplicate, case variant and wildcard rows directly."""
+    
+    close_db = library.db.connect()
+    
+    for title, abbreviation in JOURNALS:
+        library.query("INSERT INTO journals (title, title_norm, abbreviation, abbreviation_norm) VALUES (?,?,?,?)",
+            [title, core.normalize_text(title), abbreviation, core.normalize_text(abbreviation)])
+    
+    for firstname, lastname, initials in AUTHORS:
+        shortname = "%s %s" % (lastname, initials) if initials else lastname
+        library.query("INSERT INTO authors (shortname, shortname_norm, lastname, lastname_norm, firstname, initials) VALUES (?,?,?,?,?,?)",
+            [shortname, core.normalize_text(shortname), lastname, core.normalize_text(lastname), firstname, initials])
+    
+    for title in LABELS:
+        library.query("INSERT INTO labels (title, title_norm) VALUES (?,?)", [title, core.normalize_text(title)])
+    
+    library.db.connection.commit()
+    
+    if close_db:
+        library.db.close()
+
+
+@pytest.fixture(params=[True, False], ids=["wildcards", "exact"])
+def resolved(request, tmp_path):
+    """Creates generated library with duplicate rows and loaded session cache."""
+    
+    library = make_library(str(tmp_path / "library.papyrus"), count=100, seed=1)
+    insert_rows(library)
+    
+    # load cache
+    check_matches(library)
+    
+    # remove wildcard items so that new items can be matched
+    if not request.param:
+        
+        for journal in get_items(library, core.Journal, "SELECT id FROM journals WHERE abbreviation IS NULL OR abbreviation = '' OR title = ''"):
+            library.delete(journal)
+        
+        for author in get_items(library, core.Author, "SELECT id FROM authors WHERE lastname = ''"):
+            library.delete(author)
+    
+    return library
+
+
+def get_items(library, cls, sql):
+    """Gets stored items selected by SQL query."""
+    
+    ids = [x['id'] for x in library.query(sql)]
+    items = {x.dbid: x for x in library.search(core.Query("", cls.NAME))}
+    
+    return [items[x] for x in ids]
+
+
+def test_initial(resolved):
+    """Tests matching of case variants, wildcards and duplicates."""
+    
+    # check duplicates are present
+    rows = resolved.query("SELECT LOWER(abbreviation) AS abbr, COUNT(*) AS count FROM journals GROUP BY abbr HAVING count > 1")
+    assert rows
+    
+    rows = resolved.query("SELECT id FROM authors WHERE firstname IS NULL OR firstname = ''")
+    assert rows
+    
+    check_matches(resolved)
+
+
+def test_insert(resolved):
+    """Tests matching after inserting items."""
+    
+    resolved.insert(core.Journal(title="Inserted Journal"))
+    resolved.insert(core.Journal(title="Anal Chem Copy", abbreviation="anal chem"))
+    resolved.insert(core.Journal(title="Fresh Journal", abbreviation="Fresh J"))
+    resolved.insert(core.Author(lastname="Newman", firstname="Ann"))
+    resolved.insert(core.Author(lastname="novak", firstname="Eva"))
+    resolved.insert(core.Author(lastname="UNIQUE", firstname="Bob"))
+    resolved.insert(core.Label(title="Inserted"))
+    
+    check_matches(resolved)
+    
+    # insert new items with articles
+    article = core.Article(
+        title = "Inserted article",
+        journal = core.Journal(title="Batch Journal", abbreviation="Batch J"),
+        authors = [core.Author(lastname="Batchman", firstname="Bob"), core.Author(lastname="Novak", firstname="Jan")],
+        labels = [core.Label(title="Batch")])
+    
+    resolved.insert_many([article])
+    
+    assert article.authors[1].dbid is not None
+    check_matches(resolved)
+
+
+def test_update(resolved):
+    """Tests matching after updating items."""
+    
+    journal = get_items(resolved, core.Journal, "SELECT id FROM journals WHERE abbreviation = 'Anal Chem'")[0]
+    journal.abbreviation = "Changed Abbreviation"
+    resolved.update(journal)
+    
+    author = get_items(resolved, core.Author, "SELECT id FROM authors WHERE lastname = 'Novak' ORDER BY id")[0]
+    author.lastname = "Changed"
+    resolved.update(author)
+    
+    label = get_items(resolved, core.Label, "SELECT id FROM labels WHERE title = 'ms'")[0]
+    label.title = "Changed"
+    resolved.update(label)
+    
+    check_matches(resolved)
+
+
+def test_merge(resolved):
+    """Tests matching after merging items."""
+    
+    journals = get_items(resolved, core.Journal, "SELECT id FROM journals WHERE LOWER(abbreviation) = 'anal chem' ORDER BY id")
+    resolved.merge(journals[-1], journals[:-1])
+    
+    authors = get_items(resolved, core.Author, "SELECT id FROM authors WHERE LOWER(lastname) = 'novak' ORDER BY id")
+    resolved.merge(authors[-1], authors[:-1])
+    
+    check_matches(resolved)
+
+
+def test_delete(resolved):
+    """Tests matching after deleting items."""
+    
+    deleted = (
+        (core.Journal, "SELECT id FROM journals WHERE abbreviation = 'Anal Chem'"),
+        (core.Journal, "SELECT id FROM journals WHERE abbreviation IS NULL"),
+        (core.Author, "SELECT id FROM authors WHERE lastname = 'Novak' ORDER BY id"),
+        (core.Author, "SELECT id FROM authors WHERE firstname = ''"),
+        (core.Label, "SELECT id FROM labels WHERE title = 'ms'"))
+    
+    for cls, sql in deleted:
+        for item in get_items(resolved, cls, sql)[:1]:
+            resolved.delete(item)
+    
+    check_matches(resolved)
+
+
+def test_external(resolved):
+    """Tests matching after changes by another connection."""
+    
+    other = core.Library(resolved.db_path)
+    other.insert(core.Journal(title="External", abbreviation="Ext"))
+    other.insert(core.Label(title="External"))
+    other.delete(get_items(other, core.Author, "SELECT id FROM authors WHERE lastname = 'Novak' ORDER BY id")[0])
+    
+    check_matches(resolved)
+
+
+def test_rollback(resolved):
+    """Tests matching after discarded changes."""
+    
+    resolved.db.connect()
+    resolved.insert(core.Journal(title="Discarded"), commit=False)
+    resolved.insert(core.Author(lastname="Novak", firstname="Discarded"), commit=False)
+    resolved.insert(core.Label(title="Discarded"), commit=False)
+    resolved.db.close()
+    
+    check_matches(resolved)
+
+
+def test_raw_query(resolved):
+    """Tests matching after changes by raw query."""
+    
+    resolved.db.connect()
+    resolved.query("INSERT INTO labels (title, title_norm) VALUES ('Raw', 'raw')")
+    resolved.query("INSERT INTO authors (shortname, shortname_norm, lastname, lastname_norm, firstname, initials) VALUES ('Unique B', 'unique b', 'Unique', 'unique', 'Bob', 'B')")
+    
+    check_matches(resolved)
+    
+    resolved.db.close()
+    
+    check_matches(resolved)
@@ -0,0 +1,153 @@
+#  Created byMartin.cz
+#  Copyright (c) Martin Strohalm. All rights reserved.
+
+# import modules
+import pytest
+
+import core
+
+
+def get_stored(library, collection):
+    """Gets IDs of articles stored for materialized collection."""
+    
+    rows = library.query("SELECT article FROM articles_smart WHERE collection = ?", [collection.dbid])
+    return set(x['article'] for x in rows)
+
+
+def get_matching(library, query):
+    """Gets IDs of articles matching given query."""
+    
+    articles = library.search(core.Query(query, core.Article.NAME))
+    return set(x.dbid for x in articles)
+
+
+@pytest.fixture
+def chained(library):
+    """Creates chained smart collections where the referencing one is older."""
+    
+    # insert articles
+    articles = [core.Article(title="Article %d" % i, rating=i % 6) for i in range(60)]
+    for article in articles[::3]:
+        article.title += " mass"
+    library.insert_many(articles)
+    
+    # insert referencing collection first
+    outer = core.Collection(title="Outer", query="3[RAE]", materialized=True)
+    library.insert(outer)
+    
+    # insert referenced collection
+    inner = core.Collection(title="Inner", query="mass[TI]", materialized=True)
+    library.insert(inner)
+    
+    # reference inner collection
+    outer.query = "%d[SMARTID] AND 3[RAE]" % inner.dbid
+    library.update(outer)
+    
+    return library, articles, outer, inner
+
+
+def test_refresh_all(chained):
+    """Tests that full refresh rebuilds referenced collections first."""
+    
+    library, articles, outer, inner = chained
+    
+    # change data directly
+    library.db.connect()
+    library.query("UPDATE articles SET title = 'Article mass', title_norm = 'article mass', rating = 5 WHERE id = ?", [articles[1].dbid])
+    library.db.connection.commit()
+    library.db.close()
+    
+    library.refresh_smart()
+    
+    assert articles[1].dbid in get_stored(library, outer)
+    assert get_stored(library, outer) == get_matching(library, "mass[TI] AND 3[RAE]")
+
+
+def test_refresh_referenced(chained):
+    """Tests that refreshing referenced collection refreshes referencing ones."""
+    
+    library, articles, outer, inner = chained
+    
+    # change referenced query
+    inner.query = "article[TI] NOT mass[TI]"
+    library.update(inner)
+    
+    assert get_stored(library, inner) == get_matching(library, "article[TI] NOT mass[TI]")
+    assert get_stored(library, outer) == get_matching(library, "article[TI] NOT mass[TI] AND 3[RAE]")
+    
+    # refresh referenced only
+    library.refresh_smart([inner])
+    
+    assert get_stored(library, outer) == get_matching(library, "article[TI] NOT mass[TI] AND 3[RAE]")
+
+
+def test_update_article(chained):
+    """Tests that incremental refresh keeps referencing collections correct."""
+    
+    library, articles, outer, inner = chained
+    
+    # add article to referenced collection
+    article = articles[4]
+    article.title = "Updated mass"
+    article.rating = 5
+    library.update(article)
+    
+    assert article.dbid in get_stored(library, inner)
+    assert article.dbid in get_stored(library, outer)
+    
+    # remove article from referenced collection
+    article.title = "Updated"
+    library.update(article)
+    
+    assert article.dbid not in get_stored(library, outer)
+    assert get_stored(library, outer) == get_matching(library, "mass[TI] AND 3[RAE]")
+    
+    # insert new matching article
+    article = core.Article(title="New mass", rating=4)
+    library.insert(article)
+    
+    assert article.dbid in get_stored(library, outer)
+
+
+def test_circular(chained):
+    """Tests that circular references do not prevent refresh."""
+    
+    library, articles, outer, inner = chained
+    
+    # make circular reference
+    inner.query = "mass[TI] OR %d[SMARTID]" % outer.dbid
+    library.update(inner)
+    
+    library.refresh_smart()
+    
+    assert get_stored(library, outer) <= get_stored(library, inner)
+
+
+def test_refresh_timed(chained):
+    """Tests that timed refresh changes nothing without timed collections."""
+    
+    library, articles, outer, inner = chained
+    writes = library._writes
+    
+    # refresh without timed collections
+    assert not library.refresh_smart(timed=True)
+    assert library._writes == writes
+    
+    # refresh unchanged timed collection
+    recent = core.Collection(title="Recent", query="30[RECENT]", materialized=True)
+    library.insert(recent)
+    writes = library._writes
+    
+    assert not library.refresh_smart(timed=True)
+    assert library._writes == writes
+    
+    # refresh changed timed collection
+    library.db.connect()
+    library.query("UPDATE articles SET imported = 0 WHERE id = ?", [articles[0].dbid])
+    library.db.connection.commit()
+    library.db.close()
+    writes = library._writes
+    
+    assert library.refresh_smart(timed=True)
+    assert library._writes > writes
+    assert get_stored(library, recent) == get_matching(library, "30[RECENT]")